@@ -48,6 +48,11 @@ app = Flask(__name__)
 config_class = os.environ.get('FLASK_CONFIG', 'config.DevelopmentConfig')
 app.config.from_object(config_class)
 
+# 初始化日志
+from utils.logger import setup_logging
+
+setup_logging(app)
+
 # 确保实例文件夹存在
 instance_path = Path(app.instance_path)
 instance_path.mkdir(exist_ok=True)
@@ -62,6 +67,61 @@ from flask_migrate import Migrate
 
 migrate = Migrate(app, db)
 
+# 初始化登录日志异步写入器
+from utils.log_writer import login_log_writer
+
+login_log_writer.init_app(app)
+
+# 初始化Token使用统计的批量写入
+from utils.token_cache import token_usage
+
+token_usage.init_app(app)
+
+# 初始化白名单条目登录统计的批量写入
+from utils.login_stats import entry_logins
+
+entry_logins.init_app(app)
+
+# 初始化服务器同步状态和登录统计的批量写入
+from utils.servers import server_activity
+
+server_activity.init_app(app)
+
+# 初始化日志保留策略的后台清理
+from utils.log_retention import log_retention
+
+log_retention.init_app(app)
+
+# 初始化日志按月分区（仅SQLite）
+from utils.log_partitions import log_partitions
+
+log_partitions.init_app(app)
+
+# 初始化健康检查状态
+from utils.health import health_monitor
+
+health_monitor.init_app(app)
+
+# 初始化白名单变更推送
+from utils.whitelist_stream import whitelist_hub
+
+whitelist_hub.init_app(app)
+
+# 初始化事件驱动的推送服务（配置 WHITELIST_STREAM_PORT 时在独立端口上提供推送，不占用工作线程）
+from utils.stream_server import whitelist_stream_server
+
+whitelist_stream_server.init_app(app)
+
+# 初始化到期调度（白名单条目和Token到期时自动停用）
+from utils.expiry import expiry_scheduler
+
+expiry_scheduler.init_app(app)
+
+# 初始化后台任务执行器
+from utils.jobs import job_runner
+
+job_runner.init_app(app)
+
 # 初始化登录管理器
 login_manager = LoginManager(app)
 login_manager.login_view = 'auth.login'
@@ -168,12 +228,36 @@ app.register_blueprint(api_bp, url_prefix='/api')
 app.register_blueprint(web_bp, url_prefix='/')
 
 
-def run_flask(host='0.0.0.0', port=5000, debug=False):
-    """运行Flask应用"""
+def run_flask(host='0.0.0.0', port=5000, debug=False, workers=None, threads=None):
+    """运行Flask应用；指定 workers 或 threads 时使用生产服务器"""
     with app.app_context():
         db.create_all()
         print("数据库表已创建完成")
 
+        # 为旧版本数据库补齐新增的列和索引
+        from utils.schema import upgrade_schema
+
+        changes = upgrade_schema()
+        if changes:
+            print(f"✓ 数据库结构已升级: {', '.join(changes)}")
+
+        # 旧登录日志的结构化字段回填（只处理尚未回填的行）
+        from models.log import Log
+
+        backfilled = Log.backfill_login_columns()
+        if backfilled:
+            print(f"✓ 已回填 {backfilled} 条登录日志的结构化字段")
+
+        # 上次退出时未完成的后台任务标记为失败
+        interrupted = job_runner.recover()
+        if interrupted:
+            print(f"⚠ {interrupted} 个后台任务因服务重启而中断")
+
+        # 停用服务停止期间已到期的白名单条目和Token（在第一个白名单快照构建之前）
+        expired_entries, expired_tokens = expiry_scheduler.catch_up()
+        if expired_entries or expired_tokens:
+            print(f"✓ 已停用 {expired_entries} 个到期的白名单条目和 {expired_tokens} 个到期的Token")
+
         # 检查是否需要OOBE
         from routes.web import is_oobe_required
 
@@ -187,13 +271,23 @@ def run_flask(host='0.0.0.0', port=5000, debug=False):
         print(f"服务器地址: http://{host}:{port}")
         print("按 Ctrl+C 停止服务器\n")
 
-    app.run(host=host, port=port, debug=debug)
+    if (workers or threads) and not debug:
+        from utils.server_runner import run_production
+
+        # 工作进程派生前释放主进程的数据库连接
+        with app.app_context():
+            db.engine.dispose()
+        run_production(app, host=host, port=port, workers=workers, threads=threads)
+    else:
+        app.run(host=host, port=port, debug=debug)
 
 
 class ConfigWindow:
     """配置窗口"""
 
-    def __init__(self):
+    def __init__(self, workers=None, threads=None):
+        self.workers = workers
+        self.threads = threads
         self.root = tk.Tk()
         self.root.title("CWhitelist 服务器配置")
         self.root.geometry("800x600")
@@ -209,7 +303,8 @@ class ConfigWindow:
             pass
 
         self.setup_ui()
-        self.server_thread = None
+        # 确认启动后的服务器参数，窗口关闭后由主线程启动（Gunicorn 只能在主线程中运行）
+        self.server_options = None
 
     def center_window(self):
         """窗口居中"""
@@ -293,6 +388,26 @@ class ConfigWindow:
         port_help_label = ttk.Label(port_frame, text="(1-65535)", foreground="gray", font=("Arial", 9))
         port_help_label.pack(side=tk.LEFT, padx=(10, 0))
 
+        # 生产模式：工作进程数和线程数，留空时使用开发服务器
+        production_frame = ttk.Frame(config_frame)
+        production_frame.pack(fill=tk.X, pady=8)
+
+        ttk.Label(production_frame, text="工作进程数:", width=12).pack(side=tk.LEFT)
+        workers_entry = ttk.Entry(production_frame, width=8)
+        workers_entry.pack(side=tk.LEFT, padx=(5, 0))
+        self.workers_var = tk.StringVar(value=str(self.workers or ''))
+        workers_entry.config(textvariable=self.workers_var)
+
+        ttk.Label(production_frame, text="线程数:").pack(side=tk.LEFT, padx=(15, 0))
+        threads_entry = ttk.Entry(production_frame, width=8)
+        threads_entry.pack(side=tk.LEFT, padx=(5, 0))
+        self.threads_var = tk.StringVar(value=str(self.threads or ''))
+        threads_entry.config(textvariable=self.threads_var)
+
+        production_help_label = ttk.Label(production_frame, text="(留空使用开发服务器)",
+                                          foreground="gray", font=("Arial", 9))
+        production_help_label.pack(side=tk.LEFT, padx=(10, 0))
+
         # 浏览器选项
         browser_frame = ttk.Frame(config_frame)
         browser_frame.pack(fill=tk.X, pady=8)
@@ -362,19 +477,14 @@ class ConfigWindow:
 
     def on_closing(self):
         """窗口关闭时的处理"""
-        if self.server_thread and self.server_thread.is_alive():
-            response = messagebox.askyesno("确认", "服务器仍在运行，确定要退出吗？")
-            if response:
-                print("\n服务器正在停止...")
-                # 这里可以添加停止服务器的逻辑
-                self.root.quit()
-        else:
-            self.root.quit()
+        self.root.quit()
 
     def set_default_values(self):
         """恢复默认值"""
         self.host_var.set("0.0.0.0")
         self.port_var.set("5000")
+        self.workers_var.set("")
+        self.threads_var.set("")
         self.open_browser_var.set(True)
 
         # 触发地址说明更新
@@ -394,6 +504,15 @@ class ConfigWindow:
             messagebox.showerror("错误", "请输入有效的端口号")
             return
 
+        try:
+            workers = int(self.workers_var.get()) if self.workers_var.get().strip() else None
+            threads = int(self.threads_var.get()) if self.threads_var.get().strip() else None
+            if (workers is not None and workers < 1) or (threads is not None and threads < 1):
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("错误", "工作进程数和线程数必须是正整数，或留空使用开发服务器")
+            return
+
         host = self.host_var.get()
         open_browser = self.open_browser_var.get()
 
@@ -421,6 +540,9 @@ class ConfigWindow:
         confirm_msg = f"确认启动服务器？\n\n"
         confirm_msg += f"监听地址: {host}\n"
         confirm_msg += f"监听端口: {port}\n"
+        if workers or threads:
+            confirm_msg += f"生产服务器: {workers or app.config.get('SERVER_WORKERS', 2)} 个工作进程 × " \
+                           f"{threads or app.config.get('SERVER_THREADS', 8)} 个线程\n"
         confirm_msg += f"自动打开浏览器: {'是' if open_browser else '否'}\n\n"
 
         if host == "0.0.0.0":
@@ -435,32 +557,24 @@ class ConfigWindow:
                                       f"地址: {host}:{port}\n"
                                       f"配置窗口将关闭，服务器在后台运行。")
 
-        # 在新线程中启动Flask服务器
-        def run_server():
-            # 延迟打开浏览器
-            if open_browser:
-                def open_browser_delayed():
-                    try:
-                        url = f"http://127.0.0.1:{port}"
-                        if host == "127.0.0.1" or host == "localhost":
-                            url = f"http://{host}:{port}"
-                        webbrowser.open(url)
-                        print(f"✓ 已自动打开浏览器: {url}")
-                    except Exception as e:
-                        print(f"⚠ 无法自动打开浏览器: {e}")
-
-                timer = threading.Timer(2.0, open_browser_delayed)
-                timer.daemon = True
-                timer.start()
-
-            # 运行Flask应用
-            run_flask(host=host, port=port, debug=False)
-
-        # 启动服务器线程
-        self.server_thread = threading.Thread(target=run_server, daemon=True)
-        self.server_thread.start()
-
-        # 关闭配置窗口，但保持程序运行
+        # 延迟打开浏览器
+        if open_browser:
+            def open_browser_delayed():
+                try:
+                    url = f"http://127.0.0.1:{port}"
+                    if host == "127.0.0.1" or host == "localhost":
+                        url = f"http://{host}:{port}"
+                    webbrowser.open(url)
+                    print(f"✓ 已自动打开浏览器: {url}")
+                except Exception as e:
+                    print(f"⚠ 无法自动打开浏览器: {e}")
+
+            timer = threading.Timer(2.0, open_browser_delayed)
+            timer.daemon = True
+            timer.start()
+
+        # 关闭配置窗口，由主线程按所选参数启动服务器
+        self.server_options = {'host': host, 'port': port, 'workers': workers, 'threads': threads}
         self.root.destroy()
 
     def run(self):
@@ -468,9 +582,9 @@ class ConfigWindow:
         self.root.mainloop()
 
 
-def run_server_directly(host='0.0.0.0', port=5000, debug=False):
+def run_server_directly(host='0.0.0.0', port=5000, debug=False, workers=None, threads=None):
     """直接运行服务器（不使用GUI）"""
-    run_flask(host=host, port=port, debug=debug)
+    run_flask(host=host, port=port, debug=debug, workers=workers, threads=threads)
 
 
 def main():
@@ -489,39 +603,42 @@ def main():
         parser.add_argument('--no-gui', action='store_true', help='不使用GUI界面')
         parser.add_argument('--no-browser', action='store_true', help='不自动打开浏览器')
         parser.add_argument('--debug', action='store_true', help='调试模式')
+        parser.add_argument('--workers', type=int, help='生产模式：工作进程数（使用Gunicorn，Windows下使用Waitress）')
+        parser.add_argument('--threads', type=int, help='生产模式：每个工作进程的线程数')
 
         args = parser.parse_args()
 
-        # 如果使用GUI模式且有浏览器选项
+        # 如果使用GUI模式，--workers / --threads 作为窗口中的初始值
         if not args.no_gui and SHOW_CONFIG:
             print("使用GUI配置界面...")
             try:
-                window = ConfigWindow()
+                window = ConfigWindow(workers=args.workers, threads=args.threads)
                 window.run()
-                # 窗口关闭后，检查是否启动了服务器线程
-                if window.server_thread and window.server_thread.is_alive():
-                    # 等待服务器线程
-                    window.server_thread.join()
             except Exception as e:
                 print(f"GUI启动失败: {e}")
                 print("将使用命令行配置启动...")
-                run_server_directly(host=args.host, port=args.port, debug=args.debug)
+                run_server_directly(host=args.host, port=args.port, debug=args.debug,
+                                    workers=args.workers, threads=args.threads)
+            else:
+                # 窗口确认启动后在主线程中运行服务器
+                if window.server_options:
+                    run_server_directly(debug=args.debug, **window.server_options)
         else:
             # 直接启动Flask
-            run_server_directly(host=args.host, port=args.port, debug=args.debug)
+            run_server_directly(host=args.host, port=args.port, debug=args.debug,
+                                workers=args.workers, threads=args.threads)
     elif SHOW_CONFIG:
         # 显示配置窗口
         try:
             window = ConfigWindow()
             window.run()
-            # 窗口关闭后，检查是否启动了服务器线程
-            if window.server_thread and window.server_thread.is_alive():
-                # 等待服务器线程
-                window.server_thread.join()
         except Exception as e:
             print(f"配置窗口启动失败: {e}")
             print("将使用默认配置启动...")
             run_server_directly()
+        else:
+            if window.server_options:
+                run_server_directly(**window.server_options)
     else:
         # 直接启动
         run_server_directly()
@@ -12,6 +12,8 @@ class Config:
 
     # 时区配置 - 默认从环境变量获取，但可以在设置页面修改
     TIMEZONE = os.environ.get('TIMEZONE', 'UTC')
+    # 时区设置在进程内的缓存时间（秒），多进程部署时其他进程最长在此时间后生效；0 表示只在本进程修改时刷新
+    TIMEZONE_CACHE_TTL = 60
 
     # 数据库配置
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
@@ -34,7 +36,8 @@ class Config:
 
     # 日志配置
     LOG_FILE = 'logs/app.log'
-    LOG_LEVEL = 'INFO'
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_ASYNC = os.environ.get('LOG_ASYNC') == '1'  # 通过后台线程输出日志，避免请求线程阻塞在stdout上
 
     # CORS配置
     CORS_ORIGINS = ['*']
@@ -51,6 +54,95 @@ class Config:
     # API配置
     API_RATE_LIMIT = '1000/hour'  # API速率限制
 
+    # 登录日志异步批量写入
+    LOGIN_LOG_ASYNC = True  # 关闭后每条登录日志在请求中同步写入
+    LOGIN_LOG_QUEUE_SIZE = 10000  # 队列容量
+    LOGIN_LOG_BATCH_SIZE = 500  # 每批最多写入条数
+    LOGIN_LOG_FLUSH_INTERVAL = 1.0  # 最长写入间隔（秒）
+    LOGIN_LOG_BACKPRESSURE = 'sync'  # 队列已满时：'sync' 同步写入，'block' 等待后拒绝，'reject' 直接拒绝(503)
+    LOGIN_LOG_BLOCK_TIMEOUT = 2.0  # 'block' 策略的最长等待时间（秒）
+    LOGIN_LOG_BATCH_MAX_EVENTS = 1000  # /api/login/log/batch 单次请求最多事件数
+
+    # Token验证缓存
+    TOKEN_CACHE_SIZE = 1024  # 最多缓存的Token数量
+    TOKEN_CACHE_TTL = 60  # 缓存有效期（秒）
+    TOKEN_CACHE_CHECK_INTERVAL = 5  # 检查共享Token版本号的间隔（秒），多进程部署时禁用/删除Token最长在此时间后生效
+    TOKEN_USAGE_FLUSH_INTERVAL = 10  # Token使用统计批量写入间隔（秒），0 表示每次请求立即写入
+
+    # 日志保留策略：按顺序匹配 level/source（均可选），每条日志使用第一条匹配的策略
+    # days 为保留天数，None 表示永久保留；未匹配的日志使用系统设置中的 log_retention_days
+    # 例如 [{'level': 'login', 'days': 90}, {'level': 'info', 'days': 7}]
+    LOG_RETENTION_POLICIES = []
+    # 后台清理间隔（秒），默认 0 不自动清理（日志不会被删除，除非管理员手动清理或设置此间隔）
+    LOG_RETENTION_INTERVAL = 0
+    LOG_RETENTION_CHUNK_SIZE = 5000  # 每个删除事务的最大行数
+    LOG_RETENTION_VACUUM = None  # SQLite清理后回收空间：None、'incremental'（需auto_vacuum=INCREMENTAL）或 'full'
+    # 日志按月分区（仅SQLite）：月份变化后 logs 表整表轮换为 logs_YYYY_MM，
+    # 保留策略和按月归档对整个过期分区直接 DROP，不逐行删除
+    LOG_PARTITION_ENABLED = True
+    LOG_ARCHIVE_ENABLED = False  # 清理前将过期日志归档为按月的压缩JSONL文件（logs-YYYY-MM.jsonl.gz）
+    LOG_ARCHIVE_FOLDER = os.path.join(Path(__file__).parent, 'instance', 'log_archive')
+    WHITELIST_CHANGE_RETENTION_DAYS = 30  # 白名单变更记录保留天数，更早版本的客户端需要全量同步
+
+    # 后台任务（导入、导出、清空日志）
+    JOB_WORKERS = 2  # 执行任务的线程数
+    JOB_FOLDER = os.path.join(Path(__file__).parent, 'instance', 'jobs')  # 上传文件和导出结果的存放目录
+    JOB_RETENTION_DAYS = 7  # 已完成任务及其文件的保留天数
+
+    # 健康检查：数据库连通性缓存时间（秒），以及探测次数汇总写入日志的周期（秒）
+    HEALTH_DB_CHECK_INTERVAL = 10
+    HEALTH_LOG_INTERVAL = 300
+
+    # 仪表板计数器按此间隔（秒）用 GROUP BY 重新校准，修正其他进程写入带来的偏差；0 表示只在批量删除后校准
+    STATS_RECONCILE_INTERVAL = 300
+
+    # 白名单条目登录统计（登录次数、最近登录时间/IP）批量写入间隔（秒），0 表示每次登录立即写入
+    ENTRY_LOGIN_FLUSH_INTERVAL = 10
+
+    # 到期调度：按最近的到期时间唤醒，停用到期的白名单条目和Token；
+    # 每隔这么多秒重新加载到期时间，发现其他进程写入的条目
+    EXPIRY_RELOAD_INTERVAL = 300
+
+    # 白名单变更推送（/api/whitelist/stream）和长轮询（/api/whitelist/sync?wait=）
+    # WSGI端口上的每个连接在等待期间占用一个工作线程（阻塞在条件变量上，不消耗CPU），占满线程后普通请求将无法处理
+    # 每个进程同时等待的连接数上限，超出时推送返回503、长轮询不等待直接返回；
+    # None 表示取 SERVER_THREADS 的四分之一（至少1），0 表示不允许等待
+    WHITELIST_STREAM_MAX_CLIENTS = None
+    WHITELIST_STREAM_HEARTBEAT = 30  # 空闲时发送心跳注释的间隔（秒），0 表示不发送
+    WHITELIST_STREAM_MAX_DURATION = 3600  # 单个连接的最长时间（秒），到期后客户端通过 Last-Event-ID 续传
+    WHITELIST_STREAM_POLL_INTERVAL = 1.0  # 检查其他进程写入的间隔（秒），本进程的提交立即推送
+    WHITELIST_LONG_POLL_MAX_WAIT = 20  # 同步接口 wait 参数（长轮询）的最长等待时间（秒）
+
+    # 事件驱动的推送服务：在独立端口上提供 /api/whitelist/stream，空闲连接不占用工作线程
+    # 反向代理将 /api/whitelist/stream 转发到此端口（关闭缓冲）；None 表示不启动，0 表示随机端口
+    # 多进程部署时各工作进程通过 SO_REUSEPORT 共用此端口（不支持 SO_REUSEPORT 的系统上只有一个进程能监听）
+    WHITELIST_STREAM_PORT = None
+    WHITELIST_STREAM_HOST = '0.0.0.0'
+    WHITELIST_STREAM_SERVER_MAX_CLIENTS = 1000  # 每个进程同时保持的推送连接数上限，超出时返回503
+    WHITELIST_STREAM_SERVER_THREADS = 4  # 每个进程执行Token验证和增量查询的线程数
+
+    # 服务器同步状态和登录统计批量写入间隔（秒），0 表示每次上报立即写入
+    SERVER_ACTIVITY_FLUSH_INTERVAL = 10
+    SERVER_CACHE_TTL = 30  # 已注册服务器列表的缓存有效期（秒），多进程部署时新注册的服务器最长在此时间后生效
+
+    # 生产服务器（python app.py --workers N --threads M）
+    SERVER_WORKERS = 2  # 未指定 --workers 时的工作进程数
+    SERVER_THREADS = 8  # 未指定 --threads 时每个工作进程的线程数
+    # Gunicorn 工作模式，默认有线程时为 gthread、否则为 sync
+    # gthread 下WSGI端口上的每个推送连接/长轮询在等待期间占用一个线程，同时等待的数量受 WHITELIST_STREAM_MAX_CLIENTS 限制；
+    # 大量推送连接使用 WHITELIST_STREAM_PORT 的事件驱动推送服务
+    SERVER_WORKER_CLASS = None
+    SERVER_KEEPALIVE = 5  # HTTP keep-alive 等待时间（秒）
+    SERVER_MAX_REQUESTS = 10000  # 工作进程处理这么多请求后平滑重启，0 表示不重启
+    SERVER_MAX_REQUESTS_JITTER = 1000  # 重启阈值的随机抖动，避免所有工作进程同时重启
+    SERVER_WORKER_TIMEOUT = 120  # 工作进程无响应多久后被重启（秒）
+    SERVER_GRACEFUL_TIMEOUT = 30  # 重启/退出时等待当前请求完成的时间（秒）
+    SERVER_MAX_CONNECTIONS = 1000  # 最大并发连接数
+    SERVER_ACCESS_LOG = None  # 访问日志文件，'-' 表示输出到标准输出，None 表示不记录
+
+    # 白名单快照缓存：多进程部署时检查其他进程写入的间隔（秒），0 表示只依赖本进程的失效通知
+    WHITELIST_CACHE_CHECK_INTERVAL = 5
+
 
 class DevelopmentConfig(Config):
     """开发环境配置"""
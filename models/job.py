@@ -0,0 +1,50 @@
+import json
+import uuid
+
+from .database import db
+from utils.timezone import now_utc
+
+
+class Job(db.Model):
+    """后台任务模型（导入、导出、清理日志等耗时操作）"""
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    type = db.Column(db.String(32), nullable=False, index=True)  # 'import', 'export', 'clear_logs'
+    status = db.Column(db.String(16), nullable=False, default='pending', index=True)  # 'pending', 'running', 'succeeded', 'failed'
+    progress = db.Column(db.Integer, default=0)  # 已处理数量
+    total = db.Column(db.Integer, nullable=True)  # 总数量，未知时为空
+    message = db.Column(db.String(255))
+    result = db.Column(db.Text)  # JSON格式的结果
+    error = db.Column(db.Text)
+    result_file = db.Column(db.String(255))  # 任务生成的文件（如导出文件）
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    owner = db.Column(db.String(128), index=True)  # 执行任务的进程（主机名:进程ID）
+    created_at = db.Column(db.DateTime, default=now_utc, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def finished(self):
+        return self.status in ('succeeded', 'failed')
+
+    def to_dict(self):
+        """转换为字典"""
+        from utils.timezone import format_datetime
+        return {
+            'id': self.id,
+            'type': self.type,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'message': self.message,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'has_file': bool(self.result_file),
+            'created_at': format_datetime(self.created_at) if self.created_at else None,
+            'started_at': format_datetime(self.started_at) if self.started_at else None,
+            'finished_at': format_datetime(self.finished_at) if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<Job {self.type} {self.status} ({self.id})>'
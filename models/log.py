@@ -6,6 +6,15 @@ from utils.timezone import now_utc
 class Log(db.Model):
     """日志模型"""
     __tablename__ = 'logs'
+    __table_args__ = (
+        # 最后登录查询：WHERE level='login' AND player_xxx=? ORDER BY created_at DESC
+        db.Index('ix_logs_level_player_name_created_at', 'level', 'player_name', 'created_at'),
+        db.Index('ix_logs_level_player_uuid_created_at', 'level', 'player_uuid', 'created_at'),
+        # 按时间统计允许/拒绝的登录次数
+        db.Index('ix_logs_level_allowed_created_at', 'level', 'allowed', 'created_at'),
+        # 按月轮换分区后，新的 logs 表从旧表的最大主键之后继续编号
+        {'sqlite_autoincrement': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     level = db.Column(db.String(16), nullable=False, index=True)  # 'info', 'warning', 'error', 'login'
@@ -15,6 +24,8 @@ class Log(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     player_name = db.Column(db.String(64), index=True)  # 新增：玩家名称
     player_uuid = db.Column(db.String(36), index=True)  # 新增：玩家UUID
+    allowed = db.Column(db.Boolean, nullable=True)  # 登录日志：是否允许进入
+    check_type = db.Column(db.String(16), nullable=True, index=True)  # 登录日志：匹配类型
     details = db.Column(db.Text)  # 额外的JSON数据
     created_at = db.Column(db.DateTime, default=now_utc, index=True)  # 修改这里
 
@@ -30,27 +41,69 @@ class Log(db.Model):
             'user_id': self.user_id,
             'player_name': self.player_name,
             'player_uuid': self.player_uuid,
+            'allowed': self.allowed,
+            'check_type': self.check_type,
             'created_at': format_datetime(self.created_at, '%Y-%m-%d %H:%M:%S') if self.created_at else None,
             'details': self.details
         }
 
+    @classmethod
+    def login_log_row(cls, player_name, player_uuid, player_ip, allowed, check_type=None, user_id=None):
+        """构建登录日志的列值（供批量写入使用）"""
+        return {
+            'level': 'login',
+            'message': f'Player {"allowed" if allowed else "denied"}: {player_name}',
+            'source': 'api',
+            'ip_address': player_ip,
+            'player_name': player_name,
+            'player_uuid': player_uuid,
+            'user_id': user_id,
+            'allowed': bool(allowed),
+            'check_type': check_type,
+            'details': f'player_name: {player_name}, player_uuid: {player_uuid}, allowed: {allowed}, check_type: {check_type}',
+            'created_at': now_utc()
+        }
+
+    @classmethod
+    def sync_log_row(cls, ip_address, user_id=None, details=None):
+        """构建同步日志的列值（与登录日志列相同，可与其一起批量写入）"""
+        return {
+            'level': 'info',
+            'message': 'API同步白名单数据',
+            'source': 'api',
+            'ip_address': ip_address,
+            'player_name': None,
+            'player_uuid': None,
+            'user_id': user_id,
+            'allowed': None,
+            'check_type': None,
+            'details': details,
+            'created_at': now_utc()
+        }
+
     @classmethod
     def create_login_log(cls, player_name, player_uuid, player_ip, allowed, check_type=None, user_id=None):
         """创建登录日志"""
-        log = cls(
-            level='login',
-            message=f'Player {"allowed" if allowed else "denied"}: {player_name}',
-            source='api',
-            ip_address=player_ip,
-            player_name=player_name,
-            player_uuid=player_uuid,
-            user_id=user_id,
-            details=f'player_name: {player_name}, player_uuid: {player_uuid}, allowed: {allowed}, check_type: {check_type}'
-        )
+        log = cls(**cls.login_log_row(player_name, player_uuid, player_ip, allowed, check_type, user_id))
         db.session.add(log)
         db.session.commit()
         return log
 
+    @classmethod
+    def bulk_insert(cls, rows):
+        """批量插入日志（单条 executemany 语句，由调用方提交事务）"""
+        if rows:
+            from utils.stats_counters import count_log_rows
+
+            db.session.execute(cls.__table__.insert(), rows)
+            count_log_rows(rows)
+
+    @classmethod
+    def all_partitions(cls):
+        """跨越 logs 表和全部已轮换分区的只读实体，用法与Log相同：db.session.query(Log.all_partitions())"""
+        from utils.log_partitions import log_partitions
+        return log_partitions.entity()
+
     @classmethod
     def get_last_login_info(cls, identifier_type, identifier_value):
         """
@@ -58,13 +111,14 @@ class Log(db.Model):
         identifier_type: 'name' 或 'uuid'
         identifier_value: 玩家名称或UUID
         """
+        logs = cls.all_partitions()
         if identifier_type == 'name':
-            query = cls.query.filter_by(
+            query = db.session.query(logs).filter_by(
                 level='login',
                 player_name=identifier_value
             )
         elif identifier_type == 'uuid':
-            query = cls.query.filter_by(
+            query = db.session.query(logs).filter_by(
                 level='login',
                 player_uuid=identifier_value
             )
@@ -72,26 +126,112 @@ class Log(db.Model):
             return None
 
         # 获取最近一次登录记录
-        last_login = query.order_by(cls.created_at.desc()).first()
+        last_login = query.order_by(logs.created_at.desc()).first()
 
         if last_login:
-            # 解析详情中的信息
-            details = {}
-            if last_login.details:
-                # 解析简单的 key: value 格式
-                for line in last_login.details.split(', '):
-                    if ':' in line:
-                        key, value = line.split(': ', 1) if ': ' in line else line.split(':', 1)
-                        details[key.strip()] = value.strip()
-
-            return {
-                'last_login_at': last_login.created_at,
-                'ip_address': last_login.ip_address,
-                'allowed': details.get('allowed', 'false').lower() == 'true',
-                'check_type': details.get('check_type', 'unknown')
-            }
+            return last_login._login_info()
 
         return None
 
+    @classmethod
+    def get_last_login_info_bulk(cls, identifier_type, identifier_values):
+        """
+        批量获取多个玩家的最后登录信息（一次分组查询）
+        返回 {玩家名称或UUID: 登录信息}，没有登录记录的玩家不在结果中
+        """
+        logs = cls.all_partitions()
+        if identifier_type == 'name':
+            column = logs.player_name
+        elif identifier_type == 'uuid':
+            column = logs.player_uuid
+        else:
+            return {}
+
+        values = list(set(identifier_values))
+        if not values:
+            return {}
+
+        # 每个玩家最近一次登录的时间
+        latest = db.session.query(
+            column.label('identifier'),
+            db.func.max(logs.created_at).label('last_login_at')
+        ).filter(
+            logs.level == 'login',
+            column.in_(values)
+        ).group_by(column).subquery()
+
+        rows = db.session.query(logs).join(latest, db.and_(
+            column == latest.c.identifier,
+            logs.created_at == latest.c.last_login_at
+        )).filter(logs.level == 'login').all()
+
+        return {getattr(row, column.key): row._login_info() for row in rows}
+
+    def _login_info(self):
+        """将登录日志转换为最后登录信息"""
+        if self.allowed is None:
+            # 尚未回填结构化字段的旧日志
+            allowed, check_type = self.parse_login_details(self.details)
+        else:
+            allowed, check_type = self.allowed, self.check_type
+
+        return {
+            'last_login_at': self.created_at,
+            'ip_address': self.ip_address,
+            'allowed': allowed,
+            'check_type': check_type or 'unknown'
+        }
+
+    @staticmethod
+    def parse_login_details(details):
+        """从旧格式的登录详情文本中解析 (allowed, check_type)"""
+        values = {}
+        if details:
+            # 解析简单的 key: value 格式
+            for line in details.split(', '):
+                if ':' in line:
+                    key, value = line.split(': ', 1) if ': ' in line else line.split(':', 1)
+                    values[key.strip()] = value.strip()
+
+        check_type = values.get('check_type')
+        if check_type in (None, '', 'None'):
+            check_type = None
+        return values.get('allowed', 'false').lower() == 'true', check_type
+
+    @classmethod
+    def backfill_login_columns(cls, chunk_size=5000):
+        """
+        一次性迁移：为旧登录日志解析details并填充 allowed/check_type 字段
+        按主键分块处理，每块一次 executemany UPDATE 并提交；返回处理的行数
+        """
+        table = cls.__table__
+        statement = table.update().where(table.c.id == db.bindparam('b_id')).values(
+            allowed=db.bindparam('b_allowed'),
+            check_type=db.bindparam('b_check_type')
+        )
+
+        total = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                db.select(table.c.id, table.c.details).where(
+                    table.c.level == 'login',
+                    table.c.allowed.is_(None),
+                    table.c.id > last_id
+                ).order_by(table.c.id).limit(chunk_size)
+            ).all()
+            if not rows:
+                return total
+
+            params = []
+            for row in rows:
+                allowed, check_type = cls.parse_login_details(row.details)
+                params.append({'b_id': row.id, 'b_allowed': allowed, 'b_check_type': check_type})
+
+            db.session.execute(statement, params)
+            db.session.commit()
+            total += len(rows)
+            last_id = rows[-1].id
+
     def __repr__(self):
         return f'<Log {self.level}: {self.message[:50]}>'
\ No newline at end of file
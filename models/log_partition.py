@@ -0,0 +1,44 @@
+import json
+
+from .database import db
+from utils.timezone import now_utc
+
+
+class LogPartition(db.Model):
+    """
+    已轮换的日志分区（仅SQLite）
+    logs 表只保存当前月份写入的日志，月份变化时整表重命名为 logs_YYYY_MM 并记录在此
+    """
+    __tablename__ = 'log_partitions'
+
+    name = db.Column(db.String(64), primary_key=True)  # 分区表名 logs_YYYY_MM
+    month = db.Column(db.String(7), nullable=False, index=True)  # 写入月份 YYYY-MM
+    first_at = db.Column(db.DateTime, nullable=True)  # 分区内最早/最晚的日志时间
+    last_at = db.Column(db.DateTime, nullable=True)
+    row_count = db.Column(db.Integer, nullable=True)  # 为空表示索引和统计尚未完成
+    level_counts = db.Column(db.Text)  # 按级别统计的行数（JSON）
+    source_counts = db.Column(db.Text)  # 按来源统计的行数（JSON）
+    created_at = db.Column(db.DateTime, default=now_utc)
+
+    @property
+    def ready(self):
+        """分区索引和统计是否已完成"""
+        return self.row_count is not None
+
+    def counts(self):
+        """返回 (按级别统计, 按来源统计)"""
+        return json.loads(self.level_counts or '{}'), json.loads(self.source_counts or '{}')
+
+    def to_dict(self):
+        """转换为字典"""
+        from utils.timezone import format_datetime
+        return {
+            'name': self.name,
+            'month': self.month,
+            'first_at': format_datetime(self.first_at) if self.first_at else None,
+            'last_at': format_datetime(self.last_at) if self.last_at else None,
+            'row_count': self.row_count
+        }
+
+    def __repr__(self):
+        return f'<LogPartition {self.name}>'
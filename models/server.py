@@ -12,6 +12,7 @@ class Server(db.Model):
     server_id = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     name = db.Column(db.String(128), nullable=False)
     description = db.Column(db.String(255))
+    group_name = db.Column(db.String(64), nullable=True, index=True)  # 服务器组，白名单条目可以按组下发
     ip_address = db.Column(db.String(45))  # 支持IPv6
     port = db.Column(db.Integer, default=25565)
     game_version = db.Column(db.String(32))
@@ -35,6 +36,7 @@ class Server(db.Model):
             'server_id': self.server_id,
             'name': self.name,
             'description': self.description,
+            'group_name': self.group_name,
             'ip_address': self.ip_address,
             'port': self.port,
             'game_version': self.game_version,
@@ -52,20 +54,14 @@ class Server(db.Model):
         }
 
     def update_sync_status(self, status, success=True):
-        """更新同步状态"""
-        from utils.timezone import now_utc
-        self.last_sync = now_utc()
-        self.sync_status = 'synced' if success else 'failed'
-        db.session.commit()
+        """更新同步状态（内存累积，定期批量写入，不单独提交）"""
+        from utils.servers import record_server_sync
+        record_server_sync(self.server_id, success)
 
     def increment_stats(self, allowed):
-        """增加登录统计"""
-        self.total_logins += 1
-        if allowed:
-            self.allowed_logins += 1
-        else:
-            self.denied_logins += 1
-        db.session.commit()
+        """增加登录统计（内存累积，定期批量写入，不单独提交）"""
+        from utils.servers import record_server_login
+        record_server_login(self.server_id, allowed)
 
     def __repr__(self):
         return f'<Server {self.name} ({self.server_id})>'
\ No newline at end of file
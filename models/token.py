@@ -5,6 +5,10 @@ from utils.timezone import now_utc
 import pytz
 import html
 
+from utils.logger import get_logger
+
+logger = get_logger('token')
+
 
 class Token(db.Model):
     """API令牌模型"""
@@ -18,6 +22,7 @@ class Token(db.Model):
     expires_at = db.Column(db.DateTime)
     last_used = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, default=True)
+    deactivated_reason = db.Column(db.String(16))  # 'expired' 表示由到期调度器停用，管理员手动切换状态时清空
 
     # 权限
     can_read = db.Column(db.Boolean, default=True)
@@ -43,8 +48,8 @@ class Token(db.Model):
                     return False
 
             return True
-        except Exception as e:
-            print(f"[TOKEN] Error checking token validity: {e}")
+        except Exception:
+            logger.exception('error checking token validity id=%s', self.id)
             return False
 
     def update_usage(self, ip_address):
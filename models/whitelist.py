@@ -1,4 +1,3 @@
-from datetime import datetime
 import uuid
 
 from .database import db
@@ -8,6 +7,10 @@ from utils.timezone import now_utc
 class WhitelistEntry(db.Model):
     """白名单条目模型"""
     __tablename__ = 'whitelist_entries'
+    __table_args__ = (
+        # 同一类型的值只能有一条；旧数据库中的重复条目由 upgrade_schema 在建索引前合并
+        db.Index('uq_whitelist_entries_type_value', 'type', 'value', unique=True),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     type = db.Column(db.String(16), nullable=False, index=True)  # 'name', 'uuid', 'ip'
@@ -15,9 +18,13 @@ class WhitelistEntry(db.Model):
     description = db.Column(db.String(255))
     created_by = db.Column(db.String(64), nullable=False)
     created_at = db.Column(db.DateTime, default=now_utc)  # 修改这里
-    expires_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
     is_active = db.Column(db.Boolean, default=True, index=True)
 
+    # 适用范围：都为空时适用于所有服务器；指定服务器ID或服务器组时只下发给对应的服务器
+    server_id = db.Column(db.String(36), nullable=True, index=True)
+    server_group = db.Column(db.String(64), nullable=True, index=True)
+
     # 新增：登录统计字段
     last_login = db.Column(db.DateTime, nullable=True)  # 最近登录时间
     login_count = db.Column(db.Integer, default=0)  # 登录次数
@@ -26,6 +33,21 @@ class WhitelistEntry(db.Model):
     def to_dict(self):
         """转换为字典"""
         from utils.timezone import format_datetime
+        data = self.to_sync_dict()
+        data.update({
+            'last_login': format_datetime(self.last_login) if self.last_login else None,
+            'login_count': self.login_count,
+            'last_login_ip': self.last_login_ip
+        })
+        return data
+
+    def to_sync_dict(self):
+        """同步接口下发的字典
+
+        不包含登录统计：登录统计异步写入且不产生变更记录，
+        放进快照会随ETag一起被冻结，全量、增量和快照三条路径的结果也会不一致
+        """
+        from utils.timezone import format_datetime
         return {
             'id': self.id,
             'type': self.type,
@@ -35,9 +57,8 @@ class WhitelistEntry(db.Model):
             'created_at': format_datetime(self.created_at) if self.created_at else None,
             'expires_at': format_datetime(self.expires_at) if self.expires_at else None,
             'is_active': self.is_active,
-            'last_login': format_datetime(self.last_login) if self.last_login else None,
-            'login_count': self.login_count,
-            'last_login_ip': self.last_login_ip
+            'server_id': self.server_id,
+            'server_group': self.server_group
         }
 
     def update_login_info(self, ip_address=None):
@@ -55,5 +76,27 @@ class WhitelistEntry(db.Model):
             return now_utc() > self.expires_at
         return False
 
+    @staticmethod
+    def scope_matches(entry_server_id, entry_server_group, server_id, server_group):
+        """条目的适用范围是否包含指定的服务器（服务器ID和所属服务器组）"""
+        if not entry_server_id and not entry_server_group:
+            return True
+        return bool((entry_server_id and entry_server_id == server_id) or
+                    (entry_server_group and entry_server_group == server_group))
+
+    def applies_to(self, server_id, server_group=None):
+        """条目是否适用于指定的服务器"""
+        return self.scope_matches(self.server_id, self.server_group, server_id, server_group)
+
+    @classmethod
+    def scope_filter(cls, server_id, server_group=None):
+        """适用于指定服务器的条目的查询条件"""
+        conditions = [db.and_(cls.server_id.is_(None), cls.server_group.is_(None))]
+        if server_id:
+            conditions.append(cls.server_id == server_id)
+        if server_group:
+            conditions.append(cls.server_group == server_group)
+        return db.or_(*conditions)
+
     def __repr__(self):
         return f'<WhitelistEntry {self.type}:{self.value}>'
\ No newline at end of file
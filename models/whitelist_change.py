@@ -0,0 +1,124 @@
+from .database import db
+from utils.timezone import now_utc
+
+
+class WhitelistChange(db.Model):
+    """白名单变更记录，自增主键即同步版本号（revision）"""
+    __tablename__ = 'whitelist_changes'
+    # SQLite 需要 AUTOINCREMENT 才能保证版本号单调递增、不被复用
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    revision = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    entry_id = db.Column(db.String(36), nullable=False, index=True)
+    type = db.Column(db.String(16), nullable=False)
+    value = db.Column(db.String(255), nullable=False)
+    action = db.Column(db.String(16), nullable=False)  # 'add', 'update', 'remove'
+    created_at = db.Column(db.DateTime, default=now_utc, index=True)
+
+    def to_tombstone(self):
+        """转换为删除标记"""
+        return {
+            'id': self.entry_id,
+            'type': self.type,
+            'value': self.value
+        }
+
+    @classmethod
+    def record(cls, entry, action):
+        """记录一次白名单变更（随调用方的事务一起提交）"""
+        if entry.id is None:
+            # 新条目需要先flush才能拿到主键
+            db.session.add(entry)
+            db.session.flush()
+
+        change = cls(
+            entry_id=entry.id,
+            type=entry.type,
+            value=entry.value,
+            action=action
+        )
+        db.session.add(change)
+        # 提交后由白名单缓存监听并失效快照
+        db.session.info['whitelist_changed'] = True
+        return change
+
+    @classmethod
+    def record_bulk(cls, changes):
+        """
+        批量记录白名单变更（单条 executemany 语句，随调用方的事务一起提交）
+        changes 为 (条目ID, 类型, 值, 操作) 的列表
+        """
+        if not changes:
+            return
+        now = now_utc()
+        db.session.execute(cls.__table__.insert(), [
+            {'entry_id': entry_id, 'type': entry_type, 'value': value, 'action': action, 'created_at': now}
+            for entry_id, entry_type, value, action in changes
+        ])
+        db.session.info['whitelist_changed'] = True
+
+    @classmethod
+    def current_revision(cls):
+        """获取当前最新版本号"""
+        return db.session.query(db.func.max(cls.revision)).scalar() or 0
+
+    @classmethod
+    def get_delta(cls, since, until, only_active=True, scope=None):
+        """
+        获取 (since, until] 区间内的增量变更
+        scope 为 (服务器ID, 服务器组) 时只返回适用于该服务器的条目，移出范围的条目作为删除下发
+        返回 None 表示该区间的变更记录已被清理，客户端需要全量同步
+        """
+        from models.whitelist import WhitelistEntry
+
+        # 起始版本之后的记录已被清理，无法计算增量
+        oldest = db.session.query(db.func.min(cls.revision)).scalar()
+        if oldest is not None and since + 1 < oldest:
+            return None
+
+        changes = cls.query.filter(
+            cls.revision > since,
+            cls.revision <= until
+        ).order_by(cls.revision).all()
+
+        # 按条目合并变更：记录区间内的第一次和最后一次操作
+        first_action = {}
+        last_change = {}
+        for change in changes:
+            first_action.setdefault(change.entry_id, change.action)
+            last_change[change.entry_id] = change
+
+        removed = []
+        live_ids = []
+        for entry_id, change in last_change.items():
+            if change.action == 'remove':
+                # 区间内新增又删除的条目，客户端从未见过，无需下发
+                if first_action[entry_id] != 'add':
+                    removed.append(change.to_tombstone())
+            else:
+                live_ids.append(entry_id)
+
+        added = []
+        updated = []
+        entries = WhitelistEntry.query.filter(WhitelistEntry.id.in_(live_ids)).all() if live_ids else []
+        for entry in entries:
+            out_of_scope = scope is not None and not entry.applies_to(*scope)
+            # 到期的条目已由到期调度器停用并记录为变更
+            if out_of_scope or (only_active and not entry.is_active):
+                if first_action[entry.id] != 'add':
+                    removed.append({'id': entry.id, 'type': entry.type, 'value': entry.value})
+                continue
+
+            if first_action[entry.id] == 'add':
+                added.append(entry.to_sync_dict())
+            else:
+                updated.append(entry.to_sync_dict())
+
+        return {
+            'added': added,
+            'updated': updated,
+            'removed': removed
+        }
+
+    def __repr__(self):
+        return f'<WhitelistChange #{self.revision} {self.action} {self.type}:{self.value}>'
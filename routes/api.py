@@ -1,48 +1,97 @@
 # routes/api.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response, g, current_app, stream_with_context
 from datetime import datetime
+import hashlib
 import uuid
 
+import pytz
+
 from models.database import db
 from models.token import Token
 from models.whitelist import WhitelistEntry
+from models.whitelist_change import WhitelistChange
 from models.log import Log
 from utils.auth import require_api_auth  # 导入装饰器
+from utils.whitelist_cache import whitelist_cache
+from utils.log_writer import login_log_writer
+from utils.login_stats import record_entry_login
+from utils.servers import server_registry, record_server_sync, record_server_login
+from utils.health import health_monitor
+from utils.whitelist_stream import whitelist_hub, iter_stream
+from utils.logger import get_logger
+
+logger = get_logger('api')
 
 api_bp = Blueprint('api', __name__)
 
 
 @api_bp.route('/health', methods=['GET'])
 def health():
-    """健康检查接口 - 不需要Token验证"""
-    # 记录API访问日志
-    log = Log(
-        level='info',
-        message='API健康检查',
-        source='api',
-        ip_address=request.remote_addr,
-        details=f'endpoint: /health, method: GET'
-    )
-    db.session.add(log)
-    db.session.commit()
+    """健康检查接口 - 不需要Token验证，只读取内存中的状态"""
+    # 探测次数按周期汇总为一条日志，不再每次写入
+    health_monitor.record_probe(request.remote_addr)
+
+    database = health_monitor.database_status(force=request.args.get('check') == 'db')
 
     return jsonify({
-        'success': True,
-        'status': 'ok',
+        'success': database['ok'],
+        'status': 'ok' if database['ok'] else 'degraded',
         'timestamp': datetime.utcnow().isoformat(),
         'service': 'CWhitelist API',
-        'version': '1.0.0'
-    })
+        'version': '1.0.0',
+        'database': database,
+        'queues': health_monitor.queue_depths()
+    }), 200 if database['ok'] else 503
+
+
+def _sync_etag(revision, only_active, scope):
+    """生成全量同步响应的ETag（不走快照的查询）"""
+    # 条目到期时由到期调度器记录变更，版本号即可反映内容变化
+    raw = f'{revision}|{only_active}|{scope}|{getattr(g, "timezone_str", "")}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _not_modified(etag):
+    """返回304响应"""
+    response = make_response('', 304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _sync_token_info(token):
+    """同步响应中的Token信息"""
+    if not token:
+        return None
+    return {
+        'token_id': token.id,
+        'token_name': token.name,
+        'permissions': {
+            'can_read': token.can_read,
+            'can_write': token.can_write
+        }
+    }
+
+
+def _log_sync(token, log_details):
+    """记录同步操作日志（与登录日志一起入队批量写入，不在请求中单独提交）"""
+    row = Log.sync_log_row(
+        ip_address=request.remote_addr,
+        user_id=token.user_id if token else None,
+        details=str(log_details)
+    )
+    login_log_writer.submit(row)
 
 
 @api_bp.route('/whitelist/sync', methods=['GET'])
 @require_api_auth  # 添加Token验证
 def sync_whitelist():
-    """同步白名单数据"""
+    """同步白名单数据，支持通过 since 参数进行增量同步"""
     try:
         # 获取查询参数
         server_id = request.args.get('server_id')
         only_active = request.args.get('only_active', 'true').lower() == 'true'
+        since = request.args.get('since', type=int)
 
         # 获取Token信息（通过装饰器附加）
         token = getattr(request, 'token', None)
@@ -52,61 +101,121 @@ def sync_whitelist():
             'endpoint': '/whitelist/sync',
             'entries_count': 'unknown',
             'server_id': server_id,
+            'since': since,
             'token_id': token.id if token else None,
             'token_name': token.name if token else None
         }
 
-        # 构建查询
-        query = WhitelistEntry.query
-
-        if server_id:
-            # 这里可以添加服务器特定的查询逻辑
-            pass
-
-        if only_active:
-            query = query.filter_by(is_active=True)
+        # 已注册的服务器记录同步时间和状态（内存累积，定期批量写入）
+        server = server_registry.get(server_id)
+        if server:
+            record_server_sync(server_id)
+            log_details['server_name'] = server['name']
 
-            # 排除过期的条目
-            from sqlalchemy import or_
-            query = query.filter(or_(
-                WhitelistEntry.expires_at.is_(None),
-                WhitelistEntry.expires_at > datetime.utcnow()
-            ))
+        # 指定服务器时只返回适用于该服务器（及其服务器组）的条目
+        scope = server_registry.scope(server_id) if server_id else None
 
-        entries = query.order_by(WhitelistEntry.type, WhitelistEntry.value).all()
-
-        # 更新日志详情
-        log_details['entries_count'] = len(entries)
-
-        # 记录API操作日志
-        log = Log(
-            level='info',
-            message='API同步白名单数据',
-            source='api',
-            ip_address=request.remote_addr,
-            user_id=token.user_id if token else None,
-            details=str(log_details)
-        )
-        db.session.add(log)
-        db.session.commit()
+        # 长轮询：客户端已是最新版本时，等待下一次变更后再返回增量
+        # 等待期间占用工作线程，与推送连接共用上限；达到上限时不等待，直接返回当前增量
+        wait = min(request.args.get('wait', 0, type=float), current_app.config.get('WHITELIST_LONG_POLL_MAX_WAIT', 20))
+        if since is not None and wait > 0 and whitelist_hub.acquire_client():
+            try:
+                # 等待期间不持有数据库连接
+                db.session.close()
+                whitelist_hub.wait_for_revision(since, wait)
+            finally:
+                whitelist_hub.release_client()
+
+        # 全量同步活跃条目时直接使用内存快照，不访问条目表
+        if since is None and only_active:
+            snapshot = whitelist_cache.get_snapshot()
+            # 服务器子快照预先筛选和序列化，只在范围重叠的条目变化时重建
+            served = snapshot.for_server(*scope) if scope else snapshot
+            if request.if_none_match.contains(served.etag):
+                return _not_modified(served.etag)
+
+            log_details['mode'] = 'full'
+            log_details['entries_count'] = len(served)
+            _log_sync(token, log_details)
+
+            body = served.render({
+                'success': True,
+                'message': 'Sync successful',
+                'mode': 'full',
+                'revision': snapshot.revision,
+                'reset': False,
+                'synced_at': datetime.utcnow().isoformat(),
+                'token_info': _sync_token_info(token)
+            })
+            response = current_app.response_class(body, mimetype='application/json')
+            response.set_etag(served.etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        # 先确定本次同步的版本号，之后的变更留给下一次同步
+        revision = WhitelistChange.current_revision()
+
+        # 全量同步时支持条件请求，内容未变化直接返回304，跳过查询和序列化
+        etag = None
+        if since is None:
+            etag = _sync_etag(revision, only_active, scope)
+            if request.if_none_match.contains(etag):
+                return _not_modified(etag)
+
+        delta = None
+        if since is not None and 0 <= since <= revision:
+            delta = WhitelistChange.get_delta(since, revision, only_active=only_active, scope=scope)
+
+        if delta is not None:
+            log_details['mode'] = 'delta'
+            log_details['entries_count'] = len(delta['added']) + len(delta['updated']) + len(delta['removed'])
+        else:
+            # 构建查询
+            query = WhitelistEntry.query
+
+            if scope:
+                query = query.filter(WhitelistEntry.scope_filter(*scope))
+
+            if only_active:
+                query = query.filter_by(is_active=True)
+
+            entries = query.order_by(WhitelistEntry.type, WhitelistEntry.value).all()
+
+            # 更新日志详情
+            log_details['mode'] = 'full'
+            log_details['entries_count'] = len(entries)
+
+        _log_sync(token, log_details)
 
-        return jsonify({
+        response_data = {
             'success': True,
             'message': 'Sync successful',
-            'entries': [entry.to_dict() for entry in entries],
-            'total_count': len(entries),
+            'mode': log_details['mode'],
+            'revision': revision,
             'synced_at': datetime.utcnow().isoformat(),
-            'token_info': {
-                'token_id': token.id if token else None,
-                'token_name': token.name if token else None,
-                'permissions': {
-                    'can_read': token.can_read if token else None,
-                    'can_write': token.can_write if token else None
-                }
-            } if token else None
-        })
+            'token_info': _sync_token_info(token)
+        }
+
+        if delta is not None:
+            response_data['since'] = since
+            response_data.update(delta)
+        else:
+            # since 无效或对应的变更记录已被清理时，要求客户端丢弃本地数据
+            response_data['reset'] = since is not None
+            response_data['entries'] = [entry.to_sync_dict() for entry in entries]
+            response_data['total_count'] = len(entries)
+
+        response = jsonify(response_data)
+        if etag:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
 
     except Exception as e:
+        db.session.rollback()
+        if server_registry.get(request.args.get('server_id')):
+            record_server_sync(request.args.get('server_id'), success=False)
+
         # 记录API错误日志
         log = Log(
             level='error',
@@ -125,6 +234,107 @@ def sync_whitelist():
         }), 500
 
 
+@api_bp.route('/whitelist/stream', methods=['GET'])
+@require_api_auth  # 添加Token验证
+def stream_whitelist():
+    """推送白名单变更（Server-Sent Events），断线重连时通过 Last-Event-ID 或 since 续传"""
+    server_id = request.args.get('server_id')
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+
+    scope = server_registry.scope(server_id) if server_id else None
+    if server_registry.get(server_id):
+        record_server_sync(server_id)
+
+    if not whitelist_hub.acquire_client():
+        response = jsonify({
+            'success': False,
+            'message': 'Too many stream connections, please fall back to polling'
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+
+    # 连接期间不持有数据库连接，需要查询时再取用
+    db.session.close()
+
+    if whitelist_hub.current_revision() is None:
+        whitelist_hub.release_client()
+        return jsonify({
+            'success': False,
+            'message': 'Stream is not available'
+        }), 503
+
+    config = current_app.config
+    response = current_app.response_class(
+        stream_with_context(iter_stream(
+            whitelist_hub,
+            since,
+            scope,
+            heartbeat=config.get('WHITELIST_STREAM_HEARTBEAT', 30),
+            max_duration=config.get('WHITELIST_STREAM_MAX_DURATION', 3600)
+        )),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    # 禁止反向代理缓冲推送内容
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(whitelist_hub.release_client)
+    return response
+
+
+@api_bp.route('/whitelist/check', methods=['POST'])
+@require_api_auth  # 添加Token验证
+def check_whitelist():
+    """检查单个玩家是否允许进入（基于内存索引，不访问数据库）"""
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({
+                'success': False,
+                'message': 'No data provided'
+            }), 400
+
+        name = data.get('name') or data.get('player_name')
+        player_uuid = data.get('uuid') or data.get('player_uuid')
+        ip = data.get('ip') or data.get('player_ip')
+
+        if not (name or player_uuid or ip):
+            return jsonify({
+                'success': False,
+                'message': 'At least one of name, uuid or ip is required'
+            }), 400
+
+        snapshot = whitelist_cache.get_snapshot()
+        server_id = data.get('server_id')
+        if server_id:
+            # 只按适用于该服务器的条目判断
+            entry, check_type = snapshot.for_server(*server_registry.scope(server_id)).index.check(
+                name=name, uuid=player_uuid, ip=ip)
+        else:
+            entry, check_type = snapshot.index.check(name=name, uuid=player_uuid, ip=ip)
+
+        return jsonify({
+            'success': True,
+            'allowed': entry is not None,
+            'check_type': check_type,
+            'entry': {
+                'id': entry['id'],
+                'type': entry['type'],
+                'value': entry['value']
+            } if entry else None,
+            'revision': snapshot.revision
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error',
+            'error': str(e)
+        }), 500
+
+
 @api_bp.route('/whitelist/entries', methods=['POST'])
 @require_api_auth  # 添加Token验证
 def add_whitelist_entry():
@@ -184,7 +394,9 @@ def add_whitelist_entry():
             value=value,
             description=data.get('description', ''),
             created_by=data.get('created_by', f'api_token_{token.name if token else "unknown"}'),
-            is_active=data.get('is_active', True)
+            is_active=data.get('is_active', True),
+            server_id=data.get('server_id') or None,
+            server_group=data.get('server_group') or None
         )
 
         # 设置过期时间
@@ -198,6 +410,7 @@ def add_whitelist_entry():
                 }), 400
 
         db.session.add(entry)
+        WhitelistChange.record(entry, 'add')
         db.session.commit()
 
         # 记录API操作日志
@@ -291,6 +504,7 @@ def delete_whitelist_entry(entry_type, value):
         db.session.add(log)
 
         # 删除条目
+        WhitelistChange.record(entry, 'remove')
         db.session.delete(entry)
         db.session.commit()
 
@@ -321,6 +535,17 @@ def delete_whitelist_entry(entry_type, value):
         }), 500
 
 
+LOGIN_EVENT_REQUIRED_FIELDS = ['player_name', 'player_uuid', 'player_ip', 'allowed']
+
+
+def _validate_login_event(data):
+    """验证登录事件，返回错误信息，验证通过返回None"""
+    for field in LOGIN_EVENT_REQUIRED_FIELDS:
+        if field not in data:
+            return f'Missing required field: {field}'
+    return None
+
+
 @api_bp.route('/login/log', methods=['POST'])
 @require_api_auth  # 添加Token验证
 def log_login():
@@ -337,13 +562,12 @@ def log_login():
         token = getattr(request, 'token', None)
 
         # 验证必需字段
-        required_fields = ['player_name', 'player_uuid', 'player_ip', 'allowed']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    'success': False,
-                    'message': f'Missing required field: {field}'
-                }), 400
+        error = _validate_login_event(data)
+        if error:
+            return jsonify({
+                'success': False,
+                'message': error
+            }), 400
 
         player_name = data['player_name']
         player_uuid = data['player_uuid']
@@ -351,8 +575,8 @@ def log_login():
         allowed = data['allowed']
         check_type = data.get('check_type')
 
-        # 记录Minecraft玩家登录事件
-        log = Log.create_login_log(
+        # 记录Minecraft玩家登录事件（入队后由后台线程批量写入）
+        row = Log.login_log_row(
             player_name=player_name,
             player_uuid=player_uuid,
             player_ip=player_ip,
@@ -360,11 +584,35 @@ def log_login():
             check_type=check_type,
             user_id=token.user_id if token else None
         )
+        result = login_log_writer.submit(row)
+
+        if result == 'rejected':
+            return jsonify({
+                'success': False,
+                'message': 'Login log queue is full, please retry later'
+            }), 503
+
+        # 已注册的服务器累加登录统计
+        server_id = data.get('server_id')
+        if server_registry.get(server_id):
+            record_server_login(server_id, allowed)
+
+        # 允许的登录计入白名单条目的登录统计
+        if allowed:
+            record_entry_login(
+                whitelist_cache.get_snapshot().index,
+                player_name=player_name,
+                player_uuid=player_uuid,
+                player_ip=player_ip,
+                check_type=check_type,
+                login_at=row['created_at']
+            )
 
         return jsonify({
             'success': True,
             'message': 'Login logged successfully',
-            'log_id': log.id,
+            'queued': result == 'queued',
+            'log_id': None,
             'logged_by': f'api_token_{token.name if token else "unknown"}'
         })
 
@@ -387,6 +635,135 @@ def log_login():
         }), 500
 
 
+@api_bp.route('/login/log/batch', methods=['POST'])
+@require_api_auth  # 添加Token验证
+def log_login_batch():
+    """批量记录登录事件（一次认证、一次事务）"""
+    try:
+        data = request.get_json(silent=True)
+        events = data.get('events') if isinstance(data, dict) else data
+        if not isinstance(events, list) or not events:
+            return jsonify({
+                'success': False,
+                'message': 'No events provided. Send a JSON array or {"events": [...]}'
+            }), 400
+
+        max_events = current_app.config.get('LOGIN_LOG_BATCH_MAX_EVENTS', 1000)
+        if len(events) > max_events:
+            return jsonify({
+                'success': False,
+                'message': f'Too many events in one batch (max {max_events})'
+            }), 413
+
+        # 获取Token信息
+        token = getattr(request, 'token', None)
+        user_id = token.user_id if token else None
+
+        # 批次级的 server_id，单个事件可以覆盖
+        batch_server_id = data.get('server_id') if isinstance(data, dict) else None
+
+        rows = []
+        server_logins = []
+        results = []
+        allowed_logins = []
+        for index, event in enumerate(events):
+            if not isinstance(event, dict):
+                results.append({'index': index, 'success': False, 'message': 'Event must be an object'})
+                continue
+
+            error = _validate_login_event(event)
+            if error:
+                results.append({'index': index, 'success': False, 'message': error})
+                continue
+
+            row = Log.login_log_row(
+                player_name=event['player_name'],
+                player_uuid=event['player_uuid'],
+                player_ip=event['player_ip'],
+                allowed=event['allowed'],
+                check_type=event.get('check_type'),
+                user_id=user_id
+            )
+
+            # 代理端缓冲的事件可以携带实际登录时间
+            if event.get('timestamp'):
+                try:
+                    timestamp = datetime.fromisoformat(str(event['timestamp']).replace('Z', '+00:00'))
+                except ValueError:
+                    results.append({'index': index, 'success': False,
+                                    'message': 'Invalid timestamp format. Use ISO 8601'})
+                    continue
+                if timestamp.tzinfo:
+                    timestamp = timestamp.astimezone(pytz.UTC)
+                row['created_at'] = timestamp.replace(tzinfo=None)
+
+            rows.append(row)
+            results.append({'index': index, 'success': True})
+            server_logins.append((event.get('server_id') or batch_server_id, event['allowed']))
+            if event['allowed']:
+                allowed_logins.append((event, row))
+
+        if not rows:
+            return jsonify({
+                'success': False,
+                'message': 'No valid events in batch',
+                'accepted': 0,
+                'rejected': len(results),
+                'results': results
+            }), 400
+
+        # 所有有效事件在同一个事务中写入
+        Log.bulk_insert(rows)
+        db.session.commit()
+
+        # 已注册的服务器累加登录统计
+        for server_id, allowed in server_logins:
+            if server_registry.get(server_id):
+                record_server_login(server_id, allowed)
+
+        # 允许的登录计入白名单条目的登录统计
+        if allowed_logins:
+            whitelist_index = whitelist_cache.get_snapshot().index
+            for event, row in allowed_logins:
+                record_entry_login(
+                    whitelist_index,
+                    player_name=event['player_name'],
+                    player_uuid=event['player_uuid'],
+                    player_ip=event['player_ip'],
+                    check_type=event.get('check_type'),
+                    login_at=row['created_at']
+                )
+
+        return jsonify({
+            'success': True,
+            'message': 'Batch logged successfully',
+            'accepted': len(rows),
+            'rejected': len(results) - len(rows),
+            'results': results,
+            'logged_by': f'api_token_{token.name if token else "unknown"}'
+        })
+
+    except Exception as e:
+        db.session.rollback()
+
+        # 记录API错误日志
+        log = Log(
+            level='error',
+            message='API批量记录登录事件失败',
+            source='api',
+            ip_address=request.remote_addr,
+            details=f'endpoint: /login/log/batch, error: {str(e)}'
+        )
+        db.session.add(log)
+        db.session.commit()
+
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error',
+            'error': str(e)
+        }), 500
+
+
 @api_bp.route('/tokens/verify', methods=['GET'])
 @require_api_auth  # 添加Token验证
 def verify_token():
@@ -419,14 +796,12 @@ def verify_token():
             'valid_until': token.expires_at.isoformat() if token.expires_at else 'never'
         }
 
-        print(f"[API] ✅ Token verification successful for: {token.name}")
+        logger.debug('token verification successful id=%s name=%s', token.id, token.name)
 
         return jsonify(response_data)
 
     except Exception as e:
-        print(f"[API] ❌ Token verification error: {str(e)}")
-        import traceback
-        print(f"[API] Stack trace: {traceback.format_exc()}")
+        logger.exception('token verification error')
 
         return jsonify({
             'success': False,
@@ -526,4 +901,120 @@ def create_token():
         return jsonify({
             'success': False,
             'message': f'Failed to create token: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+SERVER_METADATA_FIELDS = ['name', 'description', 'group_name', 'ip_address', 'port', 'game_version', 'mod_version']
+
+
+@api_bp.route('/servers/register', methods=['POST'])
+@require_api_auth  # 添加Token验证
+def register_server():
+    """注册服务器，已存在的 server_id 更新服务器信息"""
+    from models.server import Server
+
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({
+                'success': False,
+                'message': 'No data provided'
+            }), 400
+
+        token = getattr(request, 'token', None)
+        server_id = str(data.get('server_id') or '').strip()
+
+        server = Server.query.filter_by(server_id=server_id).first() if server_id else None
+        created = server is None
+
+        # 服务器组决定下发哪些按组限定的白名单条目，新注册服务器和修改服务器组都需要管理权限
+        group_name = data.get('group_name')
+        changes_group = group_name not in (None, '') and (created or group_name != server.group_name)
+        if (created or changes_group) and not (token and token.can_manage):
+            return jsonify({
+                'success': False,
+                'message': 'Manage permission required to register servers or change server groups'
+            }), 403
+
+        if created:
+            name = str(data.get('name') or '').strip()
+            if not name:
+                return jsonify({
+                    'success': False,
+                    'message': 'Server name is required'
+                }), 400
+            if len(server_id) > 36:
+                return jsonify({
+                    'success': False,
+                    'message': 'server_id must be at most 36 characters'
+                }), 400
+
+            server = Server(name=name)
+            if server_id:
+                server.server_id = server_id
+            db.session.add(server)
+        elif not server.is_active:
+            return jsonify({
+                'success': False,
+                'message': 'Server is disabled'
+            }), 403
+
+        for field in SERVER_METADATA_FIELDS:
+            if data.get(field) not in (None, ''):
+                setattr(server, field, data[field])
+        if not server.ip_address:
+            server.ip_address = request.remote_addr
+
+        db.session.flush()
+
+        # 记录操作日志
+        log = Log(
+            level='info',
+            message=f'{"注册" if created else "更新"}服务器: {server.name}',
+            source='api',
+            ip_address=request.remote_addr,
+            user_id=token.user_id if token else None,
+            details=f'server_id: {server.server_id}, token_id: {token.id if token else None}'
+        )
+        db.session.add(log)
+        db.session.commit()
+        server_registry.invalidate()
+
+        return jsonify({
+            'success': True,
+            'message': 'Server registered successfully' if created else 'Server updated successfully',
+            'server': server.to_dict()
+        }), 201 if created else 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error',
+            'error': str(e)
+        }), 500
+
+
+@api_bp.route('/servers', methods=['GET'])
+@require_api_auth  # 添加Token验证
+def list_servers():
+    """列出已注册的服务器及其同步状态和登录统计"""
+    from models.server import Server
+    from utils.servers import server_activity
+
+    try:
+        # 先写入累积的同步状态和登录统计，返回最新数据
+        server_activity.flush()
+
+        servers = Server.query.order_by(Server.name).all()
+        return jsonify({
+            'success': True,
+            'servers': [server.to_dict() for server in servers],
+            'total_count': len(servers)
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': 'Internal server error',
+            'error': str(e)
+        }), 500
@@ -1,20 +1,27 @@
 # routes/web.py
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, session
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, session, send_file, \
+    Response, stream_with_context
 from flask_login import login_required, current_user
-from sqlalchemy import desc, or_, inspect
+from sqlalchemy import desc, inspect
 from datetime import datetime
 import traceback
 
 import json
+import uuid
 from werkzeug.utils import secure_filename
 import os
+from itertools import islice
 
 from config import config
 from models.database import db
 from models.token import Token
 from models.whitelist import WhitelistEntry
+from models.whitelist_change import WhitelistChange
 from models.setting import Setting
 from models.log import Log
+from models.server import Server
+from utils.token_cache import token_cache
+from utils.stats_counters import stats_counters
 
 web_bp = Blueprint('web', __name__)
 
@@ -60,17 +67,17 @@ def index():
 def dashboard():
     """仪表板"""
 
-    # 获取统计信息
-    total_entries = WhitelistEntry.query.count()
-    active_entries = WhitelistEntry.query.filter_by(is_active=True).count()
+    # 获取统计信息（来自增量维护的计数器）
+    total_entries, active_entries = stats_counters.entry_counts()
 
     # 获取日志统计
+    level_counts = stats_counters.log_level_counts()
     log_stats = {
-        'total': Log.query.count(),
-        'info': Log.query.filter_by(level='info').count(),
-        'warning': Log.query.filter_by(level='warning').count(),
-        'error': Log.query.filter_by(level='error').count(),
-        'login': Log.query.filter_by(level='login').count(),
+        'total': stats_counters.log_total(),
+        'info': level_counts.get('info', 0),
+        'warning': level_counts.get('warning', 0),
+        'error': level_counts.get('error', 0),
+        'login': level_counts.get('login', 0),
     }
 
     # 获取用户统计
@@ -115,33 +122,42 @@ def whitelist():
         )
 
     if active_only_bool:
+        # 到期的条目已由到期调度器停用
         query = query.filter_by(is_active=True)
-        # 排除过期的条目
-        query = query.filter(or_(
-            WhitelistEntry.expires_at.is_(None),
-            WhitelistEntry.expires_at > datetime.utcnow()
-        ))
 
     # 分页
     pagination = query.order_by(desc(WhitelistEntry.created_at)).paginate(
         page=page, per_page=per_page, error_out=False
     )
 
-    # 为每个条目获取最后登录信息
+    # 登录统计直接读取条目上的字段；尚无统计的旧条目按类型批量查询登录日志
+    last_logins = {
+        identifier_type: Log.get_last_login_info_bulk(
+            identifier_type,
+            [entry.value for entry in pagination.items
+             if entry.type == identifier_type and not entry.last_login]
+        )
+        for identifier_type in ('name', 'uuid')
+    }
+
     entries_with_login_info = []
     for entry in pagination.items:
-        entry_dict = {
+        if entry.last_login:
+            last_login = {
+                'last_login_at': entry.last_login,
+                'ip_address': entry.last_login_ip,
+                'allowed': True,
+                # 条目上只保存登录时间/IP/次数，未记录匹配类型
+                'check_type': None,
+                'login_count': entry.login_count
+            }
+        else:
+            last_login = last_logins.get(entry.type, {}).get(entry.value)
+
+        entries_with_login_info.append({
             'entry': entry,
-            'last_login': None
-        }
-
-        # 如果是name或uuid类型，获取最后登录信息
-        if entry.type in ['name', 'uuid']:
-            last_login = Log.get_last_login_info(entry.type, entry.value)
-            if last_login:
-                entry_dict['last_login'] = last_login
-
-        entries_with_login_info.append(entry_dict)
+            'last_login': last_login
+        })
 
     # 确保传递正确的值到模板
     filters_dict = {
@@ -150,10 +166,16 @@ def whitelist():
         'active_only': active_only_bool
     }
 
+    # 条目适用范围的选项和显示名称
+    servers = Server.query.order_by(Server.name).all()
+
     return render_template('whitelist.html',
                            entries=entries_with_login_info,
                            pagination=pagination,
-                           filters=filters_dict)
+                           filters=filters_dict,
+                           servers=servers,
+                           server_names={server.server_id: server.name for server in servers},
+                           server_groups=sorted({server.group_name for server in servers if server.group_name}))
 
 
 @web_bp.route('/whitelist/add', methods=['POST'])
@@ -166,6 +188,8 @@ def add_whitelist():
     value = request.form.get('value', '').strip()
     description = request.form.get('description', '').strip()
     expires_at = request.form.get('expires_at')
+    server_id = request.form.get('server_id', '').strip()
+    server_group = request.form.get('server_group', '').strip()
 
     if not entry_type or not value:
         flash('请填写类型和值', 'error')
@@ -191,7 +215,9 @@ def add_whitelist():
         value=value,
         description=description,
         created_by=current_user.username,
-        is_active=True
+        is_active=True,
+        server_id=server_id or None,
+        server_group=server_group or None
     )
 
     if expires_at:
@@ -205,6 +231,7 @@ def add_whitelist():
             return redirect(url_for('web.whitelist'))
 
     db.session.add(entry)
+    WhitelistChange.record(entry, 'add')
     db.session.commit()
 
     # 记录操作日志
@@ -214,7 +241,8 @@ def add_whitelist():
         source='web',
         ip_address=request.remote_addr,
         user_id=current_user.id,
-        details=f'entry_id: {entry.id}, description: {description}'
+        details=f'entry_id: {entry.id}, description: {description}, server_id: {entry.server_id}, '
+                f'server_group: {entry.server_group}'
     )
     db.session.add(log)
     db.session.commit()
@@ -233,6 +261,7 @@ def toggle_whitelist(entry_id):
         return redirect(url_for('web.whitelist'))
 
     entry.is_active = not entry.is_active
+    WhitelistChange.record(entry, 'update')
     db.session.commit()
 
     # 记录操作日志
@@ -272,6 +301,7 @@ def delete_whitelist(entry_id):
     )
     db.session.add(log)
 
+    WhitelistChange.record(entry, 'remove')
     db.session.delete(entry)
     db.session.commit()
 
@@ -283,13 +313,14 @@ def delete_whitelist(entry_id):
 @login_required
 def logs():
     """日志查看"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 50, type=int)
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(max(1, request.args.get('per_page', 50, type=int)), 500)
     level = request.args.get('level', '')
     source = request.args.get('source', '')
 
-    # 构建查询
-    query = Log.query
+    # 构建查询（跨越 logs 表和全部已轮换的分区）
+    logs_entity = Log.all_partitions()
+    query = db.session.query(logs_entity)
 
     if level:
         query = query.filter_by(level=level)
@@ -297,21 +328,30 @@ def logs():
     if source:
         query = query.filter_by(source=source)
 
-    # 分页
-    pagination = query.order_by(desc(Log.created_at)).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-
-    # 获取日志级别和来源的统计
-    level_stats = db.session.query(
-        Log.level,
-        db.func.count(Log.id)
-    ).group_by(Log.level).all()
+    # 获取日志级别和来源的统计（来自增量维护的计数器）
+    level_stats = stats_counters.log_level_counts()
+    source_stats = stats_counters.log_source_counts()
+
+    # 分页：多读一行判断是否还有下一页，不对日志表 COUNT；
+    # 记录数标签只用于展示，取自计数器（同时按级别和来源过滤时不显示）
+    start = (page - 1) * per_page
+    rows = query.order_by(desc(logs_entity.created_at)).offset(start).limit(per_page + 1).all()
+    pagination = {
+        'page': page,
+        'has_prev': page > 1,
+        'has_next': len(rows) > per_page,
+        'prev_num': page - 1,
+        'next_num': page + 1
+    }
 
-    source_stats = db.session.query(
-        Log.source,
-        db.func.count(Log.id)
-    ).group_by(Log.source).all()
+    if level and source:
+        matched_total = None
+    elif level:
+        matched_total = level_stats.get(level, 0)
+    elif source:
+        matched_total = source_stats.get(source, 0)
+    else:
+        matched_total = stats_counters.log_total()
 
     filters = {
         'level': level,
@@ -319,10 +359,12 @@ def logs():
     }
 
     return render_template('logs.html',
-                           logs=pagination.items,
+                           logs=rows[:per_page],
                            pagination=pagination,
-                           level_stats=dict(level_stats),
-                           source_stats=dict(source_stats),
+                           matched_total=matched_total,
+                           log_total=stats_counters.log_total(),
+                           level_stats=level_stats,
+                           source_stats=source_stats,
                            filters=filters)
 
 
@@ -339,7 +381,7 @@ def clear_logs():
 
     try:
         # 获取当前日志总数
-        total_logs = Log.query.count()
+        total_logs = stats_counters.log_total()
 
         if is_test:
             # 测试模式，不实际删除
@@ -350,54 +392,22 @@ def clear_logs():
             flash('没有日志可清空', 'info')
             return redirect(url_for('web.logs'))
 
-        # 使用更可靠的方式删除日志
-        deleted_count = 0
-
-        # 方法1：分批删除（更安全）
-        batch_size = 100
-        while True:
-            # 获取一批日志
-            batch = Log.query.limit(batch_size).all()
-            if not batch:
-                break
-
-            # 逐个删除
-            for log in batch:
-                db.session.delete(log)
-
-            try:
-                db.session.commit()
-                deleted_count += len(batch)
-                print(f"已删除 {len(batch)} 条日志，累计 {deleted_count} 条")
-            except Exception as e:
-                db.session.rollback()
-                print(f"删除批次失败: {e}")
-                # 尝试单个删除
-                for log in batch:
-                    try:
-                        db.session.delete(log)
-                        db.session.commit()
-                        deleted_count += 1
-                    except:
-                        db.session.rollback()
-                        continue
-
-        # 验证删除结果
-        remaining_count = Log.query.count()
-
-        # 记录操作日志
-        operation_log = Log(
-            level='warning',
-            message=f'管理员清空日志，删除了 {deleted_count} 条记录',
-            source='web',
-            ip_address=request.remote_addr,
+        # 在后台任务中分块删除，请求立即返回
+        from utils.jobs import job_runner
+        from utils.log_retention import clear_logs_job
+
+        job_id = job_runner.submit(
+            'clear_logs', clear_logs_job,
+            kwargs={
+                'user_id': current_user.id,
+                'username': current_user.username,
+                'remote_addr': request.remote_addr
+            },
             user_id=current_user.id,
-            details=f'user: {current_user.username}, cleared: {deleted_count}, remaining: {remaining_count}'
+            message=f'清空 {total_logs} 条日志'
         )
-        db.session.add(operation_log)
-        db.session.commit()
-
-        flash(f'成功清空 {deleted_count} 条日志，剩余 {remaining_count} 条', 'success')
+        flash('清空日志任务已提交，正在后台执行', 'info')
+        return redirect(url_for('web.logs', job=job_id))
 
     except Exception as e:
         db.session.rollback()
@@ -431,8 +441,7 @@ def settings():
     active_tokens = Token.query.filter_by(is_active=True).count()
     expired_tokens = Token.query.filter(
         Token.expires_at.isnot(None),
-        Token.expires_at < now_utc(),
-        Token.is_active == True
+        Token.expires_at < now_utc()
     ).count()
 
     return render_template('settings.html',
@@ -468,6 +477,11 @@ def save_settings():
 
         db.session.commit()
 
+        # 设置页面也可以直接修改时区
+        if 'setting_timezone' in request.form:
+            from utils.timezone import invalidate_timezone_cache
+            invalidate_timezone_cache()
+
         # 记录操作日志
         log = Log(
             level='info',
@@ -487,6 +501,199 @@ def save_settings():
     return redirect(url_for('web.settings'))
 
 
+@web_bp.route('/settings/log_level', methods=['GET', 'POST'])
+@login_required
+def log_level_settings():
+    """查看或在运行时调整日志级别（仅对当前进程生效，不写入数据库）"""
+    if not current_user.is_admin():
+        return jsonify({
+            'success': False,
+            'message': '需要管理员权限'
+        }), 403
+
+    from utils.logger import get_log_level, set_log_level
+
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or request.form
+        level = set_log_level(data.get('level', ''))
+        if level is None:
+            return jsonify({
+                'success': False,
+                'message': '无效的日志级别，可选: DEBUG, INFO, WARNING, ERROR'
+            }), 400
+
+    return jsonify({
+        'success': True,
+        'level': get_log_level()
+    })
+
+
+@web_bp.route('/logs/retention', methods=['GET', 'POST'])
+@login_required
+def log_retention_status():
+    """查看日志保留策略与清理进度；POST 立即在后台执行一次清理"""
+    if not current_user.is_admin():
+        return jsonify({
+            'success': False,
+            'message': '需要管理员权限'
+        }), 403
+
+    from utils.log_retention import log_retention
+
+    if request.method == 'POST':
+        if not log_retention.run_in_background(log_retention.purge):
+            return jsonify({
+                'success': False,
+                'message': '日志清理任务正在运行',
+                'status': log_retention.status()
+            }), 409
+
+        return jsonify({
+            'success': True,
+            'message': '日志清理任务已开始',
+            'status': log_retention.status()
+        }), 202
+
+    return jsonify({
+        'success': True,
+        'policies': log_retention.policies(),
+        'status': log_retention.status()
+    })
+
+
+@web_bp.route('/logs/archives', methods=['GET', 'POST'])
+@login_required
+def log_archives():
+    """查看日志归档文件；POST 将指定月份的日志归档并从数据库删除"""
+    if not current_user.is_admin():
+        return jsonify({
+            'success': False,
+            'message': '需要管理员权限'
+        }), 403
+
+    from utils.log_archive import is_archive_month, list_archives
+    from utils.log_retention import log_retention
+
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or request.form
+        month = data.get('month', '')
+        if not is_archive_month(month):
+            return jsonify({
+                'success': False,
+                'message': '无效的月份，格式: YYYY-MM 或 unknown'
+            }), 400
+
+        if not log_retention.run_in_background(log_retention.archive_month, month):
+            return jsonify({
+                'success': False,
+                'message': '日志清理任务正在运行',
+                'status': log_retention.status()
+            }), 409
+
+        return jsonify({
+            'success': True,
+            'message': f'正在归档 {month} 的日志',
+            'status': log_retention.status()
+        }), 202
+
+    return jsonify({
+        'success': True,
+        'archives': list_archives()
+    })
+
+
+@web_bp.route('/logs/archives/<month>')
+@login_required
+def download_log_archive(month):
+    """下载指定月份的日志归档"""
+    if not current_user.is_admin():
+        flash('需要管理员权限', 'error')
+        return redirect(url_for('web.logs'))
+
+    from utils.log_archive import archive_path, is_archive_month
+
+    if not is_archive_month(month) or not os.path.exists(archive_path(month)):
+        flash('归档文件不存在', 'error')
+        return redirect(url_for('web.logs'))
+
+    return send_file(archive_path(month), mimetype='application/gzip',
+                     as_attachment=True, download_name=f'logs-{month}.jsonl.gz')
+
+
+@web_bp.route('/logs/archives/<month>/entries')
+@login_required
+def browse_log_archive(month):
+    """分页浏览指定月份归档中的日志，可按级别和关键字过滤"""
+    if not current_user.is_admin():
+        return jsonify({
+            'success': False,
+            'message': '需要管理员权限'
+        }), 403
+
+    from utils.log_archive import archive_path, is_archive_month, iter_archive
+
+    if not is_archive_month(month) or not os.path.exists(archive_path(month)):
+        return jsonify({
+            'success': False,
+            'message': '归档文件不存在'
+        }), 404
+
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(max(1, request.args.get('per_page', 50, type=int)), 500)
+    rows = iter_archive(month, level=request.args.get('level'), search=request.args.get('search'))
+
+    # 顺序读取归档，多读一行判断是否还有下一页
+    start = (page - 1) * per_page
+    logs = list(islice(rows, start, start + per_page + 1))
+
+    return jsonify({
+        'success': True,
+        'month': month,
+        'page': page,
+        'per_page': per_page,
+        'has_next': len(logs) > per_page,
+        'logs': logs[:per_page]
+    })
+
+
+@web_bp.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """查询后台任务状态"""
+    from models.job import Job
+    from utils.jobs import job_runner
+
+    job = db.session.get(Job, job_id)
+    if job is None or (job.user_id != current_user.id and not current_user.is_admin()):
+        return jsonify({
+            'success': False,
+            'message': '任务不存在'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'job': job_runner.get_job(job_id),
+        'download_url': url_for('web.download_job_result', job_id=job_id) if job.result_file else None
+    })
+
+
+@web_bp.route('/jobs/<job_id>/download')
+@login_required
+def download_job_result(job_id):
+    """下载后台任务生成的文件"""
+    from models.job import Job
+
+    job = db.session.get(Job, job_id)
+    if job is None or (job.user_id != current_user.id and not current_user.is_admin()) \
+            or not job.result_file or not os.path.exists(job.result_file):
+        flash('任务文件不存在', 'error')
+        return redirect(url_for('web.whitelist'))
+
+    result = json.loads(job.result) if job.result else {}
+    return send_file(job.result_file, mimetype=result.get('mimetype'), as_attachment=True,
+                     download_name=result.get('filename') or os.path.basename(job.result_file))
+
+
 @web_bp.route('/api/docs')
 @login_required
 def api_docs():
@@ -705,92 +912,35 @@ def import_whitelist():
             flash('请选择JSON文件', 'error')
             return redirect(url_for('web.whitelist'))
 
-        if not file.filename.endswith('.json'):
-            flash('只支持JSON文件', 'error')
-            return redirect(url_for('web.whitelist'))
-
-        # 读取文件内容
-        file_content = file.read().decode('utf-8')
-        data = json.loads(file_content)
-
-        if not isinstance(data, list):
-            flash('JSON格式不正确，应该是一个数组', 'error')
+        if not file.filename.endswith(('.json', '.ndjson')):
+            flash('只支持JSON或NDJSON文件', 'error')
             return redirect(url_for('web.whitelist'))
 
-        # 获取导入选项
-        skip_existing = request.form.get('skip_existing') == 'on'
-        set_inactive = request.form.get('set_inactive') == 'on'
-        description = request.form.get('description', '').strip()
-
-        imported_count = 0
-        skipped_count = 0
-        error_count = 0
-
-        for item in data:
-            try:
-                # 验证数据格式
-                if not isinstance(item, dict) or 'type' not in item or 'value' not in item:
-                    error_count += 1
-                    continue
-
-                entry_type = item['type'].lower().strip()
-                value = item['value'].strip()
-
-                # 验证类型
-                if entry_type not in ['name', 'uuid', 'ip']:
-                    error_count += 1
-                    continue
-
-                # 检查是否已存在
-                existing = WhitelistEntry.query.filter_by(
-                    type=entry_type,
-                    value=value
-                ).first()
-
-                if existing and skip_existing:
-                    skipped_count += 1
-                    continue
-
-                # 创建或更新条目
-                if existing:
-                    # 更新现有条目
-                    existing.description = description or existing.description
-                    existing.is_active = not set_inactive if set_inactive else existing.is_active
-                else:
-                    # 创建新条目
-                    entry = WhitelistEntry(
-                        type=entry_type,
-                        value=value,
-                        description=description,
-                        created_by=current_user.username,
-                        is_active=not set_inactive
-                    )
-                    db.session.add(entry)
-
-                imported_count += 1
-
-            except Exception as e:
-                error_count += 1
-                print(f"导入条目失败: {e}")
-
-        db.session.commit()
-
-        # 记录导入操作日志
-        log = Log(
-            level='info',
-            message=f'导入白名单数据: {imported_count}条成功，{skipped_count}条跳过，{error_count}条错误',
-            source='web',
-            ip_address=request.remote_addr,
+        # 上传文件保存到任务目录，由后台任务解析导入
+        from utils.jobs import job_runner
+        from utils.whitelist_import import import_job
+
+        upload_path = os.path.join(job_runner.folder(), f'{uuid.uuid4()}.upload')
+        file.save(upload_path)
+
+        job_id = job_runner.submit(
+            'import', import_job,
+            args=(upload_path, file.filename),
+            kwargs={
+                'created_by': current_user.username,
+                'user_id': current_user.id,
+                'remote_addr': request.remote_addr,
+                'skip_existing': request.form.get('skip_existing') == 'on',
+                'set_inactive': request.form.get('set_inactive') == 'on',
+                'description': request.form.get('description', '').strip()
+            },
             user_id=current_user.id,
-            details=f'file: {file.filename}, total_entries: {len(data)}'
+            message=f'导入 {file.filename}',
+            upload_file=upload_path
         )
-        db.session.add(log)
-        db.session.commit()
-
-        flash(f'导入完成: {imported_count}条成功导入，{skipped_count}条跳过，{error_count}条错误', 'success')
+        flash(f'导入任务已提交: {file.filename}', 'info')
+        return redirect(url_for('web.whitelist', job=job_id))
 
-    except json.JSONDecodeError:
-        flash('JSON文件格式不正确', 'error')
     except Exception as e:
         db.session.rollback()
         flash(f'导入失败: {str(e)}', 'error')
@@ -801,57 +951,65 @@ def import_whitelist():
 @web_bp.route('/whitelist/export')
 @login_required
 def export_whitelist():
-    """导出白名单为JSON"""
+    """导出白名单（流式输出，支持 JSON / NDJSON / CSV，可选 gzip 压缩）"""
+    from utils.whitelist_export import (
+        EXPORT_FORMATS, export_statement, iter_export_rows, iter_export, iter_encoded, export_filename
+    )
+
     try:
         # 获取查询参数
         active_only = request.args.get('active_only', 'true').lower() == 'true'
         include_expired = request.args.get('include_expired', 'false').lower() == 'true'
+        export_format = request.args.get('format', 'json').lower()
+        compress = request.args.get('gzip', 'false').lower() == 'true'
 
-        # 构建查询
-        query = WhitelistEntry.query
-
-        if active_only:
-            query = query.filter_by(is_active=True)
-
-            if not include_expired:
-                # 排除过期的条目
-                query = query.filter(or_(
-                    WhitelistEntry.expires_at.is_(None),
-                    WhitelistEntry.expires_at > datetime.utcnow()
-                ))
-
-        entries = query.all()
-
-        # 构建导出数据
-        export_data = []
-        for entry in entries:
-            export_data.append({
-                'type': entry.type,
-                'value': entry.value,
-                'description': entry.description,
-                'created_by': entry.created_by,
-                'created_at': entry.created_at.isoformat() if entry.created_at else None,
-                'expires_at': entry.expires_at.isoformat() if entry.expires_at else None,
-                'is_active': entry.is_active
-            })
+        if export_format not in EXPORT_FORMATS:
+            flash(f'不支持的导出格式: {export_format}', 'error')
+            return redirect(url_for('web.whitelist'))
 
-        # 记录导出操作日志
-        log = Log(
-            level='info',
-            message=f'导出白名单数据: {len(entries)}条',
-            source='web',
-            ip_address=request.remote_addr,
-            user_id=current_user.id
-        )
-        db.session.add(log)
-        db.session.commit()
+        # 大量条目可以在后台任务中导出到文件，完成后下载
+        if request.args.get('background', 'false').lower() == 'true':
+            from utils.jobs import job_runner
+            from utils.whitelist_export import export_job
+
+            job_id = job_runner.submit(
+                'export', export_job,
+                args=(active_only, include_expired, export_format, compress),
+                kwargs={'user_id': current_user.id, 'remote_addr': request.remote_addr},
+                user_id=current_user.id,
+                message=f'导出 {export_format.upper()}'
+            )
+            flash('导出任务已提交，完成后可下载', 'info')
+            return redirect(url_for('web.whitelist', job=job_id))
+
+        statement = export_statement(active_only, include_expired)
+        user_id = current_user.id
+        remote_addr = request.remote_addr
+
+        def generate():
+            counter = {}
+            chunks = iter_export(iter_export_rows(statement), export_format, counter)
+            yield from iter_encoded(chunks, compress)
+
+            # 输出完成后记录导出操作日志
+            log = Log(
+                level='info',
+                message=f'导出白名单数据: {counter["count"]}条',
+                source='web',
+                ip_address=remote_addr,
+                user_id=user_id,
+                details=f'format: {export_format}, gzip: {compress}'
+            )
+            db.session.add(log)
+            db.session.commit()
 
-        # 创建JSON响应
-        from flask import make_response
-        response = make_response(json.dumps(export_data, indent=2, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json'
-        response.headers[
-            'Content-Disposition'] = f'attachment; filename=whitelist_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+        mimetype = 'application/gzip' if compress else EXPORT_FORMATS[export_format][0]
+        response = Response(stream_with_context(generate()), mimetype=mimetype)
+        if not compress:
+            response.mimetype_params['charset'] = 'utf-8'
+        response.headers['Content-Disposition'] = f'attachment; filename={export_filename(export_format, compress)}'
+        # 禁止反向代理缓冲，边查询边输出
+        response.headers['X-Accel-Buffering'] = 'no'
 
         return response
 
@@ -917,7 +1075,9 @@ def save_timezone():
 
         # 保存到数据库
         from models.setting import Setting
+        from utils.timezone import invalidate_timezone_cache
         Setting.set_value('timezone', timezone_str, '系统时区设置', 'system')
+        invalidate_timezone_cache()
 
         # 更新应用配置（需要重启应用才能完全生效）
         # 这里我们先保存到数据库，应用会在下次请求时加载
@@ -1157,7 +1317,7 @@ def create_web_token():
 
         # 创建Token
         from utils.timezone import now_utc
-        from datetime import timedelta
+        from datetime import timedelta, timezone
 
         token = Token(
             token=token_str,
@@ -1225,7 +1385,9 @@ def toggle_token(token_id):
 
     old_status = token.is_active
     token.is_active = not token.is_active
+    token.deactivated_reason = None
     db.session.commit()
+    token_cache.invalidate(token.id)
 
     # 记录操作日志
     log = Log(
@@ -1272,8 +1434,10 @@ def delete_token(token_id):
     )
     db.session.add(log)
 
+    token_id = token.id
     db.session.delete(token)
     db.session.commit()
+    token_cache.invalidate(token_id)
 
     flash(f'Token [{token_name}] 已删除', 'success')
     return redirect(url_for('web.token_management'))
@@ -1303,13 +1467,21 @@ def refresh_token(token_id):
 
         # 可选：重置过期时间
         from utils.timezone import now_utc
-        from datetime import timedelta
-
-        # 保持原有过期时间或重置为30天后
-        if token.expires_at and token.expires_at < now_utc():
+        from datetime import timedelta, timezone
+
+        # 保持原有过期时间或重置为30天后；只重新启用由到期调度器停用的Token，管理员手动禁用的保持禁用
+        # 数据库读出的时间不带时区信息（UTC）
+        expires_at = token.expires_at
+        if expires_at and expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        if expires_at and expires_at < now_utc():
             token.expires_at = now_utc() + timedelta(days=30)
+            if token.deactivated_reason == 'expired':
+                token.is_active = True
+                token.deactivated_reason = None
 
         db.session.commit()
+        token_cache.invalidate(token.id)
 
         # 记录操作日志
         log = Log(
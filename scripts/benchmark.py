@@ -0,0 +1,109 @@
+# scripts/benchmark.py
+"""
+简单的API压测脚本（只使用标准库）
+
+用法:
+    python app.py --no-gui                          # 开发服务器
+    python app.py --workers 4 --threads 8           # 生产服务器
+    python scripts/benchmark.py --token TOKEN --endpoint sync --concurrency 32 --duration 15
+
+测量指定服务器的吞吐量和延迟；多个工作进程只在多核主机上才能提高吞吐量，请在实际部署的主机上测量
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def build_request(base_url, token, endpoint, batch_size):
+    """根据测试的接口构造请求"""
+    headers = {'Authorization': f'Bearer {token}'}
+    if endpoint == 'sync':
+        return lambda: urllib.request.Request(f'{base_url}/api/whitelist/sync', headers=headers)
+
+    headers['Content-Type'] = 'application/json'
+
+    def login_event():
+        return {
+            'player_name': 'bench_' + uuid.uuid4().hex[:8],
+            'player_uuid': str(uuid.uuid4()),
+            'player_ip': '127.0.0.1',
+            'allowed': True,
+            'check_type': 'name'
+        }
+
+    if endpoint == 'login':
+        return lambda: urllib.request.Request(
+            f'{base_url}/api/login/log', headers=headers, method='POST',
+            data=json.dumps(login_event()).encode()
+        )
+    return lambda: urllib.request.Request(
+        f'{base_url}/api/login/log/batch', headers=headers, method='POST',
+        data=json.dumps([login_event() for _ in range(batch_size)]).encode()
+    )
+
+
+def worker(make_request, deadline, latencies, errors, lock):
+    local_latencies = []
+    local_errors = 0
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(make_request(), timeout=30) as response:
+                response.read()
+        except (urllib.error.URLError, OSError):
+            local_errors += 1
+            continue
+        local_latencies.append(time.perf_counter() - started)
+    with lock:
+        latencies.extend(local_latencies)
+        errors[0] += local_errors
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CWhitelist API 压测')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='服务器地址')
+    parser.add_argument('--token', required=True, help='API Token（sync 需要读取权限，login/batch 需要写入权限）')
+    parser.add_argument('--endpoint', choices=['sync', 'login', 'batch'], default='sync', help='测试的接口')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发连接数')
+    parser.add_argument('--duration', type=float, default=10, help='测试时长（秒）')
+    parser.add_argument('--batch-size', type=int, default=100, help='batch 接口每个请求的事件数')
+    args = parser.parse_args()
+
+    make_request = build_request(args.url.rstrip('/'), args.token, args.endpoint, args.batch_size)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    started = time.monotonic()
+    deadline = started + args.duration
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for _ in range(args.concurrency):
+            executor.submit(worker, make_request, deadline, latencies, errors, lock)
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    print(f'接口: {args.endpoint}  并发: {args.concurrency}  时长: {elapsed:.1f}s')
+    print(f'请求数: {len(latencies)}  失败: {errors[0]}  吞吐量: {len(latencies) / elapsed:.1f} req/s')
+    if args.endpoint == 'batch':
+        print(f'事件吞吐量: {len(latencies) * args.batch_size / elapsed:.1f} events/s')
+    print('延迟: p50 {:.1f}ms  p95 {:.1f}ms  p99 {:.1f}ms'.format(
+        percentile(latencies, 50) * 1000,
+        percentile(latencies, 95) * 1000,
+        percentile(latencies, 99) * 1000
+    ))
+
+
+if __name__ == '__main__':
+    main()
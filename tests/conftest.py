@@ -0,0 +1,48 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 应用在导入时读取配置，测试使用临时的SQLite数据库
+_db_dir = tempfile.mkdtemp(prefix='cwhitelist-test-')
+os.environ.setdefault('CWHITELIST_NO_GUI', '1')
+os.environ.setdefault('FLASK_CONFIG', 'config.Config')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'test.db')
+
+API_TOKEN = 't' * 64
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app as flask_app
+    from models.database import db
+    from models.token import Token
+    from models.user import User
+
+    flask_app.config.update(TESTING=True)
+    with flask_app.app_context():
+        db.create_all()
+        user = User(username='admin', email='admin@example.com', role='admin')
+        user.set_password('password1')
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(Token(token=API_TOKEN, name='test', user_id=user.id,
+                             can_read=True, can_write=True, can_delete=True, can_manage=True))
+        db.session.commit()
+    return flask_app
+
+
+@pytest.fixture
+def auth_headers():
+    return {'Authorization': f'Bearer {API_TOKEN}'}
+
+
+@pytest.fixture
+def archive_folder(app, tmp_path):
+    app.config['LOG_ARCHIVE_FOLDER'] = str(tmp_path)
+    yield tmp_path
+    app.config.pop('LOG_ARCHIVE_FOLDER')
@@ -0,0 +1,149 @@
+# tests/test_expiry.py
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+
+def insert_entry(value, expires_at):
+    """绕过会话直接写入（与批量导入、其他进程的写入一样，调度器不知道这个到期时间）"""
+    from models.database import db
+    from models.whitelist import WhitelistEntry
+    from models.whitelist_change import WhitelistChange
+
+    entry_id = str(uuid.uuid4())
+    with db.engine.begin() as connection:
+        connection.execute(WhitelistEntry.__table__.insert().values(
+            id=entry_id, type='name', value=value, created_by='test', is_active=True,
+            expires_at=expires_at, login_count=0
+        ))
+        connection.execute(WhitelistChange.__table__.insert().values(
+            entry_id=entry_id, type='name', value=value, action='add'
+        ))
+    return entry_id
+
+
+def add_token(name, expires_at, is_active=True):
+    from models.database import db
+    from models.token import Token
+    from models.user import User
+
+    user = User.query.filter_by(username='admin').first()
+    token = Token(token=uuid.uuid4().hex * 2, name=name, user_id=user.id, can_read=True,
+                  expires_at=expires_at, is_active=is_active)
+    db.session.add(token)
+    db.session.commit()
+    return token.id
+
+
+def expiry_changes(entry_id):
+    from models.whitelist_change import WhitelistChange
+    return WhitelistChange.query.filter_by(entry_id=entry_id, action='update').count()
+
+
+def test_catch_up_deactivates_missed_deadlines_once(app):
+    from models.database import db
+    from models.token import Token
+    from models.whitelist import WhitelistEntry
+    from utils.expiry import expiry_scheduler
+
+    past = datetime.utcnow() - timedelta(hours=1)
+    with app.app_context():
+        entry_id = insert_entry('expiry_missed_player', past)
+        token_id = add_token('expiry_missed_token', past)
+
+        # 前面的测试请求可能已启动后台线程，由哪一方停用不影响结果
+        expiry_scheduler.catch_up()
+        db.session.expire_all()
+        assert db.session.get(WhitelistEntry, entry_id).is_active is False
+        token = db.session.get(Token, token_id)
+        assert token.is_active is False
+        assert token.deactivated_reason == 'expired'
+        assert expiry_changes(entry_id) == 1
+
+        # 再次执行不会重复停用或重复记录变更
+        assert expiry_scheduler.catch_up() == (0, 0)
+        assert expiry_changes(entry_id) == 1
+
+
+def test_concurrent_expiry_records_each_entry_once(app):
+    from models.database import db
+    from models.log import Log
+    from utils.expiry import expiry_scheduler
+
+    past = datetime.utcnow() - timedelta(seconds=1)
+    with app.app_context():
+        entry_ids = [insert_entry(f'expiry_race_player_{number}', past) for number in range(20)]
+        logs_before = Log.query.filter(Log.message.like('白名单条目到期自动停用%')).count()
+
+    results = []
+
+    def expire():
+        with app.app_context():
+            try:
+                results.append(expiry_scheduler._expire_entries(datetime.utcnow()))
+            finally:
+                db.session.remove()
+
+    # 多个工作进程同时被同一个到期时间唤醒
+    threads = [threading.Thread(target=expire) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 只有一个执行者停用这些条目（也可能是已启动的后台线程）
+    assert results.count(0) >= 3 and sum(results) in (0, 20)
+    with app.app_context():
+        assert all(expiry_changes(entry_id) == 1 for entry_id in entry_ids)
+        assert Log.query.filter(Log.message.like('白名单条目到期自动停用%')).count() == logs_before + 1
+
+
+def test_snapshot_leaves_out_entries_unknown_to_scheduler(app, auth_headers, monkeypatch):
+    # 每次读取都检查版本号，发现其他进程的写入
+    monkeypatch.setitem(app.config, 'WHITELIST_CACHE_CHECK_INTERVAL', 0.001)
+    client = app.test_client()
+    with app.app_context():
+        insert_entry('expiry_unscheduled_player', datetime.utcnow() + timedelta(seconds=1))
+
+    def allowed():
+        response = client.post('/api/whitelist/check', headers=auth_headers,
+                               json={'name': 'expiry_unscheduled_player'})
+        return response.get_json()['allowed']
+
+    def synced():
+        entries = client.get('/api/whitelist/sync', headers=auth_headers).get_json()['entries']
+        return 'expiry_unscheduled_player' in {entry['value'] for entry in entries}
+
+    assert allowed() and synced()
+
+    # 到期后立即从快照中排除，不等待调度器重新加载
+    time.sleep(1.1)
+    assert not allowed()
+    assert not synced()
+
+
+def test_refresh_reenables_only_tokens_disabled_by_expiry(app):
+    from models.database import db
+    from models.token import Token
+    from utils.expiry import expiry_scheduler
+
+    past = datetime.utcnow() - timedelta(days=1)
+    with app.app_context():
+        expired_id = add_token('expiry_refresh_expired', past)
+        expiry_scheduler.expire_due()
+        disabled_id = add_token('expiry_refresh_disabled', past, is_active=False)
+
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'admin', 'password': 'password1'})
+    for token_id in (expired_id, disabled_id):
+        assert client.post(f'/tokens/{token_id}/refresh').status_code == 302
+
+    with app.app_context():
+        expired = db.session.get(Token, expired_id)
+        disabled = db.session.get(Token, disabled_id)
+        assert expired.is_active is True and expired.deactivated_reason is None
+        assert expired.expires_at > datetime.utcnow()
+        # 管理员手动禁用的Token续期后仍保持禁用
+        assert disabled.is_active is False
+        assert disabled.expires_at > datetime.utcnow()
@@ -0,0 +1,54 @@
+# tests/test_log_partitions.py
+from datetime import datetime
+
+
+def add_logs(count, message, created_at=None):
+    from models.database import db
+    from models.log import Log
+
+    for number in range(count):
+        db.session.add(Log(level='info', source='system', message=f'{message} {number}', created_at=created_at))
+    db.session.commit()
+
+
+def test_rotation_reads_across_partitions_and_archives_whole_partition(app, archive_folder):
+    from models.database import db
+    from models.log import Log
+    from models.setting import Setting
+    from utils.log_archive import iter_archive
+    from utils.log_partitions import MONTH_KEY, log_partitions
+    from utils.log_retention import log_retention
+    from utils.stats_counters import stats_counters
+
+    with app.app_context():
+        log_partitions.rotate()
+        # 模拟 logs 表从2000年1月开始写入，下一次检查时轮换
+        Setting.set_value(MONTH_KEY, '2000-01', category='system')
+        add_logs(3, 'cold', created_at=datetime(2000, 1, 15))
+        cold_ids = {log.id for log in Log.query.filter(Log.message.like('cold %'))}
+        # 轮换时 logs 表中的全部日志（包括之前的测试写入的）都进入该分区
+        partition_ids = {log.id for log in Log.query}
+        total_before = stats_counters.log_total()
+
+        name = log_partitions.rotate()
+        assert name == 'logs_2000_01'
+        assert log_partitions.rotate() is None
+        log_partitions.finalize_pending()
+        db.session.remove()
+
+        add_logs(2, 'hot')
+        hot_ids = {log.id for log in Log.query.filter(Log.message.like('hot %'))}
+        assert min(hot_ids) > max(cold_ids)
+        assert Log.query.filter(Log.message.like('cold %')).count() == 0
+
+        logs = Log.all_partitions()
+        found = {log.id for log in db.session.query(logs).filter(logs.message.like('cold %') | logs.message.like('hot %'))}
+        assert found == cold_ids | hot_ids
+
+        stats_counters.reconcile()
+        assert stats_counters.log_total() == total_before + 2
+
+        assert log_retention.archive_month('2000-01') == len(partition_ids)
+        assert log_partitions.partitions() == []
+        assert 'logs_2000_01' not in db.inspect(db.engine).get_table_names()
+        assert sorted(row['id'] for row in iter_archive('2000-01')) == sorted(cold_ids)
@@ -0,0 +1,84 @@
+# tests/test_log_retention.py
+from datetime import datetime, timedelta
+
+
+def add_logs(count, message, created_at, level='info'):
+    from models.database import db
+    from models.log import Log
+
+    for number in range(count):
+        db.session.add(Log(level=level, source='system', message=f'{message} {number}', created_at=created_at))
+    db.session.commit()
+
+
+def messages(prefix):
+    from models.database import db
+    from models.log import Log
+
+    return sorted(log.message for log in db.session.query(Log).filter(Log.message.like(f'{prefix} %')))
+
+
+def test_delete_where_removes_matching_rows_in_chunks(app, monkeypatch):
+    from models.log import Log
+    from utils.log_retention import log_retention
+
+    monkeypatch.setitem(app.config, 'LOG_RETENTION_CHUNK_SIZE', 3)
+    with app.app_context():
+        add_logs(8, 'chunk_drop', datetime(2001, 1, 10))
+        add_logs(2, 'chunk_keep', datetime(2001, 1, 10))
+
+        progress = []
+        deleted = log_retention.delete_where(Log, Log.message.like('chunk_drop %'), on_progress=progress.append)
+
+        assert deleted == 8
+        # 每块单独提交并报告进度
+        assert progress == [3, 6, 8]
+        assert messages('chunk_drop') == []
+        assert messages('chunk_keep') == ['chunk_keep 0', 'chunk_keep 1']
+
+
+def test_purge_applies_first_matching_policy(app, monkeypatch):
+    from utils.log_retention import log_retention
+
+    monkeypatch.setitem(app.config, 'LOG_RETENTION_POLICIES', [{'level': 'login', 'days': 7}])
+    now = datetime.utcnow()
+    with app.app_context():
+        add_logs(2, 'policy_login_old', now - timedelta(days=10), level='login')
+        add_logs(1, 'policy_login_new', now - timedelta(days=1), level='login')
+        add_logs(2, 'policy_info_kept', now - timedelta(days=10))
+        add_logs(1, 'policy_info_old', now - timedelta(days=40))
+
+        results = log_retention.purge()
+
+        by_policy = {result['policy']: result['deleted'] for result in results}
+        assert by_policy['level=login'] >= 2
+        assert by_policy['default'] >= 1
+        assert messages('policy_login_old') == []
+        assert messages('policy_login_new') == ['policy_login_new 0']
+        # 不匹配登录策略的日志按默认的30天保留
+        assert messages('policy_info_kept') == ['policy_info_kept 0', 'policy_info_kept 1']
+        assert messages('policy_info_old') == []
+
+
+def test_archive_month_round_trips_through_iter_archive(app, archive_folder, monkeypatch):
+    from models.database import db
+    from models.log import Log
+    from utils.log_archive import iter_archive
+    from utils.log_retention import log_retention
+
+    monkeypatch.setitem(app.config, 'LOG_RETENTION_CHUNK_SIZE', 2)
+    with app.app_context():
+        add_logs(5, 'archive_march', datetime(2001, 3, 5, 12, 30))
+        add_logs(1, 'archive_april', datetime(2001, 4, 1))
+        expected = sorted(log.id for log in db.session.query(Log).filter(Log.message.like('archive_march %')))
+
+        # 按块导出后删除，每块追加为一个gzip成员
+        assert log_retention.archive_month('2001-03') == 5
+        assert messages('archive_march') == []
+        assert messages('archive_april') == ['archive_april 0']
+
+        archived = sorted(iter_archive('2001-03'), key=lambda row: row['id'])
+        assert [row['id'] for row in archived] == expected
+        assert [row['message'] for row in archived] == [f'archive_march {number}' for number in range(5)]
+        assert all(row['created_at'] == '2001-03-05T12:30:00' and row['level'] == 'info' for row in archived)
+        assert [row['id'] for row in iter_archive('2001-03', search='archive_march 3')] == [archived[3]['id']]
@@ -0,0 +1,85 @@
+# tests/test_log_writer.py
+import queue
+import threading
+
+import pytest
+
+from utils.log_writer import LoginLogWriter
+
+
+@pytest.fixture
+def writer(app, monkeypatch):
+    """队列容量为1、后台线程停滞的写入器，第二条日志即触发背压"""
+    monkeypatch.setitem(app.config, 'LOGIN_LOG_ASYNC', True)
+    writer = LoginLogWriter()
+    writer.app = app
+    writer._queue = queue.Queue(maxsize=1)
+    release = threading.Event()
+    writer._thread = threading.Thread(target=release.wait, daemon=True)
+    writer._thread.start()
+    yield writer
+    release.set()
+
+
+def login_row(player_name):
+    from models.log import Log
+    return Log.login_log_row(player_name=player_name, player_uuid='uuid-' + player_name,
+                             player_ip='127.0.0.1', allowed=True, check_type='name')
+
+
+def stored(app, player_name):
+    from models.database import db
+    from models.log import Log
+
+    with app.app_context():
+        return db.session.query(Log).filter_by(player_name=player_name).count()
+
+
+def test_sync_backpressure_writes_in_request_thread(app, writer, monkeypatch):
+    monkeypatch.setitem(app.config, 'LOGIN_LOG_BACKPRESSURE', 'sync')
+    assert writer.submit(login_row('bp_sync_queued')) == 'queued'
+    with app.app_context():
+        assert writer.submit(login_row('bp_sync_written')) == 'written'
+
+    assert stored(app, 'bp_sync_written') == 1
+    assert stored(app, 'bp_sync_queued') == 0
+    assert writer.rejected_count == 0
+
+
+def test_reject_backpressure_drops_without_writing(app, writer, monkeypatch):
+    monkeypatch.setitem(app.config, 'LOGIN_LOG_BACKPRESSURE', 'reject')
+    assert writer.submit(login_row('bp_reject_queued')) == 'queued'
+    assert writer.submit(login_row('bp_reject_dropped')) == 'rejected'
+
+    assert writer.rejected_count == 1
+    assert writer.qsize() == 1
+    assert stored(app, 'bp_reject_dropped') == 0
+
+
+def test_block_backpressure_waits_for_room(app, writer, monkeypatch):
+    monkeypatch.setitem(app.config, 'LOGIN_LOG_BACKPRESSURE', 'block')
+    monkeypatch.setitem(app.config, 'LOGIN_LOG_BLOCK_TIMEOUT', 0.05)
+    assert writer.submit(login_row('bp_block_first')) == 'queued'
+    # 等待超时仍没有空间时拒绝
+    assert writer.submit(login_row('bp_block_timeout')) == 'rejected'
+
+    # 等待期间队列腾出空间时入队
+    monkeypatch.setitem(app.config, 'LOGIN_LOG_BLOCK_TIMEOUT', 5)
+    threading.Timer(0.1, writer._queue.get).start()
+    assert writer.submit(login_row('bp_block_second')) == 'queued'
+    assert writer._queue.get_nowait()['player_name'] == 'bp_block_second'
+    assert writer.rejected_count == 1
+
+
+def test_stop_flushes_queued_rows(app, writer, monkeypatch):
+    monkeypatch.setitem(app.config, 'LOGIN_LOG_BACKPRESSURE', 'reject')
+    assert writer.submit(login_row('bp_stop_queued')) == 'queued'
+    assert stored(app, 'bp_stop_queued') == 0
+
+    writer.stop(timeout=0.1)
+    assert writer.qsize() == 0
+    assert stored(app, 'bp_stop_queued') == 1
+    # 停止后的提交直接同步写入
+    with app.app_context():
+        assert writer.submit(login_row('bp_after_stop')) == 'written'
+    assert stored(app, 'bp_after_stop') == 1
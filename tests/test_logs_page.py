@@ -0,0 +1,21 @@
+# tests/test_logs_page.py
+def test_logs_page_paginates_without_counting(app):
+    from models.database import db
+    from models.log import Log
+
+    with app.app_context():
+        for number in range(3):
+            db.session.add(Log(level='warning', source='pagination', message=f'page log {number}'))
+        db.session.commit()
+
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'admin', 'password': 'password1'})
+
+    first = client.get('/logs?source=pagination&per_page=2')
+    assert first.status_code == 200
+    assert first.data.count(b'page log') == 2
+    assert b'page=2' in first.data
+
+    last = client.get('/logs?source=pagination&per_page=2&page=2')
+    assert last.data.count(b'page log') == 1
+    assert b'page=3' not in last.data
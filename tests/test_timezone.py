@@ -0,0 +1,14 @@
+# tests/test_timezone.py
+def test_timezone_lookup_does_not_flush_caller_session(app):
+    from models.database import db
+    from models.setting import Setting
+    from utils.timezone import get_app_timezone, invalidate_timezone_cache
+
+    with app.app_context():
+        pending = Setting(key='tz_pending', value='x')
+        db.session.add(pending)
+        invalidate_timezone_cache()
+        get_app_timezone()
+
+        assert pending in db.session.new
+        db.session.rollback()
@@ -0,0 +1,42 @@
+# tests/test_token_cache.py
+import secrets
+
+
+def test_token_change_from_other_process_reaches_cache(app):
+    from models.database import db
+    from models.token import Token
+    from utils.token_cache import token_cache
+
+    with app.app_context():
+        token = Token(token=secrets.token_hex(32), name='revoked', user_id=1, can_read=True)
+        db.session.add(token)
+        db.session.commit()
+        token_str, token_id = token.token, token.id
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token_str}'}
+    assert client.get('/api/tokens/verify', headers=headers).status_code == 200
+
+    # 模拟其他工作进程禁用Token：只更新数据库，不调用本进程缓存的 invalidate
+    with app.app_context():
+        db.session.get(Token, token_id).is_active = False
+        db.session.commit()
+
+    app.config['TOKEN_CACHE_CHECK_INTERVAL'] = 0
+    try:
+        assert client.get('/api/tokens/verify', headers=headers).status_code == 401
+    finally:
+        app.config['TOKEN_CACHE_CHECK_INTERVAL'] = 5
+        token_cache.clear()
+
+
+def test_usage_statistics_do_not_bump_generation(app):
+    from models.database import db
+    from models.token import Token
+    from utils.token_cache import read_generation
+
+    with app.app_context():
+        generation = read_generation()
+        token = db.session.get(Token, 1)
+        token.update_usage('127.0.0.1')
+        assert read_generation() == generation
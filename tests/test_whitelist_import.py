@@ -0,0 +1,99 @@
+# tests/test_whitelist_import.py
+import json
+
+import pytest
+import sqlalchemy as sa
+
+
+class Context:
+    def progress(self, *args, **kwargs):
+        pass
+
+
+def encode(filename, items):
+    if filename.endswith('.ndjson'):
+        return '\n'.join(json.dumps(item) for item in items)
+    return json.dumps(items)
+
+
+def run_import(tmp_path, filename, content, **kwargs):
+    from utils.whitelist_import import import_job
+
+    path = tmp_path / filename
+    path.write_text(content, encoding='utf-8')
+    return import_job(Context(), str(path), filename, created_by='test', user_id=None,
+                      remote_addr='127.0.0.1', **kwargs)
+
+
+@pytest.mark.parametrize('filename', ['entries.json', 'entries.ndjson'])
+def test_import_deduplicates_within_file_and_against_database(app, tmp_path, filename):
+    from models.whitelist import WhitelistEntry
+    from models.whitelist_change import WhitelistChange
+
+    prefix = filename.split('.')[1]
+    items = [
+        {'type': 'name', 'value': f'{prefix}_existing'},
+        {'type': 'name', 'value': f'{prefix}_new'},
+        {'type': 'name', 'value': f'{prefix}_new'},
+        {'type': 'bogus', 'value': 'x'},
+    ]
+
+    with app.app_context():
+        run_import(tmp_path, filename, encode(filename, items[:1]))
+        revision = WhitelistChange.current_revision()
+
+        summary = run_import(tmp_path, filename, encode(filename, items), skip_existing=True)
+
+        assert (summary['imported'], summary['skipped'], summary['errors']) == (1, 2, 1)
+        assert WhitelistEntry.query.filter_by(type='name', value=f'{prefix}_new').count() == 1
+        changes = WhitelistChange.query.filter(WhitelistChange.revision > revision).all()
+        assert [(change.value, change.action) for change in changes] == [(f'{prefix}_new', 'add')]
+
+
+def test_rows_inserted_concurrently_are_skipped(app):
+    from models.database import db
+    from models.whitelist import WhitelistEntry
+    from models.whitelist_change import WhitelistChange
+    from utils.whitelist_import import WhitelistImporter
+
+    with app.app_context():
+        importer = WhitelistImporter(created_by='test', commit_chunks=True)
+        importer.load_existing()
+
+        # 加载已有键之后，其他进程写入了同一个条目
+        WhitelistChange.record(WhitelistEntry(type='name', value='import_race', created_by='other'), 'add')
+        db.session.commit()
+        revision = WhitelistChange.current_revision()
+
+        importer.run([{'type': 'name', 'value': 'import_race'}])
+
+        assert (importer.imported_count, importer.skipped_count) == (0, 1)
+        assert WhitelistEntry.query.filter_by(type='name', value='import_race').count() == 1
+        assert WhitelistChange.current_revision() == revision
+
+
+def test_upgrade_schema_merges_duplicates_before_unique_index(app):
+    from models.whitelist import WhitelistEntry
+    from models.whitelist_change import WhitelistChange
+    from utils.schema import dedupe_whitelist_entries
+
+    engine = sa.create_engine('sqlite://')
+    WhitelistEntry.__table__.create(engine)
+    WhitelistChange.__table__.create(engine)
+    table = WhitelistEntry.__table__
+    with engine.begin() as connection:
+        connection.exec_driver_sql('DROP INDEX uq_whitelist_entries_type_value')
+        connection.execute(table.insert(), [
+            {'id': 'a', 'type': 'name', 'value': 'dup', 'created_by': 't', 'is_active': False},
+            {'id': 'b', 'type': 'name', 'value': 'dup', 'created_by': 't', 'is_active': True},
+            {'id': 'c', 'type': 'name', 'value': 'single', 'created_by': 't', 'is_active': True},
+        ])
+
+    with engine.begin() as connection:
+        assert dedupe_whitelist_entries(connection)
+        remaining = connection.execute(sa.select(table.c.id).order_by(table.c.id)).scalars().all()
+        removed = connection.execute(sa.select(WhitelistChange.__table__.c.entry_id)).scalars().all()
+
+    # 保留启用的条目，删除的条目记录为变更
+    assert remaining == ['b', 'c']
+    assert removed == ['a']
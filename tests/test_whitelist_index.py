@@ -0,0 +1,72 @@
+# tests/test_whitelist_index.py
+from utils.whitelist_index import WhitelistIndex
+
+
+def entry(entry_id, entry_type, value):
+    return {'id': entry_id, 'type': entry_type, 'value': value}
+
+
+def lookups(index):
+    """对比索引时使用的查询结果"""
+    queries = [
+        {'name': 'alice'}, {'name': 'ALICE'}, {'name': 'bob'},
+        {'uuid': '123e4567e89b12d3a456426614174000'},
+        {'ip': '10.0.0.1'}, {'ip': '::ffff:10.0.0.1'},
+        {'ip': '192.168.1.20'}, {'ip': '::ffff:192.168.1.20'},
+    ]
+    results = []
+    for query in queries:
+        found, check_type = index.check(**query)
+        results.append((found['id'] if found else None, check_type))
+    return results
+
+
+def test_derive_matches_rebuild_with_duplicate_keys():
+    entries = [
+        entry('1', 'name', 'Alice'),
+        entry('2', 'name', 'alice'),
+        entry('3', 'uuid', '123e4567-e89b-12d3-a456-426614174000'),
+        entry('4', 'uuid', '123E4567E89B12D3A456426614174000'),
+        entry('5', 'ip', '10.0.0.1'),
+        entry('6', 'ip', '::ffff:10.0.0.1'),
+        entry('7', 'ip', '192.168.1.0/24'),
+        entry('8', 'ip', '192.168.1.*'),
+    ]
+    index = WhitelistIndex(entries)
+
+    # 更新一个重复键条目、删除另一个重复键条目，其余条目保持不变
+    renamed = entry('1', 'name', 'Bob')
+    removed = [entries[0], entries[3], entries[5], entries[6]]
+    added = [renamed]
+    remaining = [e for e in entries if e not in removed] + added
+
+    derived = index.derive(removed, added)
+    assert lookups(derived) == lookups(WhitelistIndex(remaining))
+    assert derived.check(name='alice')[0]['id'] == '2'
+    assert derived.check(name='bob')[0]['id'] == '1'
+    assert derived.check(ip='::ffff:10.0.0.1')[0]['id'] == '5'
+
+    # 原索引不受派生影响
+    assert lookups(index) == lookups(WhitelistIndex(entries))
+
+
+def test_derive_removes_key_only_when_last_entry_removed():
+    entries = [entry('1', 'name', 'Alice'), entry('2', 'name', 'alice')]
+    index = WhitelistIndex(entries)
+
+    derived = index.derive([entries[0]], [])
+    assert derived.check(name='ALICE')[0]['id'] == '2'
+
+    derived = derived.derive([entries[1]], [])
+    assert derived.check(name='alice') == (None, None)
+
+
+def test_ipv4_mapped_addresses_match_ipv4_entries():
+    index = WhitelistIndex([
+        entry('1', 'ip', '::ffff:203.0.113.5'),
+        entry('2', 'ip', '::ffff:198.51.100.0/120'),
+    ])
+    assert index.check(ip='203.0.113.5')[0]['id'] == '1'
+    assert index.check(ip='::ffff:203.0.113.5')[0]['id'] == '1'
+    assert index.check(ip='198.51.100.77')[0]['id'] == '2'
+    assert index.check(ip='::ffff:198.51.100.77')[0]['id'] == '2'
@@ -0,0 +1,166 @@
+# tests/test_whitelist_stream.py
+import http.client
+import queue
+import socket
+import threading
+import time
+
+import pytest
+from werkzeug.serving import BaseWSGIServer
+
+from tests.conftest import API_TOKEN
+from utils.stream_server import whitelist_stream_server
+from utils.whitelist_stream import whitelist_hub
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """固定线程数的WSGI服务器，与 Gunicorn gthread 工作进程一样，每个连接占用一个线程"""
+
+    def __init__(self, app, threads):
+        super().__init__('127.0.0.1', 0, app)
+        self.requests = queue.Queue()
+        for _ in range(threads):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def process_request(self, request, client_address):
+        self.requests.put((request, client_address))
+
+    def _worker(self):
+        while True:
+            request, client_address = self.requests.get()
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+
+@pytest.fixture
+def server(app):
+    threads = 4
+    app.config.update(SERVER_THREADS=threads, WHITELIST_STREAM_MAX_CLIENTS=None, WHITELIST_STREAM_HEARTBEAT=1)
+    server = PooledWSGIServer(app, threads)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+def request(server, path, headers=None, timeout=5):
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=timeout)
+    connection.request('GET', path, headers=headers or {})
+    return connection, connection.getresponse()
+
+
+def test_open_streams_leave_threads_for_other_requests(server, auth_headers):
+    streams = []
+    statuses = []
+    try:
+        # 打开的推送连接比线程数还多
+        for _ in range(6):
+            connection, response = request(server, '/api/whitelist/stream', auth_headers)
+            statuses.append(response.status)
+            if response.status == 200:
+                streams.append(connection)
+            else:
+                response.read()
+                connection.close()
+
+        limit = whitelist_hub.client_limit
+        assert limit < 4
+        assert statuses.count(200) == limit
+        assert statuses.count(503) == 6 - limit
+
+        # 普通请求仍然有空闲线程处理
+        for _ in range(3):
+            connection, response = request(server, '/api/health')
+            assert response.status == 200
+            response.read()
+            connection.close()
+
+        # 达到上限时长轮询不等待，立即返回
+        revision = whitelist_hub.current_revision()
+        started = time.monotonic()
+        connection, response = request(server, f'/api/whitelist/sync?since={revision}&wait=10', auth_headers)
+        assert response.status == 200
+        response.read()
+        connection.close()
+        assert time.monotonic() - started < 3
+    finally:
+        for connection in streams:
+            connection.close()
+
+
+@pytest.fixture
+def stream_server(app):
+    app.config.update(WHITELIST_STREAM_PORT=0, WHITELIST_STREAM_HOST='127.0.0.1')
+    port = whitelist_stream_server.start()
+    assert port
+    yield port
+    whitelist_stream_server.stop()
+    app.config.update(WHITELIST_STREAM_PORT=None)
+
+
+def open_stream(port):
+    sock = socket.create_connection(('127.0.0.1', port), timeout=10)
+    sock.sendall(f'GET /api/whitelist/stream HTTP/1.1\r\nHost: localhost\r\n'
+                 f'Authorization: Bearer {API_TOKEN}\r\n\r\n'.encode())
+    return sock
+
+
+def read_until(sock, marker, buffer=b''):
+    while marker not in buffer:
+        data = sock.recv(4096)
+        assert data, buffer
+        buffer += data
+    return buffer
+
+
+def test_idle_streams_do_not_hold_request_threads(server, stream_server, auth_headers):
+    count = 50
+    threads_before = threading.active_count()
+    streams = []
+    try:
+        # 推送连接数远多于WSGI服务器的线程数
+        for _ in range(count):
+            streams.append(open_stream(stream_server))
+        buffers = [read_until(sock, b'event: ready') for sock in streams]
+        assert all(buffer.startswith(b'HTTP/1.1 200 OK') for buffer in buffers)
+        assert whitelist_stream_server.clients == count
+
+        # 空闲的推送连接不占用线程，只有事件循环和查询线程池
+        assert threading.active_count() - threads_before < 10
+
+        # WSGI服务器的线程全部空闲，普通请求和同步立即处理
+        for path in ('/api/health', '/api/whitelist/sync'):
+            started = time.monotonic()
+            connection, response = request(server, path, auth_headers)
+            assert response.status == 200
+            response.read()
+            connection.close()
+            assert time.monotonic() - started < 3
+
+        # 写入白名单后所有推送连接都收到变更
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=5)
+        connection.request('POST', '/api/whitelist/entries', body='{"type": "name", "value": "stream_player"}',
+                           headers=dict(auth_headers, **{'Content-Type': 'application/json'}))
+        assert connection.getresponse().status == 201
+        connection.close()
+
+        for sock, buffer in zip(streams, buffers):
+            buffer = read_until(sock, b'event: change', buffer)
+            assert b'stream_player' in read_until(sock, b'\n\n', buffer.split(b'event: change', 1)[1])
+    finally:
+        for sock in streams:
+            sock.close()
+
+
+def test_stream_server_rejects_invalid_token(stream_server):
+    sock = socket.create_connection(('127.0.0.1', stream_server), timeout=10)
+    try:
+        sock.sendall(b'GET /api/whitelist/stream?token=invalid HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        response = read_until(sock, b'}')
+        assert response.startswith(b'HTTP/1.1 401 Unauthorized')
+    finally:
+        sock.close()
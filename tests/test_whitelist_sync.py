@@ -0,0 +1,156 @@
+# tests/test_whitelist_sync.py
+def add_entry(client, headers, entry_type, value):
+    response = client.post('/api/whitelist/entries', headers=headers,
+                           json={'type': entry_type, 'value': value})
+    assert response.status_code == 201
+    return response.get_json()['entry']['id']
+
+
+def active_entries(payload):
+    return sorted((entry for entry in payload['entries'] if entry['is_active']), key=lambda entry: entry['id'])
+
+
+def test_snapshot_matches_database_path_after_logins(app, auth_headers):
+    from utils.login_stats import entry_logins
+
+    client = app.test_client()
+    entry_id = add_entry(client, auth_headers, 'name', 'sync_stats_player')
+
+    # 先生成快照，之后的登录统计不产生变更记录
+    first = client.get('/api/whitelist/sync', headers=auth_headers)
+    assert first.status_code == 200
+
+    with app.app_context():
+        entry_logins.add(entry_id, increments={'login_count': 3}, values={'last_login_ip': '10.0.0.9'})
+        entry_logins.flush()
+
+    snapshot = client.get('/api/whitelist/sync', headers=auth_headers)
+    database = client.get('/api/whitelist/sync?only_active=false', headers=auth_headers)
+    delta = client.get('/api/whitelist/sync?since=0', headers=auth_headers)
+
+    assert snapshot.get_json()['revision'] == database.get_json()['revision']
+    assert active_entries(snapshot.get_json()) == active_entries(database.get_json())
+    assert snapshot.headers['ETag'] == first.headers['ETag']
+
+    synced = next(entry for entry in snapshot.get_json()['entries'] if entry['id'] == entry_id)
+    assert 'login_count' not in synced
+    assert synced in delta.get_json()['added']
+
+
+def delta_ids(delta):
+    return {key: sorted(entry['id'] for entry in delta[key]) for key in ('added', 'updated', 'removed')}
+
+
+def test_delta_collapses_add_then_remove(app, auth_headers):
+    from models.whitelist_change import WhitelistChange
+
+    client = app.test_client()
+    with app.app_context():
+        since = WhitelistChange.current_revision()
+
+    kept = add_entry(client, auth_headers, 'name', 'delta_kept_player')
+    add_entry(client, auth_headers, 'name', 'delta_removed_player')
+    response = client.delete('/api/whitelist/entries/name/delta_removed_player', headers=auth_headers)
+    assert response.status_code == 200
+
+    delta = client.get(f'/api/whitelist/sync?since={since}', headers=auth_headers).get_json()
+    assert delta['mode'] == 'delta'
+    # 区间内新增又删除的条目客户端从未见过，既不新增也不下发删除标记
+    assert delta_ids(delta) == {'added': [kept], 'updated': [], 'removed': []}
+
+
+def test_delta_filters_by_server_scope(app, auth_headers):
+    from models.database import db
+    from models.whitelist import WhitelistEntry
+    from models.whitelist_change import WhitelistChange
+
+    client = app.test_client()
+    shared = add_entry(client, auth_headers, 'name', 'scope_shared_player')
+    moved = add_entry(client, auth_headers, 'name', 'scope_moved_player')
+    with app.app_context():
+        since = WhitelistChange.current_revision()
+        other = WhitelistEntry(type='name', value='scope_other_player', created_by='test', server_id='srv-b')
+        WhitelistChange.record(other, 'add')
+        entry = db.session.get(WhitelistEntry, moved)
+        entry.server_id = 'srv-b'
+        WhitelistChange.record(entry, 'update')
+        entry = db.session.get(WhitelistEntry, shared)
+        entry.description = 'updated'
+        WhitelistChange.record(entry, 'update')
+        db.session.commit()
+        until = WhitelistChange.current_revision()
+
+        other_id = other.id
+        scoped = WhitelistChange.get_delta(since, until, scope=('srv-a', None))
+        unscoped = WhitelistChange.get_delta(since, until, scope=('srv-b', None))
+
+    # 移出范围的条目作为删除下发，范围外新增的条目不下发
+    assert delta_ids(scoped) == {'added': [], 'updated': [shared], 'removed': [moved]}
+    assert delta_ids(unscoped) == {'added': [other_id], 'updated': sorted([shared, moved]), 'removed': []}
+
+
+def test_delta_falls_back_to_full_sync_after_cleanup(app, auth_headers):
+    from models.database import db
+    from models.whitelist_change import WhitelistChange
+
+    client = app.test_client()
+    with app.app_context():
+        since = WhitelistChange.current_revision()
+    add_entry(client, auth_headers, 'name', 'cleanup_first_player')
+    add_entry(client, auth_headers, 'name', 'cleanup_second_player')
+
+    # 模拟保留策略清理了 since 之后的第一条变更记录
+    with app.app_context():
+        db.session.execute(db.delete(WhitelistChange).where(WhitelistChange.revision <= since + 1))
+        db.session.commit()
+        assert WhitelistChange.get_delta(since, WhitelistChange.current_revision()) is None
+
+    response = client.get(f'/api/whitelist/sync?since={since}', headers=auth_headers).get_json()
+    assert response['mode'] == 'full'
+    assert response['reset'] is True
+    assert 'cleanup_second_player' in {entry['value'] for entry in response['entries']}
+
+
+def test_full_sync_answers_304_until_whitelist_changes(app, auth_headers):
+    client = app.test_client()
+    path = '/api/whitelist/sync?only_active=false'
+    first = client.get(path, headers=auth_headers)
+    etag = first.headers['ETag']
+
+    cached = client.get(path, headers=dict(auth_headers, **{'If-None-Match': etag}))
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == etag
+    assert not cached.data
+
+    add_entry(client, auth_headers, 'name', 'etag_db_player')
+    changed = client.get(path, headers=dict(auth_headers, **{'If-None-Match': etag}))
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_snapshot_etags_per_server_scope(app, auth_headers):
+    from models.database import db
+    from models.whitelist import WhitelistEntry
+    from models.whitelist_change import WhitelistChange
+
+    client = app.test_client()
+    full = client.get('/api/whitelist/sync', headers=auth_headers)
+    scoped = client.get('/api/whitelist/sync?server_id=etag-srv', headers=auth_headers)
+    assert full.headers['ETag'] != scoped.headers['ETag']
+
+    for response, path in ((full, '/api/whitelist/sync'), (scoped, '/api/whitelist/sync?server_id=etag-srv')):
+        cached = client.get(path, headers=dict(auth_headers, **{'If-None-Match': response.headers['ETag']}))
+        assert cached.status_code == 304
+
+    # 只适用于其他服务器的条目不改变该服务器的ETag
+    with app.app_context():
+        WhitelistChange.record(WhitelistEntry(type='name', value='etag_other_server_player',
+                                              created_by='test', server_id='other-srv'), 'add')
+        db.session.commit()
+
+    refreshed = client.get('/api/whitelist/sync', headers=dict(auth_headers, **{'If-None-Match': full.headers['ETag']}))
+    assert refreshed.status_code == 200
+    assert 'etag_other_server_player' in {entry['value'] for entry in refreshed.get_json()['entries']}
+    cached = client.get('/api/whitelist/sync?server_id=etag-srv',
+                        headers=dict(auth_headers, **{'If-None-Match': scoped.headers['ETag']}))
+    assert cached.status_code == 304
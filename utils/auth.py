@@ -7,6 +7,11 @@ from flask import request, jsonify, current_app
 
 from models.token import Token
 from models.database import db
+from utils.timezone import now_utc
+from utils.logger import get_logger
+from utils.token_cache import token_cache, token_usage
+
+logger = get_logger('auth')
 
 
 # JWT配置 - 从应用配置获取
@@ -38,28 +43,28 @@ def generate_token(user_id, purpose='api'):
 def validate_token(token_str):
     """验证令牌 - 支持JWT和简单API Key"""
     if not token_str:
-        print("[AUTH] ❌ No token provided")
+        logger.debug('no token provided')
         return None
 
-    print(f"[AUTH] 🔍 Validating token: {token_str[:16]}...")
+    logger.debug('validating token prefix=%s', token_str[:16])
 
     try:
         # 1. 首先检查数据库中的Token记录
         token = Token.query.filter_by(token=token_str).first()
 
         if not token:
-            print(f"[AUTH] ❌ Token not found in database")
+            logger.debug('token not found prefix=%s', token_str[:16])
             return None
 
-        print(f"[AUTH] ✅ Token found: {token.name} (ID: {token.id})")
+        logger.debug('token found id=%s name=%s', token.id, token.name)
 
         # 2. 检查Token是否有效
         if not token.is_active:
-            print(f"[AUTH] ❌ Token is inactive")
+            logger.debug('token inactive id=%s', token.id)
             return None
 
         if token.is_expired():
-            print(f"[AUTH] ❌ Token expired at {token.expires_at}")
+            logger.debug('token expired id=%s expires_at=%s', token.id, token.expires_at)
             return None
 
         # 3. 如果是JWT格式，验证JWT签名
@@ -71,39 +76,47 @@ def validate_token(token_str):
                 # 尝试解码JWT
                 payload = jwt.decode(token_str, config['secret_key'],
                                      algorithms=[config['algorithm']])
-                print(f"[AUTH] ✅ Valid JWT for user {payload.get('user_id')}")
+                logger.debug('valid JWT id=%s user_id=%s', token.id, payload.get('user_id'))
 
                 # 确保JWT中的用户ID与数据库中的一致
                 if 'user_id' in payload and payload['user_id'] != token.user_id:
-                    print(f"[AUTH] ❌ JWT user_id mismatch")
+                    logger.warning('JWT user_id mismatch id=%s', token.id)
                     return None
 
             except jwt.ExpiredSignatureError:
-                print(f"[AUTH] ❌ JWT token expired")
+                logger.debug('JWT expired id=%s', token.id)
                 return None
             except jwt.InvalidTokenError as e:
-                print(f"[AUTH] ❌ Invalid JWT: {e}")
+                logger.warning('invalid JWT id=%s error=%s', token.id, e)
                 return None
             except Exception as e:
-                print(f"[AUTH] ⚠️  JWT decode error: {e}")
                 # 如果JWT解码失败，但数据库中有记录，仍然接受（降级处理）
-                pass
+                logger.warning('JWT decode error id=%s error=%s', token.id, e)
         else:
             # 4. 不是JWT格式，直接使用API Key验证
-            print(f"[AUTH] ✅ Valid API Key (non-JWT)")
+            logger.debug('valid API key (non-JWT) id=%s', token.id)
 
-        print(f"[AUTH] ✅ Token validation successful")
-        print(f"[AUTH] 📊 Permissions - Read: {token.can_read}, Write: {token.can_write}, Delete: {token.can_delete}")
+        logger.debug('token validated id=%s read=%s write=%s delete=%s',
+                     token.id, token.can_read, token.can_write, token.can_delete)
 
         return token
 
-    except Exception as e:
-        print(f"[AUTH] ❌ Token validation error: {str(e)}")
-        import traceback
-        print(f"[AUTH] Stack trace: {traceback.format_exc()}")
+    except Exception:
+        logger.exception('token validation error')
         return None
 
 
+def resolve_token(token_str):
+    """验证Token（优先使用缓存，未命中时查询数据库），返回只读副本；无效时返回None"""
+    token = token_cache.get(token_str)
+    if token is None:
+        db_token = validate_token(token_str)
+        if not db_token:
+            return None
+        token = token_cache.put(token_str, db_token)
+    return token
+
+
 def require_api_auth(f):
     """API认证装饰器"""
 
@@ -125,9 +138,8 @@ def require_api_auth(f):
                 'message': 'Authentication required. Please provide a valid token.'
             }), 401
 
-        # 验证Token
-        token = validate_token(token_str)
-        if not token:
+        token = resolve_token(token_str)
+        if token is None:
             return jsonify({
                 'success': False,
                 'message': 'Invalid or expired token.'
@@ -139,6 +151,7 @@ def require_api_auth(f):
 
         # 权限检查逻辑
         if not check_token_permissions(token, endpoint, method):
+            logger.debug('permission denied id=%s endpoint=%s method=%s', token.id, endpoint, method)
             return jsonify({
                 'success': False,
                 'message': 'Insufficient permissions for this operation.'
@@ -147,18 +160,26 @@ def require_api_auth(f):
         # 将Token对象附加到请求上下文
         request.token = token
 
-        # 更新使用统计
-        token.update_usage(request.remote_addr)
+        # 更新使用统计（内存累积，定期批量写入）
+        token_usage.add(
+            token.id,
+            increments={'use_count': 1},
+            values={'last_used': now_utc(), 'last_ip': request.remote_addr}
+        )
 
         return f(*args, **kwargs)
 
     return decorated_function
 
 
+# 使用POST提交查询参数、但不修改数据的端点，只需要读取权限
+READ_ONLY_ENDPOINTS = {'api.check_whitelist'}
+
+
 def check_token_permissions(token, endpoint, method):
     """检查Token权限"""
     # 如果是只读操作，只需要can_read权限
-    if method == 'GET':
+    if method == 'GET' or endpoint in READ_ONLY_ENDPOINTS:
         if not token.can_read:
             return False
 
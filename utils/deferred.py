@@ -0,0 +1,124 @@
+# utils/deferred.py
+import atexit
+import threading
+
+from flask import has_app_context
+
+from models.database import db
+from utils.logger import get_logger
+
+logger = get_logger('deferred')
+
+
+class DeferredUpdates:
+    """
+    按键合并的延迟更新：请求中只修改内存，后台线程按间隔批量写入数据库
+    - increments: 累加字段（如使用次数）
+    - values: 覆盖字段（如最后使用时间），以最后一次为准
+    同一个键在一个间隔内无论被更新多少次，都只产生一次数据库写入
+    """
+
+    def __init__(self, name, flush_func, interval_key, default_interval=10):
+        self.name = name
+        self.app = None
+        self._flush_func = flush_func
+        self._interval_key = interval_key
+        self._default_interval = default_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def init_app(self, app):
+        """绑定应用，注册退出时的刷新"""
+        self.app = app
+        app.extensions[self.name] = self
+        atexit.register(self.stop)
+
+    @property
+    def interval(self):
+        return self.app.config.get(self._interval_key, self._default_interval)
+
+    def pending_count(self):
+        """等待写入的键数量"""
+        return len(self._pending)
+
+    def add(self, key, increments=None, values=None):
+        """记录一次更新"""
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = ({}, {})
+            for field, amount in (increments or {}).items():
+                pending[0][field] = pending[0].get(field, 0) + amount
+            if values:
+                pending[1].update(values)
+
+        # 间隔为0时不启用延迟，立即写入
+        if not self.interval:
+            self._flush_inline()
+        else:
+            self._ensure_started()
+
+    def flush(self):
+        """立即写入所有累积的更新"""
+        updates = self._take_pending()
+        if not updates:
+            return
+        with self.app.app_context():
+            try:
+                self._flush_func(updates)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error('deferred flush failed name=%s size=%s error=%s', self.name, len(updates), e)
+            finally:
+                db.session.remove()
+
+    def _take_pending(self):
+        with self._lock:
+            if not self._pending:
+                return []
+            pending, self._pending = self._pending, {}
+        return [(key, increments, values) for key, (increments, values) in pending.items()]
+
+    def _flush_inline(self):
+        """
+        在调用方的会话中立即写入（请求中可能已经持有SQLite的写锁，
+        另开应用上下文和会话写入会等待自己的锁直到 database is locked）
+        """
+        if not has_app_context():
+            self.flush()
+            return
+
+        updates = self._take_pending()
+        if not updates:
+            return
+        try:
+            self._flush_func(updates)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error('deferred flush failed name=%s size=%s error=%s', self.name, len(updates), e)
+
+    def stop(self, timeout=5):
+        """停止后台线程并写入剩余更新"""
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        if self.app is not None:
+            self.flush()
+
+    def _ensure_started(self):
+        # 延迟到第一次使用时启动，多进程部署时在每个工作进程内各自启动
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.flush()
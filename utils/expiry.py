@@ -0,0 +1,258 @@
+# utils/expiry.py
+import atexit
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models.database import db
+from models.token import Token
+from models.whitelist import WhitelistEntry
+from models.whitelist_change import WhitelistChange
+from utils.logger import get_logger
+from utils.stats_counters import stats_counters
+
+logger = get_logger('expiry')
+
+# 每条 UPDATE 语句最多包含的ID数量
+EXPIRE_CHUNK_SIZE = 500
+
+
+def _as_utc(value):
+    """统一为无时区信息的UTC时间（与数据库中保存的格式一致）"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(pytz.UTC).replace(tzinfo=None)
+    return value
+
+
+class ExpiryScheduler:
+    """
+    到期调度器
+    最小堆保存即将到期的白名单条目和Token，后台线程睡眠到最近的到期时间，
+    到期时停用对应的记录、记录白名单变更（版本号递增）并清除缓存；
+    其他进程写入的到期时间只在重新加载时发现，白名单快照和Token验证另外按时间判断，不会在此之前放行
+    """
+
+    def __init__(self):
+        self.app = None
+        self._heap = []
+        self._lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._thread = None
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._next_reload = 0.0
+        self._caught_up = False
+
+        # 统计信息
+        self.expired_entries = 0
+        self.expired_tokens = 0
+
+    def init_app(self, app):
+        """绑定应用，在请求中按需启动后台线程"""
+        self.app = app
+        app.extensions['expiry_scheduler'] = self
+        app.before_request(self._ensure_started)
+        atexit.register(self.stop)
+
+    @property
+    def reload_interval(self):
+        return self.app.config.get('EXPIRY_RELOAD_INTERVAL', 300)
+
+    def pending_count(self):
+        """堆中等待的到期时间数量"""
+        return len(self._heap)
+
+    def next_deadline(self):
+        """最近的到期时间（UTC），没有时返回None"""
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def schedule(self, kind, item_id, deadline):
+        """登记一个到期时间；早于当前最近的到期时间时立即唤醒后台线程"""
+        deadline = _as_utc(deadline)
+        if deadline is None:
+            return
+        with self._lock:
+            earliest = self._heap[0][0] if self._heap else None
+            heapq.heappush(self._heap, (deadline, kind, item_id))
+        if earliest is None or deadline < earliest:
+            self._wake_event.set()
+
+    def wake(self):
+        """立即检查到期（如白名单快照发现了尚未停用的到期条目）"""
+        self._wake_event.set()
+
+    def load(self):
+        """从数据库加载下一个加载周期内的到期时间，替换当前的堆"""
+        horizon = datetime.utcnow() + timedelta(seconds=self.reload_interval)
+        heap = []
+        for kind, model in (('whitelist', WhitelistEntry), ('token', Token)):
+            rows = db.session.execute(db.select(model.id, model.expires_at).where(
+                model.is_active == True,
+                model.expires_at.isnot(None),
+                model.expires_at <= horizon
+            )).all()
+            heap.extend((_as_utc(row.expires_at), kind, row.id) for row in rows)
+        heapq.heapify(heap)
+
+        with self._lock:
+            self._heap = heap
+        self._next_reload = time.monotonic() + self.reload_interval
+        return len(heap)
+
+    def expire_due(self):
+        """停用所有已到期的白名单条目和Token，返回 (条目数, Token数)"""
+        now = datetime.utcnow()
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                heapq.heappop(self._heap)
+
+        # 以数据库为准的集合式更新：堆只决定何时唤醒，重复执行也不会重复停用
+        entries = self._expire_entries(now)
+        tokens = self._expire_tokens(now)
+        return entries, tokens
+
+    def catch_up(self):
+        """
+        同步加载到期时间并停用进程停止期间已到期的记录，返回 (条目数, Token数)
+        在第一个白名单快照构建之前执行，快照和变更记录中不再出现已到期的活跃条目
+        """
+        try:
+            self.load()
+            result = self.expire_due()
+        except Exception as e:
+            db.session.rollback()
+            logger.error('expiry catch-up failed error=%s', e)
+            return 0, 0
+        self._caught_up = True
+        return result
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        self._wake_event.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def _expire_entries(self, now):
+        table = WhitelistEntry.__table__
+        rows = _deactivate(table, (table.c.id, table.c.type, table.c.value), now, is_active=False)
+        if not rows:
+            # 没有匹配的行也结束事务，释放条件更新取得的写锁
+            db.session.commit()
+            return 0
+
+        # 只记录本次实际停用的条目：其他进程同时停用的行不会重复记录变更和日志
+        # 记录变更后版本号递增，提交时白名单快照失效并唤醒推送连接
+        WhitelistChange.record_bulk([(row.id, row.type, row.value, 'update') for row in rows])
+
+        from models.log import Log
+        db.session.add(Log(
+            level='info',
+            message=f'白名单条目到期自动停用: {len(rows)}条',
+            source='system',
+            details=', '.join(f'{row.type}={row.value}' for row in rows[:20])
+        ))
+        db.session.commit()
+        stats_counters.mark_stale()
+
+        self.expired_entries += len(rows)
+        return len(rows)
+
+    def _expire_tokens(self, now):
+        table = Token.__table__
+        rows = _deactivate(table, (table.c.id,), now, is_active=False, deactivated_reason='expired')
+        if not rows:
+            db.session.commit()
+            return 0
+
+        from utils.token_cache import bump_generation, token_cache
+        bump_generation()
+        db.session.commit()
+
+        for row in rows:
+            token_cache.invalidate(row.id)
+
+        self.expired_tokens += len(rows)
+        return len(rows)
+
+    def _ensure_started(self):
+        # 延迟到第一次请求时启动，多进程部署时在每个工作进程内各自启动
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                # 启动时未执行过补停用（如直接由WSGI服务器加载）时，在处理第一个请求前同步执行
+                if not self._caught_up:
+                    self.catch_up()
+                self._thread = threading.Thread(target=self._run, name='expiry-scheduler', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            with self.app.app_context():
+                try:
+                    # 定期重新加载，发现其他进程写入的到期时间
+                    if time.monotonic() >= self._next_reload:
+                        self.load()
+                    self.expire_due()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error('expiry check failed error=%s', e)
+                finally:
+                    db.session.remove()
+
+            timeout = max(0.0, self._next_reload - time.monotonic())
+            deadline = self.next_deadline()
+            if deadline is not None:
+                timeout = min(timeout, max(0.0, (deadline - datetime.utcnow()).total_seconds()))
+            self._wake_event.wait(timeout)
+            self._wake_event.clear()
+
+
+def _deactivate(table, columns, now, **values):
+    """
+    停用已到期的行，返回本事务实际停用的行（columns 中的列）
+    条件更新只修改仍为活跃的行：多个进程同时执行时，后执行的更新在写锁释放后不再匹配这些行
+    数据库支持 UPDATE ... RETURNING 时一条语句完成；否则在同一事务中加行锁查询后按ID更新
+    """
+    condition = db.and_(table.c.is_active == True, table.c.expires_at <= now)
+    if db.engine.dialect.update_returning:
+        return db.session.execute(table.update().where(condition).values(**values).returning(*columns)).all()
+
+    rows = db.session.execute(db.select(*columns).where(condition).with_for_update()).all()
+    ids = [row.id for row in rows]
+    for start in range(0, len(ids), EXPIRE_CHUNK_SIZE):
+        db.session.execute(table.update().where(
+            table.c.id.in_(ids[start:start + EXPIRE_CHUNK_SIZE])
+        ).values(**values))
+    return rows
+
+
+# 全局实例
+expiry_scheduler = ExpiryScheduler()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_on_flush(session, flush_context):
+    """收集本次flush中设置了过期时间的白名单条目和Token"""
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, (WhitelistEntry, Token)) and obj.expires_at and obj.is_active is not False:
+            kind = 'whitelist' if isinstance(obj, WhitelistEntry) else 'token'
+            session.info.setdefault('expiry_schedule', []).append((kind, obj.id, obj.expires_at))
+
+
+@event.listens_for(Session, 'after_commit')
+def _schedule_on_commit(session):
+    for kind, item_id, deadline in session.info.pop('expiry_schedule', ()):
+        expiry_scheduler.schedule(kind, item_id, deadline)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('expiry_schedule', None)
@@ -0,0 +1,112 @@
+# utils/health.py
+import atexit
+import threading
+import time
+from collections import Counter
+
+from models.database import db
+from utils.logger import get_logger
+from utils.timezone import now_utc
+
+logger = get_logger('health')
+
+
+class HealthMonitor:
+    """
+    健康检查状态
+    - 数据库连通性按间隔检查并缓存，探测请求不会每次访问数据库
+    - 探测次数在内存中按来源IP累计，每个汇总周期只写入一条日志
+    """
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._probes = Counter()
+        self._window_started = time.monotonic()
+        self._window_started_at = now_utc()
+        self._db_status = None
+        self._db_checked_at = 0.0
+
+    def init_app(self, app):
+        """绑定应用，退出时写入未汇总的探测次数"""
+        self.app = app
+        app.extensions['health_monitor'] = self
+        atexit.register(self.flush)
+
+    def record_probe(self, ip_address):
+        """记录一次健康检查，到达汇总周期时写入一条汇总日志"""
+        interval = self.app.config.get('HEALTH_LOG_INTERVAL', 300)
+        with self._lock:
+            self._probes[ip_address or 'unknown'] += 1
+            due = interval and time.monotonic() - self._window_started >= interval
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        """写入当前周期的探测汇总"""
+        with self._lock:
+            if not self._probes:
+                return
+            probes, self._probes = self._probes, Counter()
+            started_at = self._window_started_at
+            self._window_started = time.monotonic()
+            self._window_started_at = now_utc()
+
+        from models.log import Log
+
+        total = sum(probes.values())
+        clients = ', '.join(f'{ip}: {count}' for ip, count in probes.most_common(10))
+        try:
+            with self.app.app_context():
+                Log.bulk_insert([{
+                    'level': 'info',
+                    'message': f'API健康检查（{total} 次）',
+                    'source': 'api',
+                    'ip_address': probes.most_common(1)[0][0],
+                    'details': f'endpoint: /health, probes: {total}, since: {started_at.isoformat()}, clients: {clients}',
+                    'created_at': now_utc()
+                }])
+                db.session.commit()
+        except Exception as e:
+            logger.error('failed to write health probe summary error=%s', e)
+
+    def database_status(self, force=False):
+        """数据库连通性，按 HEALTH_DB_CHECK_INTERVAL 缓存检查结果"""
+        interval = self.app.config.get('HEALTH_DB_CHECK_INTERVAL', 10)
+        status = self._db_status
+        if not force and status is not None and time.monotonic() - self._db_checked_at < interval:
+            return status
+
+        started = time.monotonic()
+        try:
+            db.session.execute(db.text('SELECT 1'))
+            status = {'ok': True, 'latency_ms': round((time.monotonic() - started) * 1000, 2)}
+        except Exception as e:
+            db.session.rollback()
+            status = {'ok': False, 'error': str(e)}
+        status['checked_at'] = now_utc().isoformat()
+
+        self._db_status = status
+        self._db_checked_at = time.monotonic()
+        return status
+
+    def queue_depths(self):
+        """后台批量写入队列中等待的数量"""
+        from utils.log_writer import login_log_writer
+        from utils.login_stats import entry_logins
+        from utils.expiry import expiry_scheduler
+        from utils.servers import server_activity
+        from utils.token_cache import token_usage
+
+        return {
+            'login_log': login_log_writer.qsize(),
+            'token_usage': token_usage.pending_count(),
+            'entry_logins': entry_logins.pending_count(),
+            'server_activity': server_activity.pending_count(),
+            'expiry_schedule': expiry_scheduler.pending_count()
+        }
+
+
+# 全局实例
+health_monitor = HealthMonitor()
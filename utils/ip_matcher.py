@@ -0,0 +1,204 @@
+# utils/ip_matcher.py
+import ipaddress
+
+
+def normalize_ip(ip_str):
+    """统一IP地址写法（IPv6压缩格式，IPv4映射的IPv6地址按IPv4处理），无效地址返回None"""
+    try:
+        address = ipaddress.ip_address(ip_str.strip())
+    except (ValueError, AttributeError):
+        return None
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.compressed
+
+
+def _unmap_network(network):
+    """IPv4映射的IPv6网络（::ffff:a.b.c.d/96 及更长前缀）转换为对应的IPv4网络"""
+    if network.version == 6 and network.prefixlen >= 96 and network.network_address.ipv4_mapped is not None:
+        return ipaddress.ip_network(f'{network.network_address.ipv4_mapped}/{network.prefixlen - 96}')
+    return network
+
+
+def parse_ip_pattern(pattern):
+    """
+    解析IP模式，返回 (网络, None) 或 (None, 通配符分段)
+    - 单个地址、CIDR（IPv4/IPv6）以及末尾通配符（如 192.168.*.*）都转换为网络前缀
+    - 通配符不在末尾（如 192.*.1.*）无法表示为前缀，返回分段供逐段比较
+    无法解析时返回 (None, None)
+    """
+    pattern = pattern.strip()
+
+    if '*' in pattern:
+        parts = pattern.split('.')
+        if len(parts) != 4:
+            return None, None
+        for part in parts:
+            if part != '*' and not (part.isdigit() and 0 <= int(part) <= 255):
+                return None, None
+
+        fixed = []
+        for index, part in enumerate(parts):
+            if part == '*':
+                if any(rest != '*' for rest in parts[index:]):
+                    return None, tuple(parts)
+                break
+            fixed.append(part)
+
+        address = '.'.join(fixed + ['0'] * (4 - len(fixed)))
+        return ipaddress.ip_network(f'{address}/{len(fixed) * 8}'), None
+
+    try:
+        return _unmap_network(ipaddress.ip_network(pattern, strict=False)), None
+    except ValueError:
+        return None, None
+
+
+def entry_order(entry):
+    """同一个键/前缀对应多个条目时的排序，排在最前的条目作为匹配结果"""
+    return entry['value'], entry['id']
+
+
+class _Node:
+    """基数树节点，创建后不再修改"""
+    __slots__ = ('children', 'entries')
+
+    def __init__(self, children=(None, None), entries=()):
+        self.children = children
+        self.entries = entries
+
+
+def _insert(root, bits, length, entry):
+    """沿前缀路径复制节点，返回新的根节点（原树保持不变）"""
+    path = []
+    node = root
+    for depth in range(length):
+        path.append(node)
+        bit = (bits >> (length - depth - 1)) & 1
+        node = node.children[bit] if node else None
+
+    # 同一前缀上的条目保持固定顺序，增量更新与重新构建的匹配结果一致
+    entries = tuple(sorted((node.entries if node else ()) + (entry,), key=entry_order))
+    new_node = _Node(node.children if node else (None, None), entries)
+    return _rebuild_path(path, bits, length, new_node)
+
+
+def _remove(root, bits, length, entry_id):
+    """删除前缀上的指定条目，返回新的根节点"""
+    path = []
+    node = root
+    for depth in range(length):
+        if node is None:
+            return root
+        path.append(node)
+        node = node.children[(bits >> (length - depth - 1)) & 1]
+
+    if node is None:
+        return root
+
+    entries = tuple(e for e in node.entries if e['id'] != entry_id)
+    if len(entries) == len(node.entries):
+        return root
+
+    new_node = _Node(node.children, entries)
+    if not entries and new_node.children == (None, None):
+        new_node = None
+    return _rebuild_path(path, bits, length, new_node)
+
+
+def _rebuild_path(path, bits, length, node):
+    """自底向上复制路径上的节点，空节点一并剪除"""
+    for depth in range(length - 1, -1, -1):
+        parent = path[depth]
+        bit = (bits >> (length - depth - 1)) & 1
+        children = list(parent.children if parent else (None, None))
+        children[bit] = node
+        parent_entries = parent.entries if parent else ()
+        if not parent_entries and children == [None, None]:
+            node = None
+        else:
+            node = _Node(tuple(children), parent_entries)
+    return node
+
+
+class IpMatcher:
+    """
+    IP/CIDR匹配器：每个地址族一棵二进制基数树，查询代价为 O(地址位数)
+    插入和删除采用路径复制，返回新的匹配器，旧实例可被并发读取
+    """
+
+    def __init__(self, roots=None, others=()):
+        # 地址族版本 -> 根节点
+        self._roots = roots or {4: None, 6: None}
+        # 通配符不在末尾的模式 (分段, 条目)
+        self._others = others
+
+    @classmethod
+    def build(cls, items):
+        """从 (模式, 条目) 列表构建匹配器"""
+        matcher = cls()
+        for pattern, entry in items:
+            matcher = matcher.insert(pattern, entry)
+        return matcher
+
+    def insert(self, pattern, entry):
+        """插入模式，返回新的匹配器；无法解析的模式被忽略"""
+        network, parts = parse_ip_pattern(pattern)
+        if parts is not None:
+            return IpMatcher(self._roots, self._others + ((parts, entry),))
+        if network is None:
+            return self
+
+        roots = dict(self._roots)
+        bits = int(network.network_address) >> (network.max_prefixlen - network.prefixlen)
+        roots[network.version] = _insert(roots[network.version], bits, network.prefixlen, entry)
+        return IpMatcher(roots, self._others)
+
+    def remove(self, pattern, entry):
+        """删除模式对应的条目，返回新的匹配器"""
+        network, parts = parse_ip_pattern(pattern)
+        if parts is not None:
+            others = tuple(item for item in self._others if item[1]['id'] != entry['id'])
+            return IpMatcher(self._roots, others)
+        if network is None:
+            return self
+
+        roots = dict(self._roots)
+        bits = int(network.network_address) >> (network.max_prefixlen - network.prefixlen)
+        roots[network.version] = _remove(roots[network.version], bits, network.prefixlen, entry['id'])
+        return IpMatcher(roots, self._others)
+
+    def match(self, ip):
+        """返回最长前缀匹配的条目，未匹配返回None"""
+        try:
+            address = ipaddress.ip_address(ip.strip())
+        except (ValueError, AttributeError):
+            return None
+
+        # IPv4映射的IPv6地址按IPv4处理
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+
+        node = self._roots[address.version]
+        best = None
+        value = int(address)
+        length = address.max_prefixlen
+        depth = 0
+        while node is not None:
+            if node.entries:
+                best = node.entries[0]
+            if depth == length:
+                break
+            node = node.children[(value >> (length - depth - 1)) & 1]
+            depth += 1
+
+        if best is not None:
+            return best
+
+        if address.version == 4 and self._others:
+            parts = str(address).split('.')
+            for pattern, entry in self._others:
+                if all(p == '*' or p == part for p, part in zip(pattern, parts)):
+                    return entry
+
+        return None
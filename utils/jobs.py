@@ -0,0 +1,247 @@
+# utils/jobs.py
+import atexit
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from sqlalchemy.exc import OperationalError
+
+from models.database import db
+from models.job import Job
+from utils.logger import get_logger
+from utils.timezone import now_utc
+
+logger = get_logger('jobs')
+
+# 任务进度写入数据库的最短间隔（秒）
+PROGRESS_WRITE_INTERVAL = 1.0
+
+
+def process_owner():
+    """当前进程的标识（主机名:进程ID），多进程部署时每个工作进程不同"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # Windows下 os.kill 会结束目标进程；Windows只以单进程方式运行，其他进程的任务视为已中断
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # 进程存在但无权发送信号
+        return True
+    return True
+
+
+class JobContext:
+    """传给任务函数的上下文，用于汇报进度和保存结果文件"""
+
+    def __init__(self, runner, job_id):
+        self.runner = runner
+        self.job_id = job_id
+        self.result_file = None
+        self._last_write = 0.0
+
+    def file_path(self, extension):
+        """任务结果文件的路径"""
+        return os.path.join(self.runner.folder(), f'{self.job_id}.{extension}')
+
+    def progress(self, progress, total=None, message=None):
+        """
+        汇报进度：保存在进程内存中，并按间隔写入数据库，其他工作进程查询时也能看到
+        任务自身可能持有未提交的写事务（如导入），SQLite下此时无法写入，进度只保留在内存中
+        """
+        live = {'progress': progress}
+        if total is not None:
+            live['total'] = total
+        if message is not None:
+            live['message'] = message[:255]
+        live = self.runner._live[self.job_id] = dict(self.runner._live.get(self.job_id, {}), **live)
+
+        now = time.monotonic()
+        if now - self._last_write >= PROGRESS_WRITE_INTERVAL:
+            self._last_write = now
+            self.runner.try_update_job(self.job_id, **live)
+
+
+class JobRunner:
+    """
+    进程内后台任务执行器
+    任务记录持久化在 jobs 表中，由线程池执行，请求线程只负责提交并返回任务ID
+    每个任务记录执行它的进程（owner），多进程部署时只有该进程能判断任务是否已中断
+    """
+
+    def __init__(self):
+        self.app = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._live = {}
+
+    def init_app(self, app):
+        """绑定应用，退出时等待正在执行的任务"""
+        self.app = app
+        app.extensions['job_runner'] = self
+        atexit.register(self.shutdown)
+
+    def folder(self):
+        """任务文件目录（上传的导入文件、导出结果）"""
+        folder = self.app.config.get('JOB_FOLDER') or os.path.join(self.app.instance_path, 'jobs')
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    def submit(self, job_type, func, args=(), kwargs=None, user_id=None, message=None, upload_file=None):
+        """
+        创建任务记录并提交到线程池，返回任务ID
+        func(context, *args, **kwargs) 在应用上下文中执行，返回值保存为任务结果（JSON）
+        user_id 为任务所属用户；upload_file 为任务输入的临时文件，任务结束后删除
+        """
+        self.cleanup()
+
+        job = Job(type=job_type, status='pending', user_id=user_id, message=message, owner=process_owner())
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.id
+
+        self._get_executor().submit(self._run, job_id, func, args, kwargs or {}, upload_file)
+        return job_id
+
+    def get_job(self, job_id):
+        """获取任务状态（数据库中的进度），本进程正在执行的任务附带最新的内存进度"""
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return None
+        data = job.to_dict()
+        if not job.finished:
+            data.update(self._live.get(job_id, {}))
+        return data
+
+    def update_job(self, job_id, **values):
+        """在独立的事务中更新任务记录"""
+        table = Job.__table__
+        with db.engine.begin() as connection:
+            connection.execute(table.update().where(table.c.id == job_id).values(**values))
+
+    def try_update_job(self, job_id, **values):
+        """
+        尝试更新任务记录，数据库被锁时立即放弃并返回False
+        （SQLite下任务自身的写事务会持有写锁，等待锁只会等到超时）
+        """
+        table = Job.__table__
+        with db.engine.connect() as connection:
+            sqlite = connection.dialect.name == 'sqlite'
+            busy_timeout = None
+            if sqlite:
+                busy_timeout = connection.exec_driver_sql('PRAGMA busy_timeout').scalar()
+                connection.exec_driver_sql('PRAGMA busy_timeout = 0')
+            try:
+                connection.execute(table.update().where(table.c.id == job_id).values(**values))
+                connection.commit()
+                return True
+            except OperationalError:
+                connection.rollback()
+                return False
+            finally:
+                if sqlite:
+                    connection.exec_driver_sql(f'PRAGMA busy_timeout = {int(busy_timeout or 0)}')
+
+    def recover(self):
+        """
+        将执行进程已退出的未完成任务标记为失败，返回标记的数量
+        只处理本机上进程已不存在的任务（以及没有记录进程的旧任务），其他工作进程正在执行的任务不受影响
+        """
+        hostname = socket.gethostname()
+        interrupted = []
+        for job_id, owner in db.session.execute(
+            db.select(Job.id, Job.owner).where(Job.status.in_(['pending', 'running']))
+        ).all():
+            if owner:
+                host, _, pid = owner.rpartition(':')
+                if host != hostname or not pid.isdigit() or _process_alive(int(pid)):
+                    continue
+            interrupted.append(job_id)
+        db.session.rollback()
+
+        if not interrupted:
+            return 0
+
+        table = Job.__table__
+        with db.engine.begin() as connection:
+            result = connection.execute(table.update().where(
+                table.c.id.in_(interrupted),
+                table.c.status.in_(['pending', 'running'])
+            ).values(status='failed', error='服务重启，任务已中断', finished_at=now_utc()))
+        return result.rowcount or 0
+
+    def cleanup(self):
+        """删除超过保留期的已完成任务及其文件"""
+        days = self.app.config.get('JOB_RETENTION_DAYS', 7)
+        if not days:
+            return
+
+        cutoff = now_utc() - timedelta(days=days)
+        expired = Job.query.filter(
+            Job.status.in_(['succeeded', 'failed']),
+            Job.created_at < cutoff
+        ).all()
+        for job in expired:
+            if job.result_file and os.path.exists(job.result_file):
+                os.remove(job.result_file)
+            db.session.delete(job)
+        if expired:
+            db.session.commit()
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _get_executor(self):
+        # 延迟到第一次提交时创建，多进程部署时在每个工作进程内各自创建
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.app.config.get('JOB_WORKERS', 2),
+                        thread_name_prefix='job'
+                    )
+        return self._executor
+
+    def _run(self, job_id, func, args, kwargs, upload_file):
+        context = JobContext(self, job_id)
+        with self.app.app_context():
+            self.update_job(job_id, status='running', started_at=now_utc())
+            try:
+                result = func(context, *args, **kwargs)
+                db.session.commit()
+                # 最终进度与结果一起写入数据库
+                values = dict(self._live.get(job_id, {}))
+                values.update(
+                    status='succeeded',
+                    result=json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                    result_file=context.result_file,
+                    finished_at=now_utc()
+                )
+                self.update_job(job_id, **values)
+            except Exception as e:
+                db.session.rollback()
+                logger.exception('job failed id=%s', job_id)
+                self.update_job(job_id, status='failed', error=str(e)[:1000], finished_at=now_utc())
+            finally:
+                self._live.pop(job_id, None)
+                db.session.remove()
+                if upload_file and os.path.exists(upload_file):
+                    os.remove(upload_file)
+
+
+# 全局实例
+job_runner = JobRunner()
@@ -0,0 +1,105 @@
+# utils/log_archive.py
+import gzip
+import json
+import os
+import re
+from datetime import datetime
+
+from flask import current_app
+
+# 没有时间戳的日志归档到 logs-unknown.jsonl.gz
+UNKNOWN_MONTH = 'unknown'
+
+# 归档文件名：logs-YYYY-MM.jsonl.gz，每个月一个文件
+ARCHIVE_NAME_PATTERN = re.compile(r'^logs-(\d{4}-\d{2}|unknown)\.jsonl\.gz$')
+
+
+def archive_folder():
+    """归档目录，不存在时创建"""
+    folder = current_app.config.get('LOG_ARCHIVE_FOLDER') or os.path.join(current_app.instance_path, 'log_archive')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def archive_path(month):
+    """指定月份（YYYY-MM）的归档文件路径"""
+    return os.path.join(archive_folder(), f'logs-{month}.jsonl.gz')
+
+
+def parse_month(month):
+    """解析 YYYY-MM，返回 (该月第一天, 下月第一天)；格式无效时返回None"""
+    try:
+        start = datetime.strptime(month, '%Y-%m')
+    except (TypeError, ValueError):
+        return None
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+
+def is_archive_month(month):
+    """月份（YYYY-MM）或 unknown 是否为有效的归档名称"""
+    return month == UNKNOWN_MONTH or parse_month(month) is not None
+
+
+def write_rows(rows):
+    """
+    将日志行按月份追加写入归档文件，返回写入的行数
+    每次追加是一个独立的gzip成员，多成员文件可被 gzip 直接连续读取
+    写入后同步到磁盘，调用方再删除数据库中的对应行
+    """
+    by_month = {}
+    for row in rows:
+        created_at = row.get('created_at')
+        month = created_at.strftime('%Y-%m') if created_at else UNKNOWN_MONTH
+        by_month.setdefault(month, []).append(row)
+
+    for month, month_rows in by_month.items():
+        lines = ''.join(json.dumps(_serialize(row), ensure_ascii=False) + '\n' for row in month_rows)
+        with open(archive_path(month), 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='ab') as archive:
+                archive.write(lines.encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+
+    return len(rows)
+
+
+def iter_archive(month, level=None, search=None):
+    """逐行读取指定月份的归档日志，可按级别和消息/详情关键字过滤"""
+    path = archive_path(month)
+    if not os.path.exists(path):
+        return
+    search = search.lower() if search else None
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if level and row.get('level') != level:
+                continue
+            if search and search not in f"{row.get('message') or ''} {row.get('details') or ''}".lower():
+                continue
+            yield row
+
+
+def list_archives():
+    """列出全部归档文件"""
+    archives = []
+    folder = archive_folder()
+    for name in sorted(os.listdir(folder)):
+        match = ARCHIVE_NAME_PATTERN.match(name)
+        if match:
+            archives.append({
+                'month': match.group(1),
+                'filename': name,
+                'size': os.path.getsize(os.path.join(folder, name))
+            })
+    return archives
+
+
+def _serialize(row):
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in row.items()
+    }
@@ -0,0 +1,294 @@
+# utils/log_partitions.py
+import json
+import threading
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.orm import aliased
+from sqlalchemy.schema import CreateIndex
+
+from models.database import db
+from models.log_partition import LogPartition
+from utils.logger import get_logger
+from utils.timezone import now_utc
+
+logger = get_logger('log_partitions')
+
+# logs 表当前写入月份，保存在系统设置中（多进程部署时用于保证只轮换一次）
+MONTH_KEY = 'log_partition_month'
+
+# 导出分区时每次读取的行数
+EXPORT_CHUNK_SIZE = 5000
+
+# 轮换失败后重试的间隔（秒）
+RETRY_INTERVAL = 60
+
+
+class LogPartitions:
+    """
+    按月轮换的日志分区（仅SQLite）
+    - 写入始终进入 logs 表，所有写入路径保持不变
+    - 月份变化后，logs 表整表重命名为 logs_YYYY_MM，再创建新的空 logs 表
+    - Log.all_partitions() 用 UNION ALL 跨越 logs 表和全部分区读取
+    - 旧分区整表 DROP（可先导出为压缩JSONL），不需要逐行删除
+    """
+
+    def __init__(self):
+        self.app = None
+        self._month = None
+        self._attempted_at = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._metadata = sa.MetaData()
+
+    def init_app(self, app):
+        """绑定应用，在请求中检查月份变化"""
+        self.app = app
+        app.extensions['log_partitions'] = self
+        app.before_request(self._check_month)
+
+    @property
+    def enabled(self):
+        return bool(self.app.config.get('LOG_PARTITION_ENABLED', True)) and db.engine.dialect.name == 'sqlite'
+
+    def partitions(self):
+        """全部已轮换的分区，按月份从新到旧"""
+        if not self.enabled:
+            return []
+        return LogPartition.query.order_by(LogPartition.month.desc(), LogPartition.name.desc()).all()
+
+    def table(self, name):
+        """分区表对象（列与 logs 表相同，索引名以分区表名为前缀）"""
+        from models.log import Log
+
+        table = self._metadata.tables.get(name)
+        if table is None:
+            table = sa.Table(name, self._metadata, *[
+                sa.Column(column.name, column.type, primary_key=column.primary_key)
+                for column in Log.__table__.columns
+            ])
+            for index in Log.__table__.indexes:
+                sa.Index(index.name.replace('ix_logs_', f'ix_{name}_', 1),
+                         *[table.c[column.name] for column in index.columns])
+        return table
+
+    def tables(self, before=None):
+        """logs 表和全部分区表；指定before时跳过最早的日志也不早于该时间的分区"""
+        from models.log import Log
+
+        before = _naive_utc(before)
+        tables = [Log.__table__]
+        for partition in self.partitions():
+            if before is not None and partition.first_at is not None and partition.first_at >= before:
+                continue
+            tables.append(self.table(partition.name))
+        return tables
+
+    def entity(self):
+        """跨越全部分区的只读Log实体；没有分区时直接返回Log"""
+        from models.log import Log
+
+        tables = self.tables()
+        if len(tables) == 1:
+            return Log
+
+        names = [column.name for column in Log.__table__.columns]
+        union = sa.union_all(*[
+            sa.select(*[table.c[name] for name in names]) for table in tables
+        ]).subquery('logs_all')
+        return aliased(Log, union, adapt_on_names=True)
+
+    def counts(self):
+        """全部分区按级别和来源统计的行数，统计尚未完成的分区在此时补齐"""
+        from collections import Counter
+
+        levels, sources = Counter(), Counter()
+        for partition in self.partitions():
+            if not partition.ready:
+                self.refresh_stats(partition.name)
+                db.session.refresh(partition)
+            partition_levels, partition_sources = partition.counts()
+            levels.update(partition_levels)
+            sources.update(partition_sources)
+        return levels, sources
+
+    def rotate(self):
+        """
+        月份变化时轮换 logs 表，返回新分区的表名；不需要轮换或其他进程已轮换时返回None
+        通过条件更新月份标记保证多个进程中只有一个执行轮换
+        """
+        if not self.enabled:
+            return None
+        from models.setting import Setting
+
+        month = _current_month()
+        settings = Setting.__table__
+        name = None
+        with db.engine.begin() as connection:
+            marker = connection.execute(
+                sa.select(settings.c.value).where(settings.c.key == MONTH_KEY)
+            ).scalar()
+            if marker is None:
+                # 第一次启用：logs 表中已有的日志在下一次轮换时整体成为一个分区
+                connection.execute(settings.insert().values(
+                    key=MONTH_KEY, value=month, description='日志分区当前月份', category='system'
+                ))
+            elif marker != month:
+                # 条件更新是事务中的第一条写入，其他进程在此等待写锁，之后更新不到任何行
+                claimed = connection.execute(settings.update().where(
+                    settings.c.key == MONTH_KEY, settings.c.value == marker
+                ).values(value=month)).rowcount
+                if claimed:
+                    name = self._rename(connection, marker)
+
+        self._month = month
+        if name:
+            logger.info('log partition rotated name=%s', name)
+            from utils.stats_counters import stats_counters
+            stats_counters.mark_stale()
+        return name
+
+    def _rename(self, connection, month):
+        from models.log import Log
+
+        preparer = connection.dialect.identifier_preparer
+        existing = set(db.inspect(connection).get_table_names())
+        name = base = 'logs_' + month.replace('-', '_')
+        suffix = 1
+        while name in existing:
+            suffix += 1
+            name = f'{base}_{suffix}'
+
+        last_id = max(
+            connection.exec_driver_sql('SELECT MAX(id) FROM logs').scalar() or 0,
+            connection.exec_driver_sql("SELECT MAX(seq) FROM sqlite_sequence WHERE name = 'logs'").scalar() or 0
+        )
+
+        connection.exec_driver_sql(f'ALTER TABLE logs RENAME TO {preparer.quote(name)}')
+        # SQLite的索引名在整个数据库内唯一：旧表的索引先删除，之后以分区表名为前缀重建
+        for index in db.inspect(connection).get_indexes(name):
+            connection.exec_driver_sql(f'DROP INDEX {preparer.quote(index["name"])}')
+        Log.__table__.create(connection)
+
+        # 新表从旧表的最大主键之后继续编号，跨分区读取时主键不重复
+        connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'logs'")
+        connection.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('logs', :seq)"), {'seq': last_id})
+
+        connection.execute(LogPartition.__table__.insert().values(name=name, month=month, created_at=now_utc()))
+        return name
+
+    def finalize(self, name):
+        """为分区重建索引并统计行数；轮换后在后台执行，可重复调用"""
+        table = self.table(name)
+        with db.engine.begin() as connection:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+        self.refresh_stats(name)
+
+    def finalize_pending(self):
+        """补全尚未完成索引和统计的分区（如轮换后进程退出）"""
+        for partition in self.partitions():
+            if not partition.ready:
+                self.finalize(partition.name)
+
+    def refresh_stats(self, name):
+        """重新统计分区的时间范围和按级别/来源的行数（分区不再写入，只在轮换和清理后执行）"""
+        table = self.table(name)
+        registry = LogPartition.__table__
+        with db.engine.begin() as connection:
+            first_at, last_at, row_count = connection.execute(sa.select(
+                sa.func.min(table.c.created_at), sa.func.max(table.c.created_at), sa.func.count()
+            )).one()
+            levels = dict(connection.execute(
+                sa.select(table.c.level, sa.func.count()).group_by(table.c.level)
+            ).all())
+            sources = dict(connection.execute(
+                sa.select(table.c.source, sa.func.count()).group_by(table.c.source)
+            ).all())
+            connection.execute(registry.update().where(registry.c.name == name).values(
+                first_at=first_at,
+                last_at=last_at,
+                row_count=row_count,
+                level_counts=json.dumps(levels),
+                source_counts=json.dumps(sources)
+            ))
+        return row_count
+
+    def drop(self, partition, archive=False):
+        """
+        删除整个分区表；archive为True时先按主键顺序导出为按月的压缩JSONL
+        删除本身不逐行处理，返回分区内的行数
+        """
+        table = self.table(partition.name)
+        if archive:
+            from utils.log_archive import write_rows
+
+            count = 0
+            last_id = None
+            while True:
+                query = sa.select(table).order_by(table.c.id).limit(EXPORT_CHUNK_SIZE)
+                if last_id is not None:
+                    query = query.where(table.c.id > last_id)
+                rows = db.session.execute(query).mappings().all()
+                if not rows:
+                    break
+                write_rows([dict(row) for row in rows])
+                count += len(rows)
+                last_id = rows[-1]['id']
+        elif partition.ready:
+            count = partition.row_count
+        else:
+            count = db.session.execute(sa.select(sa.func.count()).select_from(table)).scalar()
+
+        # 释放会话的读事务后再删除表
+        db.session.remove()
+        registry = LogPartition.__table__
+        preparer = db.engine.dialect.identifier_preparer
+        with db.engine.begin() as connection:
+            connection.execute(registry.delete().where(registry.c.name == partition.name))
+            connection.exec_driver_sql(f'DROP TABLE IF EXISTS {preparer.quote(partition.name)}')
+        self._metadata.remove(table)
+
+        from utils.stats_counters import stats_counters
+        stats_counters.mark_stale()
+        logger.info('log partition dropped name=%s rows=%s archived=%s', partition.name, count, archive)
+        return count
+
+    def _check_month(self):
+        # 每个请求只比较内存中的月份，需要轮换时在后台线程中执行
+        if self._month == _current_month() or not self.enabled:
+            return
+        if time.monotonic() - self._attempted_at < RETRY_INTERVAL:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._attempted_at = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name='log-partitions', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        with self.app.app_context():
+            try:
+                self.rotate()
+                self.finalize_pending()
+            except Exception:
+                logger.exception('log partition rotation failed')
+            finally:
+                db.session.remove()
+
+
+def _current_month():
+    return now_utc().strftime('%Y-%m')
+
+
+def _naive_utc(value):
+    """数据库中的时间不带时区信息（UTC）"""
+    if value is not None and value.tzinfo is not None:
+        from datetime import timezone
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# 全局实例
+log_partitions = LogPartitions()
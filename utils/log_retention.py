@@ -0,0 +1,409 @@
+# utils/log_retention.py
+import atexit
+import threading
+import time
+from datetime import timedelta
+
+from models.database import db
+from utils.logger import get_logger
+from utils.stats_counters import stats_counters
+from utils.timezone import now_utc
+
+logger = get_logger('log_retention')
+
+# 每条 DELETE 语句最多绑定的主键数量
+DELETE_BATCH_SIZE = 500
+
+
+class LogRetention:
+    """
+    日志保留策略引擎
+    按级别/来源的保留天数，用分块的集合式 DELETE 清理过期日志，每块一个事务，
+    由后台线程定期执行，可选在清理后对SQLite执行 VACUUM / incremental_vacuum
+    """
+
+    def __init__(self):
+        self.app = None
+        self._run_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._status = {
+            'running': False,
+            'current': None,
+            'deleted': 0,
+            'started_at': None,
+            'finished_at': None,
+            'last_result': None,
+            'error': None
+        }
+
+    def init_app(self, app):
+        """绑定应用，在请求中按需启动后台调度线程"""
+        self.app = app
+        app.extensions['log_retention'] = self
+        app.before_request(self._ensure_started)
+        atexit.register(self.stop)
+
+    @property
+    def interval(self):
+        return self.app.config.get('LOG_RETENTION_INTERVAL', 0)
+
+    def status(self):
+        """当前/最近一次清理的进度"""
+        return dict(self._status)
+
+    def policies(self):
+        """
+        生效的保留策略列表，按顺序匹配，每条日志只使用第一条匹配的策略
+        最后追加默认策略（系统设置中的 log_retention_days）
+        """
+        from models.setting import Setting
+
+        policies = [dict(policy) for policy in self.app.config.get('LOG_RETENTION_POLICIES', [])]
+
+        try:
+            default_days = int(Setting.get_value('log_retention_days', 30))
+        except (TypeError, ValueError):
+            default_days = 30
+        policies.append({'days': default_days})
+        return policies
+
+    def purge(self, vacuum=None):
+        """
+        按保留策略清理过期日志，返回每条策略删除的行数
+        同一时间只允许一个清理任务，已有任务在运行时返回None
+        """
+        if not self._run_lock.acquire(blocking=False):
+            return None
+
+        try:
+            self._start_status()
+            from utils.log_partitions import log_partitions
+
+            results = []
+            now = now_utc()
+            policies = self.policies()
+            # 启用归档时，过期日志先写入按月的压缩归档再删除
+            archive = self.app.config.get('LOG_ARCHIVE_ENABLED', False)
+
+            # 所有日志都已超过全部策略保留期的分区整表删除，不逐行处理
+            if all(policy.get('days') is not None and int(policy['days']) > 0 for policy in policies):
+                cutoff = now - timedelta(days=max(int(policy['days']) for policy in policies))
+                for partition in log_partitions.partitions():
+                    if partition.last_at is not None and partition.last_at < cutoff.replace(tzinfo=None):
+                        self._status['current'] = f'partition {partition.name}'
+                        deleted = log_partitions.drop(partition, archive=archive)
+                        self._status['deleted'] += deleted
+                        results.append({'policy': f'partition {partition.month}', 'deleted': deleted})
+
+            for position, policy in enumerate(policies):
+                days = policy.get('days')
+                if days is not None and int(days) > 0:
+                    cutoff = now - timedelta(days=int(days))
+                    name = _policy_name(policy)
+                    self._status['current'] = name
+                    deleted = 0
+                    for table in log_partitions.tables(before=cutoff):
+                        condition = _policy_condition(table.c, policy)
+                        # 排除前面策略已覆盖的日志
+                        previous = [_policy_condition(table.c, earlier) for earlier in policies[:position]]
+                        where = db.and_(condition, table.c.created_at < cutoff, *[db.not_(c) for c in previous])
+                        deleted += self.delete_where(table, where, archive=archive)
+                    results.append({'policy': name, 'days': int(days), 'deleted': deleted})
+
+            results.append({'policy': 'whitelist_changes', 'deleted': self._purge_whitelist_changes()})
+            self._vacuum(vacuum)
+            self._finish_status(results)
+            return results
+        except Exception as e:
+            db.session.rollback()
+            self._status['error'] = str(e)
+            logger.exception('log retention purge failed')
+            raise
+        finally:
+            self._status['running'] = False
+            self._status['current'] = None
+            self._run_lock.release()
+
+    def clear_all(self, vacuum=None, on_progress=None):
+        """清空全部日志（分块删除），返回删除的行数；已有任务在运行时返回None"""
+        if not self._run_lock.acquire(blocking=False):
+            return None
+
+        try:
+            self._start_status()
+            from models.log import Log
+            from utils.log_partitions import log_partitions
+
+            self._status['current'] = 'all'
+            # 已轮换的分区整表删除，logs 表分块删除
+            dropped = 0
+            for partition in log_partitions.partitions():
+                count = log_partitions.drop(partition)
+                dropped += count
+                self._status['deleted'] += count
+                if on_progress is not None:
+                    on_progress(dropped)
+
+            def progress(count):
+                if on_progress is not None:
+                    on_progress(dropped + count)
+
+            deleted = dropped + self.delete_where(Log, db.true(), on_progress=progress)
+            self._vacuum(vacuum)
+            self._finish_status([{'policy': 'all', 'deleted': deleted}])
+            return deleted
+        except Exception as e:
+            db.session.rollback()
+            self._status['error'] = str(e)
+            raise
+        finally:
+            self._status['running'] = False
+            self._status['current'] = None
+            self._run_lock.release()
+
+    def delete_where(self, model, where, archive=False, on_progress=None):
+        """
+        按主键分块删除：先查询一块主键，再按绑定的主键列表 DELETE，每块单独提交
+        （不使用 IN (SELECT ... LIMIT n) 子查询，MySQL不支持）
+        model 可以是模型或表（如日志分区表）
+        archive为True时，每块先追加写入按月的压缩归档文件，再删除
+        on_progress(已删除行数) 每块提交后调用
+        """
+        chunk_size = self.app.config.get('LOG_RETENTION_CHUNK_SIZE', 5000)
+        table = getattr(model, '__table__', model)
+        primary_key = table.primary_key.columns.values()[0]
+
+        deleted = 0
+        while True:
+            if archive:
+                from utils.log_archive import write_rows
+
+                rows = db.session.execute(
+                    db.select(table).where(where).order_by(primary_key).limit(chunk_size)
+                ).mappings().all()
+                if rows:
+                    write_rows([dict(row) for row in rows])
+                ids = [row[primary_key.name] for row in rows]
+            else:
+                ids = db.session.execute(
+                    db.select(primary_key).where(where).order_by(primary_key).limit(chunk_size)
+                ).scalars().all()
+            if not ids:
+                return self._finish_delete(table, deleted)
+
+            count = 0
+            for start in range(0, len(ids), DELETE_BATCH_SIZE):
+                result = db.session.execute(table.delete().where(
+                    primary_key.in_(ids[start:start + DELETE_BATCH_SIZE])
+                ))
+                count += result.rowcount or 0
+            db.session.commit()
+
+            deleted += count
+            self._status['deleted'] += count
+            if count:
+                # 批量删除不经过ORM，由计数器重新校准
+                stats_counters.mark_stale()
+            if on_progress is not None:
+                on_progress(deleted)
+            if len(ids) < chunk_size:
+                return self._finish_delete(table, deleted)
+
+    @staticmethod
+    def _finish_delete(table, deleted):
+        """日志分区删除了部分行后重新统计，删空的分区直接删除"""
+        from models.log_partition import LogPartition
+        from utils.log_partitions import log_partitions
+
+        if deleted and table.name.startswith('logs_'):
+            partition = db.session.get(LogPartition, table.name)
+            if partition is not None and not log_partitions.refresh_stats(table.name):
+                log_partitions.drop(partition)
+        return deleted
+
+    def archive_month(self, month, vacuum=None):
+        """
+        将指定月份（YYYY-MM，unknown 表示没有时间戳的日志）的全部日志归档为压缩JSONL并从数据库删除
+        该月轮换出的日志分区导出后整表删除；其他表中属于该月的日志（如轮换前的历史日志）按块导出后删除
+        返回归档的行数；月份无效返回-1，已有任务在运行时返回None
+        """
+        from utils.log_archive import UNKNOWN_MONTH, parse_month
+
+        bounds = parse_month(month)
+        if bounds is None and month != UNKNOWN_MONTH:
+            return -1
+        if not self._run_lock.acquire(blocking=False):
+            return None
+
+        try:
+            self._start_status()
+            from utils.log_partitions import log_partitions
+
+            self._status['current'] = f'archive {month}'
+            archived = 0
+            for partition in log_partitions.partitions():
+                if partition.month == month:
+                    count = log_partitions.drop(partition, archive=True)
+                    archived += count
+                    self._status['deleted'] += count
+
+            for table in log_partitions.tables():
+                if bounds is None:
+                    where = table.c.created_at.is_(None)
+                else:
+                    where = db.and_(table.c.created_at >= bounds[0], table.c.created_at < bounds[1])
+                archived += self.delete_where(table, where, archive=True)
+            self._vacuum(vacuum)
+            self._finish_status([{'policy': f'archive {month}', 'deleted': archived}])
+            return archived
+        except Exception as e:
+            db.session.rollback()
+            self._status['error'] = str(e)
+            raise
+        finally:
+            self._status['running'] = False
+            self._status['current'] = None
+            self._run_lock.release()
+
+    def _purge_whitelist_changes(self):
+        """清理过旧的白名单变更记录，始终保留最新一条以维持当前版本号"""
+        from models.whitelist_change import WhitelistChange
+
+        days = self.app.config.get('WHITELIST_CHANGE_RETENTION_DAYS', 30)
+        if not days:
+            return 0
+
+        latest = WhitelistChange.current_revision()
+        cutoff = now_utc() - timedelta(days=days)
+        self._status['current'] = 'whitelist_changes'
+        return self.delete_where(WhitelistChange, db.and_(
+            WhitelistChange.created_at < cutoff,
+            WhitelistChange.revision < latest
+        ))
+
+    def _vacuum(self, mode=None):
+        """SQLite下回收已删除数据占用的空间"""
+        if mode is None:
+            mode = self.app.config.get('LOG_RETENTION_VACUUM')
+        if not mode or db.engine.dialect.name != 'sqlite':
+            return
+
+        self._status['current'] = 'vacuum'
+        db.session.remove()
+        # VACUUM 不能在事务中执行
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            if mode == 'full':
+                connection.exec_driver_sql('VACUUM')
+            else:
+                # 仅在 auto_vacuum=INCREMENTAL 的数据库上生效
+                connection.exec_driver_sql('PRAGMA incremental_vacuum')
+
+    def _start_status(self):
+        self._status.update({
+            'running': True,
+            'current': None,
+            'deleted': 0,
+            'started_at': now_utc().isoformat(),
+            'finished_at': None,
+            'error': None
+        })
+
+    def _finish_status(self, results):
+        self._status['finished_at'] = now_utc().isoformat()
+        self._status['last_result'] = results
+        logger.info('log retention finished deleted=%s', self._status['deleted'])
+
+    def run_in_background(self, func, *args, **kwargs):
+        """在后台线程中执行清理任务，已有任务在运行时返回False"""
+        if self._run_lock.locked():
+            return False
+
+        def target():
+            with self.app.app_context():
+                try:
+                    func(*args, **kwargs)
+                except Exception:
+                    logger.exception('background log retention task failed')
+                finally:
+                    db.session.remove()
+
+        threading.Thread(target=target, name='log-retention-task', daemon=True).start()
+        return True
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def _ensure_started(self):
+        # 延迟到第一次请求时启动，多进程部署时在每个工作进程内各自启动
+        if not self.interval or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='log-retention', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        # 启动后稍作延迟再进行第一次清理，避免与启动过程争用数据库
+        delay = min(60, self.interval)
+        while not self._stop_event.wait(delay):
+            started = time.monotonic()
+            with self.app.app_context():
+                try:
+                    self.purge()
+                except Exception:
+                    pass
+                finally:
+                    db.session.remove()
+            delay = max(1, self.interval - (time.monotonic() - started))
+
+
+def clear_logs_job(context, user_id, username, remote_addr):
+    """后台任务：清空全部日志"""
+    from models.log import Log
+
+    total = stats_counters.log_total()
+    deleted = log_retention.clear_all(on_progress=lambda count: context.progress(count, total))
+    if deleted is None:
+        raise RuntimeError('日志清理任务正在运行')
+
+    # 验证删除结果
+    remaining = db.session.query(Log.all_partitions()).count()
+
+    # 记录操作日志
+    operation_log = Log(
+        level='warning',
+        message=f'管理员清空日志，删除了 {deleted} 条记录',
+        source='web',
+        ip_address=remote_addr,
+        user_id=user_id,
+        details=f'user: {username}, cleared: {deleted}, remaining: {remaining}'
+    )
+    db.session.add(operation_log)
+    db.session.commit()
+
+    context.progress(deleted, deleted, message=f'删除 {deleted} 条，剩余 {remaining} 条')
+    return {'deleted': deleted, 'remaining': remaining}
+
+
+def _policy_condition(columns, policy):
+    """策略的匹配条件：level / source 均可选，都不指定时匹配全部日志；columns 为模型或表的列集合"""
+    conditions = []
+    if policy.get('level'):
+        conditions.append(columns.level == policy['level'])
+    if policy.get('source'):
+        conditions.append(columns.source == policy['source'])
+    return db.and_(*conditions) if conditions else db.true()
+
+
+def _policy_name(policy):
+    parts = [f'{key}={policy[key]}' for key in ('level', 'source') if policy.get(key)]
+    return ','.join(parts) or 'default'
+
+
+# 全局实例
+log_retention = LogRetention()
@@ -0,0 +1,164 @@
+# utils/log_writer.py
+import atexit
+import queue
+import threading
+import time
+
+from models.database import db
+from utils.logger import get_logger
+
+logger = get_logger('log_writer')
+
+
+class LoginLogWriter:
+    """
+    登录日志（以及同步日志）异步批量写入器
+    请求线程只负责入队，后台线程按数量或时间触发批量写入，每批一次提交
+    """
+
+    def __init__(self):
+        self.app = None
+        self._queue = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.written_count = 0
+        self.rejected_count = 0
+        self.failed_count = 0
+
+    def init_app(self, app):
+        """绑定应用，注册退出时的刷新"""
+        self.app = app
+        app.extensions['login_log_writer'] = self
+        self._queue = queue.Queue(maxsize=app.config.get('LOGIN_LOG_QUEUE_SIZE', 10000))
+        atexit.register(self.stop)
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config.get('LOGIN_LOG_ASYNC', True)
+
+    def qsize(self):
+        """当前排队的日志数量"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, row):
+        """
+        提交一条登录日志
+        返回 'queued'（已入队）、'written'（已同步写入）或 'rejected'（队列已满被拒绝）
+        """
+        if not self.enabled or self._stop_event.is_set():
+            self._write_now([row])
+            return 'written'
+
+        self._ensure_started()
+
+        try:
+            self._queue.put_nowait(row)
+            return 'queued'
+        except queue.Full:
+            pass
+
+        # 队列已满，按配置的背压策略处理
+        policy = self.app.config.get('LOGIN_LOG_BACKPRESSURE', 'sync')
+        if policy == 'block':
+            try:
+                self._queue.put(row, timeout=self.app.config.get('LOGIN_LOG_BLOCK_TIMEOUT', 2.0))
+                return 'queued'
+            except queue.Full:
+                self.rejected_count += 1
+                return 'rejected'
+        elif policy == 'reject':
+            self.rejected_count += 1
+            return 'rejected'
+
+        # 默认 'sync'：在请求线程中直接写入，自然限制入流速度
+        self._write_now([row])
+        return 'written'
+
+    def flush(self):
+        """立即写入当前队列中的全部日志"""
+        while True:
+            batch = self._drain(self.app.config.get('LOGIN_LOG_BATCH_SIZE', 500))
+            if not batch:
+                return
+            self._write_batch(batch)
+
+    def stop(self, timeout=10):
+        """停止后台线程，并保证队列中的日志全部落盘"""
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        if self.app is not None and self.qsize():
+            self.flush()
+
+    def _ensure_started(self):
+        # 延迟到第一次使用时启动，多进程部署时在每个工作进程内各自启动
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='login-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        batch_size = self.app.config.get('LOGIN_LOG_BATCH_SIZE', 500)
+        interval = self.app.config.get('LOGIN_LOG_FLUSH_INTERVAL', 1.0)
+
+        while not self._stop_event.is_set():
+            batch = []
+            deadline = time.monotonic() + interval
+            # 攒够一批或到达时间间隔即写入
+            while len(batch) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                if self._stop_event.is_set():
+                    break
+
+            batch.extend(self._drain(batch_size - len(batch)))
+            if batch:
+                self._write_batch(batch)
+
+        # 退出前写完剩余日志
+        self.flush()
+
+    def _drain(self, limit):
+        items = []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _write_batch(self, rows):
+        with self.app.app_context():
+            try:
+                self._write_now(rows)
+            except Exception as e:
+                self.failed_count += len(rows)
+                logger.error('failed to write login log batch size=%s error=%s', len(rows), e)
+            finally:
+                db.session.remove()
+
+    def _write_now(self, rows):
+        from models.log import Log
+
+        try:
+            Log.bulk_insert(rows)
+            db.session.commit()
+            self.written_count += len(rows)
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+# 全局写入器实例
+login_log_writer = LoginLogWriter()
@@ -0,0 +1,80 @@
+# utils/logger.py
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+# 所有模块日志器的父级名称
+ROOT_LOGGER_NAME = 'cwhitelist'
+
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+_listener = None
+
+
+def get_logger(name):
+    """获取模块日志器，如 get_logger('auth') -> cwhitelist.auth"""
+    return logging.getLogger(f'{ROOT_LOGGER_NAME}.{name}')
+
+
+def setup_logging(app):
+    """
+    根据配置初始化日志
+    - LOG_LEVEL: 日志级别，低于该级别的调用只做一次级别判断，不会格式化消息
+    - LOG_ASYNC: 为True时通过QueueHandler写入，由后台线程负责输出，请求线程不会阻塞在stdout上
+    """
+    global _listener
+
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.setLevel(_parse_level(app.config.get('LOG_LEVEL', 'INFO')) or logging.INFO)
+    root.propagate = False
+
+    # 重复初始化时先移除旧的处理器
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    if app.config.get('LOG_ASYNC', False):
+        log_queue = queue.SimpleQueue()
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_stop_listener)
+    else:
+        root.addHandler(stream_handler)
+
+    return root
+
+
+def set_log_level(level):
+    """运行时调整日志级别，返回新的级别名称；级别无效时返回None"""
+    parsed = _parse_level(level)
+    if parsed is None:
+        return None
+    logging.getLogger(ROOT_LOGGER_NAME).setLevel(parsed)
+    return logging.getLevelName(parsed)
+
+
+def get_log_level():
+    """当前日志级别名称"""
+    return logging.getLevelName(logging.getLogger(ROOT_LOGGER_NAME).level)
+
+
+def _parse_level(level):
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).upper())
+    return value if isinstance(value, int) else None
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,58 @@
+# utils/login_stats.py
+from models.database import db
+from utils.deferred import DeferredUpdates
+from utils.timezone import now_utc
+
+
+def _flush_entry_logins(updates):
+    """将累积的白名单条目登录统计写入数据库（一条 executemany UPDATE）"""
+    from models.whitelist import WhitelistEntry
+
+    table = WhitelistEntry.__table__
+    statement = table.update().where(table.c.id == db.bindparam('b_id')).values(
+        login_count=db.func.coalesce(table.c.login_count, 0) + db.bindparam('b_count'),
+        last_login=db.bindparam('b_last_login'),
+        last_login_ip=db.func.coalesce(db.bindparam('b_last_ip'), table.c.last_login_ip)
+    )
+    db.session.execute(statement, [
+        {
+            'b_id': entry_id,
+            'b_count': increments.get('login_count', 0),
+            'b_last_login': values.get('last_login'),
+            'b_last_ip': values.get('last_login_ip')
+        }
+        for entry_id, increments, values in updates
+    ])
+
+
+def find_login_entry(index, player_name=None, player_uuid=None, player_ip=None, check_type=None):
+    """根据登录事件在白名单索引中找到命中的条目，优先使用插件上报的检查类型"""
+    identifiers = {'name': player_name, 'uuid': player_uuid, 'ip': player_ip}
+    if identifiers.get(check_type):
+        entry, _ = index.check(**{check_type: identifiers[check_type]})
+        if entry is not None:
+            return entry
+
+    entry, _ = index.check(name=player_name, uuid=player_uuid, ip=player_ip)
+    return entry
+
+
+def record_entry_login(index, player_name=None, player_uuid=None, player_ip=None,
+                       check_type=None, login_at=None):
+    """
+    将一次允许的登录计入命中的白名单条目
+    同一条目在一个刷新间隔内的多次登录合并为一次UPDATE；返回命中的条目ID
+    """
+    entry = find_login_entry(index, player_name, player_uuid, player_ip, check_type)
+    if entry is None:
+        return None
+
+    values = {'last_login': login_at or now_utc()}
+    if player_ip:
+        values['last_login_ip'] = player_ip
+    entry_logins.add(entry['id'], increments={'login_count': 1}, values=values)
+    return entry['id']
+
+
+# 全局实例
+entry_logins = DeferredUpdates('entry_logins', _flush_entry_logins, 'ENTRY_LOGIN_FLUSH_INTERVAL', 10)
@@ -0,0 +1,96 @@
+# utils/schema.py
+from models.database import db
+from utils.logger import get_logger
+
+logger = get_logger('schema')
+
+
+def upgrade_schema():
+    """
+    为已有数据库补齐模型中新增的列和索引（db.create_all 只会创建缺失的表）
+    新增列均为可空列，通过 ALTER TABLE ADD COLUMN 添加；返回执行的变更列表
+    """
+    engine = db.engine
+    preparer = engine.dialect.identifier_preparer
+    changes = []
+
+    with engine.begin() as connection:
+        inspector = db.inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    logger.warning('cannot add non-nullable column %s.%s automatically', table.name, column.name)
+                    continue
+
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(db.text(
+                    f'ALTER TABLE {preparer.format_table(table)} '
+                    f'ADD COLUMN {preparer.format_column(column)} {column_type}'
+                ))
+                changes.append(f'column {table.name}.{column.name}')
+
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    prepare = INDEX_PREPARATIONS.get(index.name)
+                    if prepare is not None:
+                        changes.extend(prepare(connection))
+                    index.create(connection, checkfirst=True)
+                    changes.append(f'index {index.name}')
+
+    for change in changes:
+        logger.info('schema upgraded: %s', change)
+    return changes
+
+
+def dedupe_whitelist_entries(connection):
+    """
+    创建 (类型, 值) 唯一索引之前合并重复的白名单条目
+    每组保留一条（优先启用的，其次最早创建的），其余删除并记录为删除变更，客户端同步时随之移除
+    """
+    from models.whitelist import WhitelistEntry
+    from models.whitelist_change import WhitelistChange
+    from utils.timezone import now_utc
+
+    table = WhitelistEntry.__table__
+    duplicates = db.select(table.c.type, table.c.value).group_by(
+        table.c.type, table.c.value
+    ).having(db.func.count() > 1).subquery()
+    rows = connection.execute(db.select(table.c.id, table.c.type, table.c.value).join(
+        duplicates, db.and_(table.c.type == duplicates.c.type, table.c.value == duplicates.c.value)
+    ).order_by(
+        table.c.type, table.c.value, table.c.is_active.desc(), table.c.created_at, table.c.id
+    )).all()
+
+    seen = set()
+    removed = []
+    for row in rows:
+        key = (row.type, row.value)
+        if key in seen:
+            removed.append(row)
+        seen.add(key)
+    if not removed:
+        return []
+
+    for start in range(0, len(removed), 500):
+        connection.execute(table.delete().where(table.c.id.in_([row.id for row in removed[start:start + 500]])))
+    now = now_utc()
+    connection.execute(WhitelistChange.__table__.insert(), [
+        {'entry_id': row.id, 'type': row.type, 'value': row.value, 'action': 'remove', 'created_at': now}
+        for row in removed
+    ])
+    return [f'removed {len(removed)} duplicate whitelist entries']
+
+
+# 创建索引之前需要先处理已有数据的索引
+INDEX_PREPARATIONS = {
+    'uq_whitelist_entries_type_value': dedupe_whitelist_entries,
+}
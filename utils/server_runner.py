@@ -0,0 +1,132 @@
+# utils/server_runner.py
+import os
+import sys
+
+from models.database import db
+from utils.logger import setup_logging
+
+
+def run_production(app, host='0.0.0.0', port=5000, workers=None, threads=None):
+    """
+    以生产模式运行：优先使用 Gunicorn（多进程预派生 + 线程），
+    不可用时（如Windows）退回 Waitress（单进程多线程），都未安装时使用多线程的Werkzeug服务器
+    """
+    workers = workers or app.config.get('SERVER_WORKERS', 2)
+    threads = threads or app.config.get('SERVER_THREADS', 8)
+    # 推送连接的上限按实际的线程数计算
+    app.config['SERVER_THREADS'] = threads
+
+    if os.name != 'nt':
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            pass
+        else:
+            print(f"使用 Gunicorn 运行: {workers} 个工作进程 × {threads} 个线程")
+            print("发送 SIGHUP 平滑重启工作进程，SIGTERM 在处理完当前请求后退出")
+            GunicornServer(app, gunicorn_options(app, host, port, workers, threads)).run()
+            return
+
+    # 单进程服务器在当前进程中启动推送服务（Gunicorn 在每个工作进程派生后启动）
+    _start_stream_server(app)
+
+    try:
+        import waitress
+    except ImportError:
+        pass
+    else:
+        if workers > 1:
+            print(f"Waitress 为单进程服务器，忽略 --workers {workers}")
+        print(f"使用 Waitress 运行: {threads} 个线程")
+        waitress.serve(
+            app,
+            host=host,
+            port=port,
+            threads=threads,
+            channel_timeout=app.config.get('SERVER_KEEPALIVE', 5) * 12,
+            connection_limit=app.config.get('SERVER_MAX_CONNECTIONS', 1000),
+            ident='CWhitelist'
+        )
+        return
+
+    print("⚠ 未安装 gunicorn 或 waitress，使用多线程的开发服务器（pip install gunicorn / waitress）",
+          file=sys.stderr)
+    app.run(host=host, port=port, threaded=True)
+
+
+def gunicorn_options(app, host, port, workers, threads):
+    """Gunicorn 配置"""
+    config = app.config
+    return {
+        'bind': f'{host}:{port}',
+        'workers': workers,
+        'threads': threads,
+        # 有线程时使用 gthread；WSGI推送接口的连接在等待期间占用线程，数量由 WHITELIST_STREAM_MAX_CLIENTS 限制，
+        # 大量推送连接应使用独立端口的事件驱动推送服务（WHITELIST_STREAM_PORT）
+        'worker_class': config.get('SERVER_WORKER_CLASS') or ('gthread' if threads > 1 else 'sync'),
+        'keepalive': config.get('SERVER_KEEPALIVE', 5),
+        # 工作进程处理一定数量的请求后平滑重启，加抖动避免同时重启
+        'max_requests': config.get('SERVER_MAX_REQUESTS', 10000),
+        'max_requests_jitter': config.get('SERVER_MAX_REQUESTS_JITTER', 1000),
+        'timeout': config.get('SERVER_WORKER_TIMEOUT', 120),
+        'graceful_timeout': config.get('SERVER_GRACEFUL_TIMEOUT', 30),
+        'worker_connections': config.get('SERVER_MAX_CONNECTIONS', 1000),
+        'accesslog': config.get('SERVER_ACCESS_LOG'),
+        'errorlog': '-',
+        'proc_name': 'cwhitelist',
+        'post_fork': _post_fork,
+    }
+
+
+def _post_fork(server, worker):
+    """
+    主进程中已经建立的数据库连接不能在子进程中复用，派生后丢弃连接池；
+    线程不会被复制到子进程，异步日志的输出线程需要重新启动
+    （各模块的后台线程都在第一次使用时才启动，派生后在每个工作进程内各自启动）
+    """
+    app = worker.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
+        # 平滑重启或回收工作进程后，将已退出的工作进程未完成的任务标记为失败
+        from utils.jobs import job_runner
+        job_runner.recover()
+        db.session.remove()
+    if app.config.get('LOG_ASYNC', False):
+        setup_logging(app)
+    # 各工作进程通过 SO_REUSEPORT 监听同一个推送端口
+    _start_stream_server(app)
+
+
+def _start_stream_server(app):
+    """配置了 WHITELIST_STREAM_PORT 时启动事件驱动的推送服务"""
+    from utils.stream_server import whitelist_stream_server
+
+    if whitelist_stream_server.enabled:
+        port = whitelist_stream_server.start()
+        if port:
+            print(f"白名单推送服务: http://{app.config.get('WHITELIST_STREAM_HOST', '0.0.0.0')}:{port}/api/whitelist/stream")
+        else:
+            print("⚠ 白名单推送服务启动失败，请检查 WHITELIST_STREAM_PORT", file=sys.stderr)
+
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = object
+
+
+class GunicornServer(BaseApplication):
+    """在进程内启动 Gunicorn，复用已经初始化好的应用"""
+
+    def __init__(self, app, options):
+        self.application = app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if value is not None and key in self.cfg.settings:
+                self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
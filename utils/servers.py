@@ -0,0 +1,102 @@
+# utils/servers.py
+import threading
+import time
+
+from flask import current_app
+
+from models.database import db
+from models.server import Server
+from utils.deferred import DeferredUpdates
+from utils.timezone import now_utc
+
+
+class ServerRegistry:
+    """已注册服务器的进程内缓存，同步和登录请求据此识别服务器而不查询数据库"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = None
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        """服务器注册或修改后调用"""
+        self._servers = None
+
+    def get(self, server_id):
+        """按 server_id 获取服务器信息，不存在或已禁用时返回None"""
+        if not server_id:
+            return None
+        return self._load().get(server_id)
+
+    def all(self):
+        return list(self._load().values())
+
+    def scope(self, server_id):
+        """服务器的白名单适用范围 (服务器ID, 服务器组)，未注册的服务器只匹配按ID指定的条目"""
+        server = self.get(server_id)
+        return server_id, server['group_name'] if server else None
+
+    def _load(self):
+        servers = self._servers
+        ttl = current_app.config.get('SERVER_CACHE_TTL', 30)
+        if servers is not None and (not ttl or time.monotonic() - self._loaded_at < ttl):
+            return servers
+
+        with self._lock:
+            if self._servers is not None and self._servers is not servers:
+                return self._servers
+            rows = db.session.execute(
+                db.select(Server.server_id, Server.name, Server.group_name).where(Server.is_active == True)
+            ).all()
+            servers = {
+                row.server_id: {'server_id': row.server_id, 'name': row.name, 'group_name': row.group_name or None}
+                for row in rows
+            }
+            self._servers = servers
+            self._loaded_at = time.monotonic()
+            return servers
+
+
+def _flush_server_activity(updates):
+    """将累积的服务器同步状态和登录统计写入数据库（一条 executemany UPDATE）"""
+    table = Server.__table__
+    statement = table.update().where(table.c.server_id == db.bindparam('b_server_id')).values(
+        total_logins=db.func.coalesce(table.c.total_logins, 0) + db.bindparam('b_total'),
+        allowed_logins=db.func.coalesce(table.c.allowed_logins, 0) + db.bindparam('b_allowed'),
+        denied_logins=db.func.coalesce(table.c.denied_logins, 0) + db.bindparam('b_denied'),
+        last_sync=db.func.coalesce(db.bindparam('b_last_sync'), table.c.last_sync),
+        sync_status=db.func.coalesce(db.bindparam('b_sync_status'), table.c.sync_status)
+    )
+    db.session.execute(statement, [
+        {
+            'b_server_id': server_id,
+            'b_total': increments.get('total_logins', 0),
+            'b_allowed': increments.get('allowed_logins', 0),
+            'b_denied': increments.get('denied_logins', 0),
+            'b_last_sync': values.get('last_sync'),
+            'b_sync_status': values.get('sync_status')
+        }
+        for server_id, increments, values in updates
+    ])
+
+
+def record_server_sync(server_id, success=True):
+    """记录一次服务器同步（内存累积，定期批量写入）"""
+    server_activity.add(server_id, values={
+        'last_sync': now_utc(),
+        'sync_status': 'synced' if success else 'failed'
+    })
+
+
+def record_server_login(server_id, allowed):
+    """记录一次服务器上报的登录（内存累积，定期批量写入）"""
+    server_activity.add(server_id, increments={
+        'total_logins': 1,
+        'allowed_logins': 1 if allowed else 0,
+        'denied_logins': 0 if allowed else 1
+    })
+
+
+# 全局实例
+server_registry = ServerRegistry()
+server_activity = DeferredUpdates('server_activity', _flush_server_activity, 'SERVER_ACTIVITY_FLUSH_INTERVAL', 10)
@@ -0,0 +1,188 @@
+# utils/stats_counters.py
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models.database import db
+from utils.logger import get_logger
+
+logger = get_logger('stats_counters')
+
+
+class StatsCounters:
+    """
+    仪表板与日志页的计数器（进程内聚合）
+    日志和白名单条目的写入在事务提交后增量更新计数，读取为常数时间；
+    按间隔用 GROUP BY 重新校准，修正其他进程的写入和批量删除带来的偏差。
+    只有进程内第一次读取时同步校准，之后的校准在后台线程中执行，请求直接使用当前计数
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._log_levels = Counter()
+        self._log_sources = Counter()
+        self._entries_total = 0
+        self._entries_active = 0
+        self._reconciled_at = None
+        self._stale = False
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def mark_stale(self):
+        """标记计数需要重新校准（如批量删除之后），下一次读取时在后台校准"""
+        self._stale = True
+
+    def apply(self, delta):
+        """应用一个已提交事务的计数变化"""
+        with self._lock:
+            self._log_levels.update(delta['log_levels'])
+            self._log_sources.update(delta['log_sources'])
+            self._entries_total += delta['entries_total']
+            self._entries_active += delta['entries_active']
+
+    def reconcile(self):
+        """从数据库重新统计全部计数"""
+        from models.log import Log
+
+        self._stale = False
+        from models.whitelist import WhitelistEntry
+
+        from utils.log_partitions import log_partitions
+
+        log_levels = Counter(dict(db.session.query(Log.level, db.func.count(Log.id)).group_by(Log.level).all()))
+        log_sources = Counter(dict(db.session.query(Log.source, db.func.count(Log.id)).group_by(Log.source).all()))
+
+        # 已轮换的分区不再写入，使用轮换和清理时保存的统计
+        partition_levels, partition_sources = log_partitions.counts()
+        log_levels.update(partition_levels)
+        log_sources.update(partition_sources)
+        entries = dict(db.session.query(
+            WhitelistEntry.is_active, db.func.count(WhitelistEntry.id)
+        ).group_by(WhitelistEntry.is_active).all())
+
+        with self._lock:
+            self._log_levels = log_levels
+            self._log_sources = log_sources
+            self._entries_total = sum(entries.values())
+            self._entries_active = entries.get(True, 0)
+            self._reconciled_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        from flask import current_app
+
+        reconciled_at = self._reconciled_at
+        if reconciled_at is None:
+            # 还没有任何计数可用，只能同步统计
+            with self._thread_lock:
+                if self._reconciled_at is None:
+                    self.reconcile()
+            return
+
+        interval = current_app.config.get('STATS_RECONCILE_INTERVAL', 300)
+        if self._stale or (interval and time.monotonic() - reconciled_at > interval):
+            self._reconcile_in_background(current_app._get_current_object())
+
+    def _reconcile_in_background(self, app):
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, args=(app,), name='stats-reconcile', daemon=True)
+            self._thread.start()
+
+    def _run(self, app):
+        with app.app_context():
+            try:
+                self.reconcile()
+            except Exception:
+                logger.exception('stats reconcile failed')
+            finally:
+                db.session.remove()
+
+    def log_level_counts(self):
+        """按级别统计的日志数量"""
+        self._ensure_fresh()
+        with self._lock:
+            return {level: count for level, count in self._log_levels.items() if count > 0}
+
+    def log_source_counts(self):
+        """按来源统计的日志数量"""
+        self._ensure_fresh()
+        with self._lock:
+            return {source: count for source, count in self._log_sources.items() if count > 0}
+
+    def log_total(self):
+        self._ensure_fresh()
+        with self._lock:
+            return sum(count for count in self._log_levels.values() if count > 0)
+
+    def entry_counts(self):
+        """返回 (白名单条目总数, 启用的条目数)"""
+        self._ensure_fresh()
+        with self._lock:
+            return self._entries_total, self._entries_active
+
+
+def _session_delta(session):
+    delta = session.info.get('stats_delta')
+    if delta is None:
+        delta = session.info['stats_delta'] = {
+            'log_levels': Counter(),
+            'log_sources': Counter(),
+            'entries_total': 0,
+            'entries_active': 0
+        }
+    return delta
+
+
+def count_log_rows(rows):
+    """批量写入日志（不经过ORM）时登记计数变化，随当前事务提交生效"""
+    delta = _session_delta(db.session)
+    for row in rows:
+        delta['log_levels'][row['level']] += 1
+        delta['log_sources'][row['source']] += 1
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_on_flush(session, flush_context):
+    """收集本次flush中新增/删除的日志和白名单条目"""
+    from models.log import Log
+    from models.whitelist import WhitelistEntry
+
+    delta = None
+    for obj, sign in [(obj, 1) for obj in session.new] + [(obj, -1) for obj in session.deleted]:
+        if isinstance(obj, Log):
+            delta = delta or _session_delta(session)
+            delta['log_levels'][obj.level] += sign
+            delta['log_sources'][obj.source] += sign
+        elif isinstance(obj, WhitelistEntry):
+            delta = delta or _session_delta(session)
+            delta['entries_total'] += sign
+            if obj.is_active is not False:
+                delta['entries_active'] += sign
+
+    for obj in session.dirty:
+        if isinstance(obj, WhitelistEntry):
+            history = db.inspect(obj).attrs.is_active.history
+            if history.has_changes():
+                delta = delta or _session_delta(session)
+                was_active = bool(history.deleted and history.deleted[0])
+                delta['entries_active'] += int(bool(obj.is_active)) - int(was_active)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_on_commit(session):
+    delta = session.info.pop('stats_delta', None)
+    if delta is not None:
+        stats_counters.apply(delta)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('stats_delta', None)
+
+
+# 全局实例
+stats_counters = StatsCounters()
@@ -0,0 +1,315 @@
+# utils/stream_server.py
+import asyncio
+import atexit
+import json
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from models.database import db
+from utils.logger import get_logger
+from utils.whitelist_stream import change_event, opening_event, whitelist_hub
+
+logger = get_logger('stream_server')
+
+STREAM_PATH = '/api/whitelist/stream'
+
+# 请求头的最大长度（字节）和读取超时（秒）
+MAX_HEADER_BYTES = 8192
+HEADER_TIMEOUT = 10
+
+# 客户端在此时间内（秒）没有读走数据时断开，避免慢连接占用内存
+WRITE_TIMEOUT = 30
+
+
+class WhitelistStreamServer:
+    """
+    事件驱动的白名单推送服务（asyncio），在独立端口上提供与 /api/whitelist/stream 相同的SSE接口
+    空闲连接只占用一个套接字和一个协程，不占用WSGI工作线程，每个进程可以保持数百个连接；
+    版本号变化由推送中心的后台线程转交到事件循环，Token验证和增量查询在小线程池中执行，
+    同一版本区间的增量所有连接共享一次查询。多进程部署时各工作进程通过 SO_REUSEPORT 监听同一端口
+    """
+
+    def __init__(self):
+        self.app = None
+        self.port = None
+        self.clients = 0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._loop = None
+        self._stopping = None
+        self._changed = None
+        self._revision = None
+        self._executor = None
+        self._connections = set()
+
+    def init_app(self, app):
+        """绑定应用；配置了 WHITELIST_STREAM_PORT 时在第一次请求时启动（也可以直接调用 start）"""
+        self.app = app
+        app.extensions['whitelist_stream_server'] = self
+        app.before_request(self._ensure_started)
+        atexit.register(self.stop)
+
+    @property
+    def enabled(self):
+        return self.app.config.get('WHITELIST_STREAM_PORT') is not None
+
+    def start(self, timeout=5):
+        """在后台线程中启动事件循环，返回实际监听的端口；未配置或启动失败时返回None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._ready.clear()
+                self._thread = threading.Thread(target=self._run, name='whitelist-stream-server', daemon=True)
+                self._thread.start()
+        self._ready.wait(timeout)
+        return self.port
+
+    def stop(self, timeout=5):
+        loop, stopping = self._loop, self._stopping
+        if loop is not None and stopping is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(stopping.set)
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def _ensure_started(self):
+        # 每个进程只尝试启动一次（端口被占用等错误记录日志后不再重试）
+        if self._thread is None and self.enabled:
+            self.start(timeout=0)
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        self._loop = loop
+        try:
+            loop.run_until_complete(self._serve())
+        except Exception:
+            logger.exception('whitelist stream server failed')
+        finally:
+            self.port = None
+            self._ready.set()
+            loop.close()
+
+    async def _serve(self):
+        config = self.app.config
+        loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._changed = asyncio.Event()
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.get('WHITELIST_STREAM_SERVER_THREADS', 4),
+            thread_name_prefix='whitelist-stream-query'
+        )
+
+        def on_change(revision):
+            loop.call_soon_threadsafe(self._publish, revision)
+
+        whitelist_hub.subscribe(on_change)
+        try:
+            self._revision = await self._call(whitelist_hub.current_revision)
+            server = await asyncio.start_server(
+                self._handle,
+                config.get('WHITELIST_STREAM_HOST', '0.0.0.0'),
+                config['WHITELIST_STREAM_PORT'],
+                reuse_port=hasattr(socket, 'SO_REUSEPORT'),
+                limit=MAX_HEADER_BYTES
+            )
+            async with server:
+                self.port = server.sockets[0].getsockname()[1]
+                logger.info('whitelist stream server listening port=%s', self.port)
+                self._ready.set()
+                await self._stopping.wait()
+                # 等待连接处理结束（等待中的连接在 _stopping 设置后立即返回）
+                if self._connections:
+                    await asyncio.wait(self._connections, timeout=5)
+        finally:
+            whitelist_hub.unsubscribe(on_change)
+            self._executor.shutdown(wait=False)
+
+    def _publish(self, revision):
+        """在事件循环中发布新版本号，唤醒所有等待的连接"""
+        self._revision = revision
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _call(self, func, *args):
+        """在线程池中带应用上下文执行（数据库查询不阻塞事件循环）"""
+        def target():
+            with self.app.app_context():
+                try:
+                    return func(*args)
+                finally:
+                    db.session.remove()
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, target)
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            try:
+                request = await asyncio.wait_for(_read_request(reader), HEADER_TIMEOUT)
+            except (ValueError, asyncio.LimitOverrunError):
+                request = None
+            if request is None:
+                await _send_json(writer, 400, 'Bad request')
+                return
+
+            if self.clients >= self.app.config.get('WHITELIST_STREAM_SERVER_MAX_CLIENTS', 1000):
+                await _send_json(writer, 503, 'Too many stream connections, please fall back to polling',
+                                 ['Retry-After: 30'])
+                return
+
+            self.clients += 1
+            try:
+                peer = writer.get_extra_info('peername')
+                status, result = await self._call(_authorize, *request, peer[0] if peer else None)
+                if status != 200:
+                    await _send_json(writer, status, result)
+                    return
+                await self._stream(reader, writer, *result)
+            finally:
+                self.clients -= 1
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            logger.exception('whitelist stream connection failed')
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _stream(self, reader, writer, since, scope):
+        config = self.app.config
+        heartbeat = config.get('WHITELIST_STREAM_HEARTBEAT', 30)
+        max_duration = config.get('WHITELIST_STREAM_MAX_DURATION', 3600)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        revision = self._revision
+        writer.write(_response_head(200, 'text/event-stream', [
+            'Cache-Control: no-cache',
+            # 禁止反向代理缓冲推送内容
+            'X-Accel-Buffering: no'
+        ]))
+        writer.write(b'retry: 3000\n\n')
+        writer.write((await self._call(opening_event, whitelist_hub, since, revision, scope)).encode('utf-8'))
+        await asyncio.wait_for(writer.drain(), WRITE_TIMEOUT)
+
+        # 客户端发送完请求后不会再发送数据，读到EOF表示连接已关闭
+        closed = asyncio.ensure_future(reader.read())
+        try:
+            while not self._stopping.is_set():
+                remaining = max_duration - (loop.time() - started) if max_duration else None
+                if remaining is not None and remaining <= 0:
+                    return
+
+                timeout = heartbeat or None
+                if remaining is not None:
+                    timeout = min(timeout, remaining) if timeout else remaining
+
+                if self._revision == revision:
+                    changed = asyncio.ensure_future(self._changed.wait())
+                    stopping = asyncio.ensure_future(self._stopping.wait())
+                    done, pending = await asyncio.wait(
+                        {changed, closed, stopping}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    changed.cancel()
+                    stopping.cancel()
+                    if closed in done:
+                        return
+                    if not done:
+                        if heartbeat:
+                            # 注释行保持连接，代理不会因空闲断开
+                            writer.write(b': keep-alive\n\n')
+                            await asyncio.wait_for(writer.drain(), WRITE_TIMEOUT)
+                        continue
+
+                new_revision = self._revision
+                if new_revision is None or new_revision == revision:
+                    continue
+                event = await self._call(change_event, whitelist_hub, revision, new_revision, scope)
+                if event is not None:
+                    writer.write(event.encode('utf-8'))
+                    await asyncio.wait_for(writer.drain(), WRITE_TIMEOUT)
+                revision = new_revision
+        finally:
+            closed.cancel()
+
+
+async def _read_request(reader):
+    """读取请求行和请求头，返回 (方法, 路径, 查询参数, 请求头)"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    method, target, _ = lines[0].split(' ', 2)
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    url = urlsplit(target)
+    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    return method, url.path, query, headers
+
+
+def _authorize(method, path, query, headers, remote_addr):
+    """
+    在应用上下文中验证推送请求，与 /api/whitelist/stream 使用相同的Token和权限规则
+    成功返回 (200, (since, scope))，失败返回 (状态码, 错误消息)
+    """
+    from utils.auth import check_token_permissions, resolve_token
+    from utils.token_cache import token_usage
+    from utils.servers import record_server_sync, server_registry
+    from utils.timezone import now_utc
+
+    if path != STREAM_PATH:
+        return 404, 'Not found'
+    if method != 'GET':
+        return 405, 'Method not allowed'
+
+    authorization = headers.get('authorization', '')
+    token_str = authorization[7:] if authorization.startswith('Bearer ') else query.get('token') or authorization
+    if not token_str:
+        return 401, 'Authentication required. Please provide a valid token.'
+    token = resolve_token(token_str)
+    if token is None:
+        return 401, 'Invalid or expired token.'
+    if not check_token_permissions(token, 'api.stream_whitelist', method):
+        return 403, 'Insufficient permissions for this operation.'
+    token_usage.add(token.id, increments={'use_count': 1}, values={'last_used': now_utc(), 'last_ip': remote_addr})
+
+    # 断线重连时通过 Last-Event-ID 或 since 续传
+    since = _int_or_none(headers.get('last-event-id'))
+    if since is None:
+        since = _int_or_none(query.get('since'))
+
+    server_id = query.get('server_id')
+    scope = server_registry.scope(server_id) if server_id else None
+    if server_registry.get(server_id):
+        record_server_sync(server_id)
+    return 200, (since, scope)
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _response_head(status, content_type, headers=()):
+    lines = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}', f'Content-Type: {content_type}',
+             'Connection: close', *headers]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def _send_json(writer, status, message, headers=()):
+    body = json.dumps({'success': False, 'message': message}).encode('utf-8')
+    writer.write(_response_head(status, 'application/json', [f'Content-Length: {len(body)}', *headers]) + body)
+    await asyncio.wait_for(writer.drain(), WRITE_TIMEOUT)
+
+
+# 全局实例
+whitelist_stream_server = WhitelistStreamServer()
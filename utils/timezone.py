@@ -1,29 +1,56 @@
 # utils/timezone.py
+import time
 from datetime import datetime, timezone, timedelta
 import pytz
 from flask import current_app
 
 
+# 进程内时区缓存：(时区对象, 加载时间)
+_timezone_cache = (None, 0.0)
+
+
 def get_app_timezone():
-    """获取应用的时区设置，支持动态从数据库加载"""
+    """获取应用的时区设置，结果在进程内缓存，修改时区时失效"""
+    global _timezone_cache
+
+    tz, loaded_at = _timezone_cache
+    ttl = current_app.config.get('TIMEZONE_CACHE_TTL', 60)
+    if tz is not None and (not ttl or time.monotonic() - loaded_at < ttl):
+        return tz
+
+    tz = _load_app_timezone()
+    _timezone_cache = (tz, time.monotonic())
+    return tz
+
+
+def invalidate_timezone_cache():
+    """使时区缓存失效，下一次调用 get_app_timezone 时重新加载"""
+    global _timezone_cache
+    _timezone_cache = (None, 0.0)
+
+
+def _load_app_timezone():
+    """从数据库加载时区设置，失败时使用应用配置"""
     try:
         # 先从应用配置获取
         timezone_str = current_app.config.get('TIMEZONE', 'UTC')
 
-        # 如果应用正在运行，尝试从数据库获取最新的时区设置
-        if current_app:
-            from models.setting import Setting
-            from models.database import db
-
-            # 使用应用上下文
-            with current_app.app_context():
-                try:
-                    timezone_setting = Setting.query.filter_by(key='timezone').first()
-                    if timezone_setting and timezone_setting.value:
-                        timezone_str = timezone_setting.value
-                except Exception:
-                    # 如果数据库查询失败，使用配置中的时区
-                    pass
+        # 尝试从数据库获取最新的时区设置
+        from models.database import db
+        from models.setting import Setting
+
+        # 使用独立的短连接查询：不触发调用方会话的自动flush，也不在调用方会话中留下打开的事务
+        try:
+            table = Setting.__table__
+            with db.engine.connect() as connection:
+                value = connection.execute(
+                    db.select(table.c.value).where(table.c.key == 'timezone')
+                ).scalar()
+            if value:
+                timezone_str = value
+        except Exception:
+            # 如果数据库查询失败，使用配置中的时区
+            pass
 
         return pytz.timezone(timezone_str)
     except pytz.UnknownTimeZoneError:
@@ -47,6 +74,7 @@ def update_app_timezone(timezone_str):
         with current_app.app_context():
             Setting.set_value('timezone', timezone_str, '系统时区设置', 'system')
 
+        invalidate_timezone_cache()
         return True
     except pytz.UnknownTimeZoneError:
         return False
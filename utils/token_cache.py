@@ -0,0 +1,179 @@
+# utils/token_cache.py
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import pytz
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models.database import db
+from utils.deferred import DeferredUpdates
+from utils.timezone import now_utc
+
+
+class CachedToken:
+    """已验证Token的只读副本，脱离数据库会话，可在线程间共享"""
+    __slots__ = ('id', 'name', 'user_id', 'created_at', 'expires_at', 'is_active',
+                 'can_read', 'can_write', 'can_delete', 'can_manage')
+
+    def __init__(self, token):
+        for field in self.__slots__:
+            setattr(self, field, getattr(token, field))
+
+    def is_expired(self):
+        """检查Token是否已过期"""
+        if not self.expires_at:
+            return False
+        expires_at = self.expires_at
+        if not expires_at.tzinfo:
+            expires_at = expires_at.replace(tzinfo=pytz.UTC)
+        return now_utc() > expires_at
+
+
+# 共享的Token版本号保存在系统设置中，Token被禁用、删除、刷新或修改权限时随同一事务更新
+GENERATION_KEY = 'token_cache_generation'
+
+# 修改后需要让其他进程丢弃缓存的字段（使用统计除外）
+INVALIDATING_FIELDS = ('token', 'user_id', 'expires_at', 'is_active', 'deactivated_reason',
+                       'can_read', 'can_write', 'can_delete', 'can_manage')
+
+
+def bump_generation(session=None):
+    """在当前事务中更新共享的Token版本号，提交后所有进程在检查间隔内丢弃缓存"""
+    from models.setting import Setting
+
+    session = session or db.session
+    table = Setting.__table__
+    generation = uuid.uuid4().hex
+    # 在flush事件中也会调用，直接使用会话的连接，避免触发自动flush
+    connection = session.connection()
+    result = connection.execute(table.update().where(table.c.key == GENERATION_KEY).values(value=generation))
+    if not result.rowcount:
+        connection.execute(table.insert().values(
+            key=GENERATION_KEY, value=generation, description='Token缓存版本号', category='system'
+        ))
+
+
+def read_generation():
+    from models.setting import Setting
+
+    table = Setting.__table__
+    return db.session.execute(db.select(table.c.value).where(table.c.key == GENERATION_KEY)).scalar()
+
+
+class TokenCache:
+    """
+    已验证Token的TTL/LRU缓存，键为Token字符串的SHA-256摘要
+    多进程部署时每隔 TOKEN_CACHE_CHECK_INTERVAL 秒检查一次共享的版本号，
+    其他进程禁用、删除或刷新Token后，本进程最长在该间隔后丢弃缓存
+    """
+
+    def __init__(self):
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._last_checked = 0.0
+
+    @staticmethod
+    def _key(token_str):
+        return hashlib.sha256(token_str.encode('utf-8')).hexdigest()
+
+    def get(self, token_str):
+        """获取缓存的Token，过期或不存在时返回None"""
+        self._check_generation()
+
+        key = self._key(token_str)
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+
+            token, cached_at = item
+            ttl = current_app.config.get('TOKEN_CACHE_TTL', 60)
+            if time.monotonic() - cached_at > ttl or token.is_expired():
+                del self._items[key]
+                return None
+
+            self._items.move_to_end(key)
+            return token
+
+    def put(self, token_str, token):
+        """缓存已验证的Token，返回只读副本"""
+        cached = CachedToken(token)
+        max_size = current_app.config.get('TOKEN_CACHE_SIZE', 1024)
+        with self._lock:
+            self._items[self._key(token_str)] = (cached, time.monotonic())
+            while len(self._items) > max_size:
+                self._items.popitem(last=False)
+        return cached
+
+    def _check_generation(self):
+        interval = current_app.config.get('TOKEN_CACHE_CHECK_INTERVAL', 5)
+        now = time.monotonic()
+        if now - self._last_checked < interval:
+            return
+
+        self._last_checked = now
+        generation = read_generation()
+        if generation != self._generation:
+            with self._lock:
+                self._items.clear()
+                self._generation = generation
+
+    def invalidate(self, token_id):
+        """Token被禁用、删除或刷新时移除缓存"""
+        with self._lock:
+            for key in [key for key, (token, _) in self._items.items() if token.id == token_id]:
+                del self._items[key]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+def _flush_token_usage(updates):
+    """将累积的Token使用统计写入数据库（一条 executemany UPDATE）"""
+    from models.token import Token
+
+    table = Token.__table__
+    statement = table.update().where(table.c.id == db.bindparam('b_id')).values(
+        use_count=db.func.coalesce(table.c.use_count, 0) + db.bindparam('b_count'),
+        last_used=db.bindparam('b_last_used'),
+        last_ip=db.bindparam('b_last_ip')
+    )
+    db.session.execute(statement, [
+        {
+            'b_id': token_id,
+            'b_count': increments.get('use_count', 0),
+            'b_last_used': values.get('last_used'),
+            'b_last_ip': values.get('last_ip')
+        }
+        for token_id, increments, values in updates
+    ])
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_on_flush(session, flush_context):
+    """通过ORM修改或删除Token时，在同一事务中更新共享版本号"""
+    from models.token import Token
+
+    for obj in session.deleted:
+        if isinstance(obj, Token):
+            bump_generation(session)
+            return
+
+    for obj in session.dirty:
+        if isinstance(obj, Token):
+            state = db.inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in INVALIDATING_FIELDS):
+                bump_generation(session)
+                return
+
+
+# 全局实例
+token_cache = TokenCache()
+token_usage = DeferredUpdates('token_usage', _flush_token_usage, 'TOKEN_USAGE_FLUSH_INTERVAL', 10)
@@ -40,26 +40,11 @@ def validate_ip_address(ip_str):
 
 
 def validate_ip_pattern(pattern):
-    """验证IP模式（支持通配符）"""
-    # 简单的IP模式验证
-    pattern = pattern.strip()
-
-    # 允许通配符*
-    if '*' in pattern:
-        parts = pattern.split('.')
-        if len(parts) != 4:
-            return False
-
-        for part in parts:
-            if part != '*' and not part.isdigit():
-                return False
-            if part.isdigit() and not 0 <= int(part) <= 255:
-                return False
+    """验证IP模式（支持通配符、CIDR和IPv6）"""
+    from utils.ip_matcher import parse_ip_pattern
 
-        return True
-
-    # 否则验证标准IP地址
-    return validate_ip_address(pattern)
+    network, wildcard_parts = parse_ip_pattern(pattern)
+    return network is not None or wildcard_parts is not None
 
 
 def validate_minecraft_username(username):
@@ -0,0 +1,268 @@
+# utils/whitelist_cache.py
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from flask import current_app, g
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models.database import db
+from models.whitelist import WhitelistEntry
+from models.whitelist_change import WhitelistChange
+from utils.whitelist_index import WhitelistIndex
+
+
+# 每个全量快照最多缓存的服务器子快照数量，超出后按请求临时构建
+MAX_SCOPED_SNAPSHOTS = 512
+
+
+class WhitelistSnapshot:
+    """活跃白名单的只读快照，构建完成后不再修改"""
+
+    def __init__(self, revision, timezone, entries, previous=None, scope=None, expiries=None):
+        self.revision = revision
+        self.timezone = timezone
+        # 服务器子快照的适用范围 (服务器ID, 服务器组)，全量快照为None
+        self.scope = scope
+        self.entries = tuple(sorted(entries, key=lambda e: (e['type'], e['value'])))
+        self.entries_by_id = {entry['id']: entry for entry in self.entries}
+        self.built_at = datetime.utcnow()
+
+        # 条目ID -> 到期时间（UTC），用于在到期调度器停用之前把已到期的条目排除在快照之外
+        self.expiries = {entry_id: deadline for entry_id, deadline in (expiries or {}).items()
+                         if entry_id in self.entries_by_id}
+        self.next_expiry = min(self.expiries.values()) if self.expiries else None
+
+        # 预先序列化，同步请求直接拼接字节即可响应
+        self.entries_json = json.dumps(self.entries, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+        digest = hashlib.sha1(f'{revision}|{timezone}|{scope or ""}|'.encode('utf-8'))
+        for entry in self.entries:
+            digest.update(entry['id'].encode('utf-8'))
+        self.etag = digest.hexdigest()
+
+        self._index = None
+        self._scoped = {}
+        self._stale_scoped = {}
+        self._scoped_lock = threading.Lock()
+        if previous is None:
+            return
+
+        removed = [entry for entry_id, entry in previous.entries_by_id.items()
+                   if self.entries_by_id.get(entry_id) is not entry]
+        added = [entry for entry_id, entry in self.entries_by_id.items()
+                 if previous.entries_by_id.get(entry_id) is not entry]
+
+        # 上一个快照已经建立索引时，只按差异增量更新，避免重建IP基数树
+        if previous._index is not None:
+            self._index = previous._index.derive(removed, added)
+
+        # 服务器子快照只在范围重叠的条目变化时重建，其余直接沿用
+        changed_scopes = {(entry.get('server_id'), entry.get('server_group')) for entry in removed + added}
+        for key, scoped in previous._scoped.items():
+            if any(WhitelistEntry.scope_matches(server_id, server_group, *key)
+                   for server_id, server_group in changed_scopes):
+                self._stale_scoped[key] = scoped
+            else:
+                self._scoped[key] = scoped
+
+    def for_server(self, server_id, server_group=None):
+        """适用于指定服务器的子快照，按需构建并缓存"""
+        key = (server_id, server_group)
+        scoped = self._scoped.get(key)
+        if scoped is not None:
+            return scoped
+
+        with self._scoped_lock:
+            scoped = self._scoped.get(key)
+            if scoped is None:
+                entries = [entry for entry in self.entries if WhitelistEntry.scope_matches(
+                    entry.get('server_id'), entry.get('server_group'), server_id, server_group)]
+                scoped = WhitelistSnapshot(self.revision, self.timezone, entries,
+                                           previous=self._stale_scoped.pop(key, None), scope=key)
+                if len(self._scoped) < MAX_SCOPED_SNAPSHOTS:
+                    self._scoped[key] = scoped
+            return scoped
+
+    @property
+    def index(self):
+        """按需构建的查找索引，与快照同生命周期"""
+        if self._index is None:
+            self._index = WhitelistIndex(self.entries)
+        return self._index
+
+    def __len__(self):
+        return len(self.entries)
+
+    def render(self, fields):
+        """将响应字段与预序列化的条目拼接为JSON字节"""
+        head = json.dumps(fields, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return b''.join([
+            head[:-1],
+            b',"entries":', self.entries_json,
+            b',"total_count":', str(len(self.entries)).encode('ascii'),
+            b'}'
+        ])
+
+
+class WhitelistCache:
+    """进程内白名单快照缓存，写入时失效，按变更记录增量修补"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._dirty = True
+        self._last_checked = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """标记快照需要更新（下一次读取时按变更记录修补）"""
+        self._dirty = True
+
+    def clear(self):
+        """丢弃快照，下一次读取时全量重建"""
+        with self._lock:
+            self._snapshot = None
+            self._dirty = True
+
+    def get_snapshot(self):
+        """获取当前快照，必要时重建或修补"""
+        snapshot = self._snapshot
+        timezone = _current_timezone()
+        if snapshot is not None and not self._needs_refresh(snapshot, timezone):
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.timezone != timezone:
+                snapshot = self._build(timezone)
+            elif self._needs_refresh(snapshot, timezone):
+                snapshot = self._refresh(snapshot)
+            snapshot = self._drop_expired(snapshot)
+
+            self._snapshot = snapshot
+            return snapshot
+
+    def _needs_refresh(self, snapshot, timezone):
+        # 条目到期通常由到期调度器停用并记录变更；调度器尚未发现的到期（其他进程写入的条目）按时间兜底
+        if self._dirty or snapshot.timezone != timezone:
+            return True
+        if snapshot.next_expiry is not None and snapshot.next_expiry <= datetime.utcnow():
+            return True
+
+        # 多进程部署时，其他进程的写入只能通过版本号发现
+        interval = current_app.config.get('WHITELIST_CACHE_CHECK_INTERVAL', 5)
+        if interval and time.monotonic() - self._last_checked >= interval:
+            self._last_checked = time.monotonic()
+            return WhitelistChange.current_revision() != snapshot.revision
+
+        return False
+
+    def _build(self, timezone):
+        """从数据库全量构建快照"""
+        self._dirty = False
+        self._last_checked = time.monotonic()
+        revision = WhitelistChange.current_revision()
+
+        entries = WhitelistEntry.query.filter(WhitelistEntry.is_active == True).all()
+
+        return WhitelistSnapshot(revision, timezone, [entry.to_sync_dict() for entry in entries],
+                                 expiries=_expiries(entries))
+
+    def _refresh(self, snapshot):
+        """根据变更记录修补快照，只重新加载变化的条目"""
+        self._dirty = False
+        self._last_checked = time.monotonic()
+        revision = WhitelistChange.current_revision()
+
+        # 变更记录已被清理或版本号回退（数据库被替换），只能全量重建
+        oldest = db.session.query(db.func.min(WhitelistChange.revision)).scalar()
+        if revision < snapshot.revision or (oldest is not None and snapshot.revision + 1 < oldest):
+            return self._build(snapshot.timezone)
+
+        if revision == snapshot.revision:
+            return snapshot
+
+        entries = dict(snapshot.entries_by_id)
+        expiries = dict(snapshot.expiries)
+
+        changed_ids = [row[0] for row in db.session.query(WhitelistChange.entry_id).filter(
+            WhitelistChange.revision > snapshot.revision,
+            WhitelistChange.revision <= revision
+        ).distinct()]
+
+        for entry_id in changed_ids:
+            entries.pop(entry_id, None)
+
+        if changed_ids:
+            changed = WhitelistEntry.query.filter(
+                WhitelistEntry.id.in_(changed_ids),
+                WhitelistEntry.is_active == True
+            ).all()
+            for entry in changed:
+                entries[entry.id] = entry.to_sync_dict()
+            expiries.update(_expiries(changed))
+
+        return WhitelistSnapshot(revision, snapshot.timezone, list(entries.values()), previous=snapshot,
+                                 expiries=expiries)
+
+    def _drop_expired(self, snapshot):
+        """
+        排除已过到期时间但仍为活跃的条目（到期调度器只在重新加载时发现其他进程写入的到期时间），
+        同时唤醒调度器停用这些条目；停用后的变更记录使快照按正常流程修补
+        """
+        now = datetime.utcnow()
+        if snapshot.next_expiry is None or snapshot.next_expiry > now:
+            return snapshot
+
+        from utils.expiry import expiry_scheduler
+        expiry_scheduler.wake()
+
+        expired = {entry_id for entry_id, deadline in snapshot.expiries.items() if deadline <= now}
+        entries = [entry for entry in snapshot.entries if entry['id'] not in expired]
+        return WhitelistSnapshot(snapshot.revision, snapshot.timezone, entries, previous=snapshot,
+                                 expiries=snapshot.expiries)
+
+
+def _current_timezone():
+    """快照中的时间按应用时区格式化，时区变化时需要重建"""
+    timezone_str = getattr(g, 'timezone_str', None)
+    if timezone_str is None:
+        from utils.timezone import get_app_timezone
+        timezone_str = str(get_app_timezone())
+    return timezone_str
+
+
+def _expiries(entries):
+    """条目的到期时间，统一为无时区信息的UTC时间"""
+    expiries = {}
+    for entry in entries:
+        deadline = entry.expires_at
+        if deadline is None:
+            continue
+        if deadline.tzinfo is not None:
+            deadline = deadline.astimezone(dt_timezone.utc).replace(tzinfo=None)
+        expiries[entry.id] = deadline
+    return expiries
+
+
+# 全局缓存实例
+whitelist_cache = WhitelistCache()
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    """提交了白名单变更的事务自动使快照失效"""
+    if session.info.pop('whitelist_changed', False):
+        whitelist_cache.invalidate()
+
+        # 唤醒推送连接
+        from utils.whitelist_stream import whitelist_hub
+        whitelist_hub.notify()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('whitelist_changed', None)
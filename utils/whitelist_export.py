@@ -0,0 +1,163 @@
+# utils/whitelist_export.py
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+from sqlalchemy import or_
+
+from models.database import db
+from models.whitelist import WhitelistEntry
+
+# 导出的字段（与导入格式一致）
+EXPORT_FIELDS = ('type', 'value', 'description', 'created_by', 'created_at', 'expires_at', 'is_active',
+                 'server_id', 'server_group')
+
+# 支持的导出格式：格式 -> (MIME类型, 文件扩展名)
+EXPORT_FORMATS = {
+    'json': ('application/json', 'json'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+# 服务器端游标每次取回的行数
+EXPORT_YIELD_PER = 1000
+
+# 攒够这么多字符再输出一块，避免过多的小块写入
+EXPORT_CHUNK_CHARS = 64 * 1024
+
+
+def export_statement(active_only=True, include_expired=False):
+    """构建导出查询（只选择导出字段，不加载ORM对象）"""
+    columns = [getattr(WhitelistEntry, field) for field in EXPORT_FIELDS]
+    statement = db.select(*columns).order_by(WhitelistEntry.created_at, WhitelistEntry.id)
+
+    if active_only:
+        if include_expired:
+            # 到期的条目已由到期调度器停用，按过期时间一并导出
+            statement = statement.where(or_(
+                WhitelistEntry.is_active == True,
+                WhitelistEntry.expires_at <= datetime.utcnow()
+            ))
+        else:
+            statement = statement.where(WhitelistEntry.is_active == True)
+
+    return statement
+
+
+def iter_export_rows(statement):
+    """以 yield_per 分批迭代导出行，内存占用与总行数无关"""
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_YIELD_PER))
+    for row in result:
+        yield {
+            'type': row.type,
+            'value': row.value,
+            'description': row.description,
+            'created_by': row.created_by,
+            'created_at': row.created_at.isoformat() if row.created_at else None,
+            'expires_at': row.expires_at.isoformat() if row.expires_at else None,
+            'is_active': row.is_active,
+            'server_id': row.server_id,
+            'server_group': row.server_group
+        }
+
+
+def iter_export(rows, export_format='json', counter=None):
+    """
+    将导出行编码为指定格式的文本块
+    counter 为可选的字典，迭代过程中更新 counter['count'] 为已导出的行数
+    """
+    if counter is None:
+        counter = {}
+    counter['count'] = 0
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS) if export_format == 'csv' else None
+
+    if export_format == 'json':
+        buffer.write('[')
+    elif writer is not None:
+        writer.writeheader()
+
+    for row in rows:
+        if export_format == 'json':
+            buffer.write(',\n  ' if counter['count'] else '\n  ')
+            buffer.write(json.dumps(row, ensure_ascii=False))
+        elif writer is not None:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row, ensure_ascii=False))
+            buffer.write('\n')
+        counter['count'] += 1
+
+        if buffer.tell() >= EXPORT_CHUNK_CHARS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if export_format == 'json':
+        buffer.write('\n]\n' if counter['count'] else ']\n')
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_encoded(chunks, compress=False):
+    """将文本块编码为UTF-8，可选实时gzip压缩"""
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+
+    # wbits=31 生成带gzip文件头的数据流
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_filename(export_format, compress=False):
+    """导出文件名"""
+    extension = EXPORT_FORMATS[export_format][1]
+    filename = f'whitelist_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    return filename + '.gz' if compress else filename
+
+
+def export_job(context, active_only, include_expired, export_format, compress, user_id, remote_addr):
+    """后台任务：将白名单导出到文件，完成后通过任务下载"""
+    from models.log import Log
+
+    statement = export_statement(active_only, include_expired)
+    total = db.session.execute(db.select(db.func.count()).select_from(statement.subquery())).scalar()
+
+    extension = EXPORT_FORMATS[export_format][1] + ('.gz' if compress else '')
+    path = context.file_path(extension)
+    counter = {}
+    with open(path, 'wb') as output:
+        chunks = iter_export(iter_export_rows(statement), export_format, counter)
+        for data in iter_encoded(chunks, compress):
+            output.write(data)
+            context.progress(counter['count'], total)
+    context.result_file = path
+    context.progress(counter['count'], total)
+
+    # 记录导出操作日志
+    log = Log(
+        level='info',
+        message=f'导出白名单数据: {counter["count"]}条',
+        source='web',
+        ip_address=remote_addr,
+        user_id=user_id,
+        details=f'format: {export_format}, gzip: {compress}, background: True'
+    )
+    db.session.add(log)
+    db.session.commit()
+
+    return {
+        'count': counter['count'],
+        'filename': export_filename(export_format, compress),
+        'mimetype': 'application/gzip' if compress else EXPORT_FORMATS[export_format][0]
+    }
@@ -0,0 +1,327 @@
+# utils/whitelist_import.py
+import json
+import re
+import uuid
+
+from models.database import db
+from models.whitelist import WhitelistEntry
+from models.whitelist_change import WhitelistChange
+from utils.timezone import now_utc
+
+# 每次读取的字符数
+READ_CHUNK_CHARS = 64 * 1024
+
+# 最多保留的错误明细条数
+MAX_REPORTED_ERRORS = 100
+
+_decoder = json.JSONDecoder()
+_DELIMITER = re.compile(r'\s*[,\]]')
+
+
+def iter_json_array(stream):
+    """
+    增量解析JSON数组，逐个返回元素，不需要把整个文件解码到内存
+    stream 为文本流；格式错误时抛出 json.JSONDecodeError
+    """
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        data = stream.read(READ_CHUNK_CHARS)
+        if not data:
+            eof = True
+        buffer = buffer[position:] + data
+        position = 0
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            fill()
+
+    fill()
+    skip_whitespace()
+    if position >= len(buffer) or buffer[position] != '[':
+        raise json.JSONDecodeError('Expecting JSON array', buffer, position)
+    position += 1
+
+    first = True
+    while True:
+        skip_whitespace()
+        if position >= len(buffer):
+            raise json.JSONDecodeError('Unterminated JSON array', buffer, position)
+        if buffer[position] == ']':
+            return
+        if not first:
+            if buffer[position] != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, position)
+            position += 1
+            skip_whitespace()
+
+        # 元素可能跨越读取块，解析失败时继续读取直到文件结束
+        while True:
+            try:
+                item, end = _decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # 数字等元素可能在块尾被截断（如 "-3." ），确认后面已经读到分隔符
+            if not eof and not _DELIMITER.match(buffer, end):
+                fill()
+                continue
+            break
+
+        position = end
+        first = False
+        yield item
+
+
+def iter_ndjson(stream):
+    """逐行解析NDJSON，空行忽略；无法解析的行返回 ValueError 交由导入器记录为错误"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ValueError(f'line {line_number}: {e.msg}')
+
+
+def _scope_value(value, max_length):
+    """导入数据中的适用范围字段，空值表示不限制"""
+    if not isinstance(value, str) or not value.strip():
+        return None
+    return value.strip()[:max_length]
+
+
+def _insert_ignoring_duplicates(table):
+    """插入时跳过 (类型, 值) 已存在的行（其他进程在加载已有键之后写入的条目）"""
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        return insert(table).on_conflict_do_nothing(index_elements=['type', 'value'])
+    if dialect in ('mysql', 'mariadb'):
+        return table.insert().prefix_with('IGNORE')
+    return table.insert()
+
+
+class WhitelistImporter:
+    """
+    批量导入白名单
+    预先加载已有的 (类型, 值) 键，按块以 executemany 执行插入和更新；每一行的错误单独记录
+    commit_chunks 为True时每块连同变更记录单独提交，不在整个导入期间持有写锁，
+    否则全部在调用方的同一个事务中完成
+    """
+
+    def __init__(self, created_by, skip_existing=False, set_inactive=False, description='', chunk_size=1000,
+                 commit_chunks=False):
+        self.created_by = created_by
+        self.skip_existing = skip_existing
+        self.set_inactive = set_inactive
+        self.description = description
+        self.chunk_size = chunk_size
+        self.commit_chunks = commit_chunks
+
+        self.imported_count = 0
+        self.skipped_count = 0
+        self.error_count = 0
+        self.total_count = 0
+        self.errors = []
+
+        self._existing = None
+        self._inserts = []
+        self._updates = []
+        self._changes = []
+
+    def load_existing(self):
+        """一次查询加载全部已有条目的键"""
+        rows = db.session.execute(db.select(WhitelistEntry.type, WhitelistEntry.value, WhitelistEntry.id))
+        self._existing = {(row.type, row.value): row.id for row in rows}
+
+    def add(self, item):
+        """处理一条导入数据"""
+        if self._existing is None:
+            self.load_existing()
+
+        index = self.total_count
+        self.total_count += 1
+
+        if isinstance(item, Exception):
+            self._error(index, str(item))
+            return
+
+        # 验证数据格式
+        if not isinstance(item, dict) or not isinstance(item.get('type'), str) \
+                or not isinstance(item.get('value'), str):
+            self._error(index, 'type and value are required')
+            return
+
+        entry_type = item['type'].lower().strip()
+        value = item['value'].strip()
+
+        # 验证类型
+        if entry_type not in ['name', 'uuid', 'ip']:
+            self._error(index, f'invalid type: {entry_type}')
+            return
+        if not value or len(value) > 255:
+            self._error(index, 'value must be 1-255 characters')
+            return
+
+        key = (entry_type, value)
+        entry_id = self._existing.get(key)
+
+        if entry_id is not None and self.skip_existing:
+            self.skipped_count += 1
+            return
+
+        if entry_id is not None:
+            # 更新现有条目：与原逻辑一致，只覆盖描述和禁用状态
+            values = {}
+            if self.description:
+                values['description'] = self.description
+            if self.set_inactive:
+                values['is_active'] = False
+            if values:
+                self._updates.append((entry_id, values))
+                self._changes.append((entry_id, entry_type, value, 'update'))
+        else:
+            # 创建新条目
+            entry_id = str(uuid.uuid4())
+            self._existing[key] = entry_id
+            self._inserts.append({
+                'id': entry_id,
+                'type': entry_type,
+                'value': value,
+                'description': self.description,
+                'created_by': self.created_by,
+                'created_at': now_utc(),
+                'is_active': not self.set_inactive,
+                'server_id': _scope_value(item.get('server_id'), 36),
+                'server_group': _scope_value(item.get('server_group'), 64),
+                'login_count': 0
+            })
+            self._changes.append((entry_id, entry_type, value, 'add'))
+
+        self.imported_count += 1
+        if len(self._inserts) + len(self._updates) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """写入当前块；commit_chunks 为False时由调用方统一提交事务"""
+        if self._inserts:
+            result = db.session.execute(_insert_ignoring_duplicates(WhitelistEntry.__table__), self._inserts)
+            if result.rowcount != len(self._inserts):
+                self._drop_conflicts()
+            self._inserts = []
+
+        if self._updates:
+            table = WhitelistEntry.__table__
+            # 相同字段组合的更新合并为一条 executemany
+            groups = {}
+            for entry_id, values in self._updates:
+                groups.setdefault(tuple(sorted(values)), []).append(
+                    dict({'b_id': entry_id}, **{f'b_{field}': v for field, v in values.items()})
+                )
+            for fields, params in groups.items():
+                statement = table.update().where(table.c.id == db.bindparam('b_id')).values(
+                    **{field: db.bindparam(f'b_{field}') for field in fields}
+                )
+                db.session.execute(statement, params)
+            self._updates = []
+
+        if self._changes:
+            WhitelistChange.record_bulk(self._changes)
+            self._changes = []
+
+        if self.commit_chunks:
+            db.session.commit()
+
+    def _drop_conflicts(self):
+        """并发写入导致部分插入被跳过时，按已存在处理，不记录新增变更"""
+        ids = [row['id'] for row in self._inserts]
+        inserted = set(db.session.execute(
+            db.select(WhitelistEntry.id).where(WhitelistEntry.id.in_(ids))
+        ).scalars())
+        conflicts = set(ids) - inserted
+        self._changes = [change for change in self._changes if change[0] not in conflicts]
+        self.imported_count -= len(conflicts)
+        self.skipped_count += len(conflicts)
+
+    def run(self, items, on_progress=None):
+        """导入全部数据并写入最后一块；on_progress(已处理行数) 每处理一块调用一次"""
+        for item in items:
+            self.add(item)
+            if on_progress is not None and self.total_count % self.chunk_size == 0:
+                on_progress(self.total_count)
+        self.flush()
+        if on_progress is not None:
+            on_progress(self.total_count)
+        return self
+
+    def summary(self):
+        return {
+            'total': self.total_count,
+            'imported': self.imported_count,
+            'skipped': self.skipped_count,
+            'errors': self.error_count,
+            'error_details': self.errors
+        }
+
+    def _error(self, index, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'index': index, 'message': message})
+
+
+def import_job(context, path, filename, created_by, user_id, remote_addr,
+               skip_existing=False, set_inactive=False, description=''):
+    """后台任务：从上传的文件导入白名单，每块条目和对应的变更记录单独提交"""
+    from models.log import Log
+    from utils.stats_counters import stats_counters
+
+    importer = WhitelistImporter(
+        created_by=created_by,
+        skip_existing=skip_existing,
+        set_inactive=set_inactive,
+        description=description,
+        commit_chunks=True
+    )
+
+    # 边读取边解析，文件内容不会整体解码到内存
+    try:
+        with open(path, encoding='utf-8-sig') as stream:
+            items = iter_ndjson(stream) if filename.endswith('.ndjson') else iter_json_array(stream)
+            importer.run(items, on_progress=lambda count: context.progress(count, message=f'已读取 {count} 条'))
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError(f'JSON文件格式不正确: {e}') from e
+
+    stats_counters.mark_stale()
+
+    # 记录导入操作日志
+    log = Log(
+        level='info',
+        message=f'导入白名单数据: {importer.imported_count}条成功，{importer.skipped_count}条跳过，'
+                f'{importer.error_count}条错误',
+        source='web',
+        ip_address=remote_addr,
+        user_id=user_id,
+        details=f'file: {filename}, total_entries: {importer.total_count}'
+    )
+    db.session.add(log)
+    db.session.commit()
+
+    context.progress(importer.total_count, importer.total_count,
+                     message=f'{importer.imported_count}条成功，{importer.skipped_count}条跳过，'
+                             f'{importer.error_count}条错误')
+    return importer.summary()
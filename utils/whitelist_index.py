@@ -0,0 +1,132 @@
+# utils/whitelist_index.py
+from uuid import UUID
+
+from utils.ip_matcher import IpMatcher, entry_order, normalize_ip
+
+
+def normalize_name(name):
+    """玩家名称不区分大小写"""
+    return name.strip().lower() if name else None
+
+
+def normalize_uuid(uuid_str):
+    """统一UUID格式（小写、带连字符），同时兼容不带连字符的写法"""
+    if not uuid_str:
+        return None
+    try:
+        return str(UUID(uuid_str.strip()))
+    except ValueError:
+        return uuid_str.strip().lower()
+
+
+def _is_exact_ip(value):
+    return '*' not in value and '/' not in value and normalize_ip(value) is not None
+
+
+class WhitelistIndex:
+    """
+    基于快照构建的白名单索引，名称/UUID/IP均为O(1)查找，IP段走基数树
+    规范化后相同的键（如仅大小写不同的名称）可能对应多个条目，每个键保存按固定顺序排列的条目元组
+    """
+
+    def __init__(self, entries=(), names=None, uuids=None, ips=None, ip_matcher=None):
+        self.names = names if names is not None else {}
+        self.uuids = uuids if uuids is not None else {}
+        self.ips = ips if ips is not None else {}
+        self.ip_matcher = ip_matcher if ip_matcher is not None else IpMatcher()
+
+        patterns = []
+        for entry in entries:
+            if entry['type'] == 'ip' and not _is_exact_ip(entry['value']):
+                patterns.append((entry['value'], entry))
+            else:
+                self._add(entry)
+
+        if patterns:
+            self.ip_matcher = IpMatcher.build(patterns)
+
+    def _table(self, entry):
+        """条目所在的字典和键，IP段条目返回 (None, None)"""
+        entry_type = entry['type']
+        value = entry['value']
+        if entry_type == 'name':
+            return self.names, normalize_name(value)
+        if entry_type == 'uuid':
+            return self.uuids, normalize_uuid(value)
+        if entry_type == 'ip' and _is_exact_ip(value):
+            return self.ips, normalize_ip(value)
+        return None, None
+
+    def _add(self, entry):
+        table, key = self._table(entry)
+        if table is None:
+            if entry['type'] == 'ip':
+                self.ip_matcher = self.ip_matcher.insert(entry['value'], entry)
+            return
+        # 元组不可变，派生索引浅拷贝字典后替换即可，不影响原索引
+        table[key] = tuple(sorted(table.get(key, ()) + (entry,), key=entry_order))
+
+    def _remove(self, entry):
+        table, key = self._table(entry)
+        if table is None:
+            if entry['type'] == 'ip':
+                self.ip_matcher = self.ip_matcher.remove(entry['value'], entry)
+            return
+
+        remaining = tuple(item for item in table.get(key, ()) if item['id'] != entry['id'])
+        if remaining:
+            table[key] = remaining
+        else:
+            table.pop(key, None)
+
+    def derive(self, removed, added):
+        """
+        基于当前索引生成新索引：字典浅拷贝后修改，IP基数树按路径复制增量更新
+        当前索引保持不变，可继续被并发读取
+        """
+        index = WhitelistIndex(
+            names=dict(self.names),
+            uuids=dict(self.uuids),
+            ips=dict(self.ips),
+            ip_matcher=self.ip_matcher
+        )
+        for entry in removed:
+            index._remove(entry)
+        for entry in added:
+            index._add(entry)
+        return index
+
+    @staticmethod
+    def _first(table, key):
+        entries = table.get(key)
+        return entries[0] if entries else None
+
+    def match_ip(self, ip):
+        """匹配IP，精确条目优先于IP段条目"""
+        if not ip:
+            return None
+        entry = self._first(self.ips, normalize_ip(ip))
+        if entry is not None:
+            return entry
+        return self.ip_matcher.match(ip)
+
+    def check(self, name=None, uuid=None, ip=None):
+        """
+        检查玩家是否在白名单中
+        返回 (条目, 匹配类型)，未匹配时返回 (None, None)
+        """
+        if name:
+            entry = self._first(self.names, normalize_name(name))
+            if entry is not None:
+                return entry, 'name'
+
+        if uuid:
+            entry = self._first(self.uuids, normalize_uuid(uuid))
+            if entry is not None:
+                return entry, 'uuid'
+
+        entry = self.match_ip(ip)
+        if entry is not None:
+            return entry, 'ip'
+
+        return None, None
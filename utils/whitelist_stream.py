@@ -0,0 +1,286 @@
+# utils/whitelist_stream.py
+import atexit
+import json
+import threading
+import time
+
+from models.database import db
+from models.whitelist import WhitelistEntry
+from models.whitelist_change import WhitelistChange
+from utils.logger import get_logger
+
+logger = get_logger('whitelist_stream')
+
+# 最多缓存的增量查询结果数量（同一时刻的连接通常处在相同的版本号，共享一次查询）
+MAX_CACHED_RESULTS = 64
+
+
+class WhitelistChangeHub:
+    """
+    白名单变更推送中心
+    每个进程一个后台线程检查版本号（本进程的提交立即唤醒，其他进程的写入按间隔发现），
+    推送连接只在共享的条件变量上等待；每次变更的增量只查询一次，再按服务器范围在内存中筛选
+    WSGI推送接口的连接在等待期间占用一个工作线程，同时等待的连接数受 client_limit 限制；
+    独立的事件驱动推送服务（utils/stream_server.py）通过 subscribe 接收版本号变化，不占用工作线程
+    条目到期由到期调度器停用并记录为变更，与其他变更一起推送
+    """
+
+    def __init__(self):
+        self.app = None
+        self._condition = threading.Condition()
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._query_lock = threading.Lock()
+        self._results = {}
+
+        # 已发布的版本号
+        self.revision = None
+
+        self.clients = 0
+        self._subscribers = []
+
+    def init_app(self, app):
+        """绑定应用，退出时唤醒所有等待的连接"""
+        self.app = app
+        app.extensions['whitelist_hub'] = self
+        atexit.register(self.stop)
+
+    def notify(self):
+        """本进程提交了白名单变更，立即检查"""
+        self._wake_event.set()
+
+    def subscribe(self, callback):
+        """登记版本号变化的回调 callback(新版本号)，在后台线程中调用，不能阻塞"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def current_revision(self):
+        """当前已发布的版本号，后台线程尚未完成第一次检查时最多等待5秒"""
+        self._ensure_started()
+        with self._condition:
+            if self.revision is None:
+                self._condition.wait_for(lambda: self.revision is not None or self._stop_event.is_set(), 5)
+            return self.revision
+
+    def wait(self, revision, timeout):
+        """等待版本号变化，返回最新版本号；超时返回原版本号"""
+        self._ensure_started()
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._stop_event.is_set() or self.revision != revision,
+                timeout
+            )
+            return self.revision
+
+    def wait_for_revision(self, since, timeout):
+        """长轮询：等待版本号超过 since，返回最新版本号"""
+        self._ensure_started()
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._stop_event.is_set() or (self.revision is not None and self.revision > since),
+                timeout
+            )
+            return self.revision
+
+    @property
+    def stopping(self):
+        return self._stop_event.is_set()
+
+    @property
+    def client_limit(self):
+        """
+        每个进程同时等待的推送连接和长轮询的上限
+        等待期间各占用一个工作线程，未配置时取每个进程线程数的四分之一，保证大部分线程留给普通请求
+        """
+        limit = self.app.config.get('WHITELIST_STREAM_MAX_CLIENTS')
+        if limit is not None:
+            return limit
+        threads = self.app.config.get('SERVER_THREADS', 8)
+        return threads // 4 or (1 if threads > 1 else 0)
+
+    def acquire_client(self):
+        """登记一个推送连接或长轮询，达到上限时返回False"""
+        limit = self.client_limit
+        with self._lock:
+            if self.clients >= limit:
+                return False
+            self.clients += 1
+            return True
+
+    def release_client(self):
+        with self._lock:
+            self.clients -= 1
+
+    def delta(self, since, until):
+        """(since, until] 区间的增量（不限范围），相同区间的连接共享一次查询"""
+        return self._cached((since, until),
+                            lambda: WhitelistChange.get_delta(since, until, only_active=True))
+
+    def stop(self, timeout=5):
+        """停止后台线程并唤醒所有等待的连接"""
+        self._stop_event.set()
+        self._wake_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def _cached(self, key, func):
+        result = self._results.get(key)
+        if result is not None:
+            return result
+        with self._query_lock:
+            result = self._results.get(key)
+            if result is None:
+                try:
+                    result = func()
+                finally:
+                    # 推送连接长期存在，查询后立即结束事务，避免SQLite的读锁阻塞写入
+                    db.session.close()
+                if len(self._results) >= MAX_CACHED_RESULTS:
+                    self._results.clear()
+                self._results[key] = result
+            return result
+
+    def _ensure_started(self):
+        # 延迟到第一次使用时启动，多进程部署时在每个工作进程内各自启动
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._run, name='whitelist-stream', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    try:
+                        self._check()
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                logger.error('whitelist stream check failed error=%s', e)
+
+            self._wake_event.wait(self.app.config.get('WHITELIST_STREAM_POLL_INTERVAL', 1.0))
+            self._wake_event.clear()
+
+    def _check(self):
+        """检查版本号，有变化时发布并唤醒等待的连接"""
+        revision = WhitelistChange.current_revision()
+        with self._condition:
+            if revision == self.revision:
+                return
+            self.revision = revision
+            self._condition.notify_all()
+
+        for callback in list(self._subscribers):
+            try:
+                callback(revision)
+            except Exception:
+                logger.exception('whitelist stream subscriber failed')
+
+
+def scope_delta(delta, scope):
+    """
+    按服务器范围筛选不限范围的增量，结果与 get_delta(scope=...) 一致：
+    范围外的新增条目不下发，范围外的更新条目作为删除下发
+    """
+    if scope is None:
+        return delta
+    added = [entry for entry in delta['added']
+             if WhitelistEntry.scope_matches(entry['server_id'], entry['server_group'], *scope)]
+    updated = []
+    removed = list(delta['removed'])
+    for entry in delta['updated']:
+        if WhitelistEntry.scope_matches(entry['server_id'], entry['server_group'], *scope):
+            updated.append(entry)
+        else:
+            removed.append({'id': entry['id'], 'type': entry['type'], 'value': entry['value']})
+    return {'added': added, 'updated': updated, 'removed': removed}
+
+
+def format_event(event, data, event_id=None):
+    """格式化一条SSE消息"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
+
+
+def opening_event(hub, since, revision, scope):
+    """
+    连接建立时的第一条消息
+    since 为客户端已同步到的版本号（None 表示从当前版本开始）；无法续传时下发 reset 事件要求全量同步
+    """
+    if since is not None and 0 <= since <= revision:
+        delta = hub.delta(since, revision)
+        if delta is None:
+            return format_event('reset', {'revision': revision}, revision)
+        delta = scope_delta(delta, scope)
+        return format_event('change', dict(delta, since=since, revision=revision), revision)
+    if since is not None:
+        return format_event('reset', {'revision': revision}, revision)
+    return format_event('ready', {'revision': revision}, revision)
+
+
+def change_event(hub, revision, new_revision, scope):
+    """版本号从 revision 变为 new_revision 时的消息，该服务器范围内没有变化时返回None"""
+    if new_revision > revision:
+        delta = hub.delta(revision, new_revision)
+        if delta is None:
+            return format_event('reset', {'revision': new_revision}, new_revision)
+        delta = scope_delta(delta, scope)
+        if delta['added'] or delta['updated'] or delta['removed']:
+            return format_event('change', dict(delta, since=revision, revision=new_revision), new_revision)
+        return None
+    # 版本号回退（数据库被替换），客户端需要全量同步
+    return format_event('reset', {'revision': new_revision}, new_revision)
+
+
+def iter_stream(hub, since, scope, heartbeat, max_duration):
+    """
+    生成推送连接的SSE消息（WSGI接口，等待期间占用工作线程）
+    变更（包括到期停用）以 change 事件下发，无法续传时下发 reset 事件要求全量同步
+    """
+    revision = hub.current_revision()
+    started = time.monotonic()
+
+    yield 'retry: 3000\n\n'
+    yield opening_event(hub, since, revision, scope)
+
+    while not hub.stopping:
+        remaining = max_duration - (time.monotonic() - started) if max_duration else None
+        if remaining is not None and remaining <= 0:
+            return
+
+        timeout = heartbeat or None
+        if remaining is not None:
+            timeout = min(timeout, remaining) if timeout else remaining
+        new_revision = hub.wait(revision, timeout)
+
+        if new_revision == revision:
+            if heartbeat:
+                # 注释行保持连接，代理不会因空闲断开
+                yield ': keep-alive\n\n'
+            continue
+
+        event = change_event(hub, revision, new_revision, scope)
+        if event is not None:
+            yield event
+        revision = new_revision
+
+
+# 全局实例
+whitelist_hub = WhitelistChangeHub()